@@ -4,7 +4,7 @@ import Navbar from './frontend/NavBar'
 import Stock from './frontend/Stock'
 import Productos from './frontend/Productos'
 import Ventas from './frontend/Ventas'
-import { stockAPI } from './services/api'
+import { stockAPI, eventosAPI } from './services/api'
 
 function App() {
   const [currentView, setCurrentView] = useState('stock')
@@ -19,6 +19,23 @@ function App() {
     loadStock()
   }, [])
 
+  // Mantener el stock al día con los eventos del servidor en lugar de recargar la lista.
+  // Solo se aplican valores absolutos: las variaciones (stock.delta) de las escrituras hechas
+  // en otro worker no llegan, pero sus filas completas sí (stock.actualizado).
+  useEffect(() => {
+    const guardar = (datos) => setStockItems(items =>
+      items.some(item => item.id === datos.id)
+        ? items.map(item => item.id === datos.id ? { ...item, ...datos } : item)
+        : datos.nombre !== undefined ? [...items, datos] : items
+    )
+    return eventosAPI.suscribir({
+      'stock.creado': guardar,
+      'stock.actualizado': guardar,
+      'stock.eliminado': ({ id }) => setStockItems(items => items.filter(item => item.id !== id)),
+      'reinicio': () => loadStock()
+    })
+  }, [])
+
   const loadStock = async () => {
     try {
       setLoading(true)
@@ -0,0 +1,246 @@
+"""
+Control de admisión de requests
+
+Los endpoints sync se atienden desde un threadpool de 40 hilos por worker. En un pico de ventas
+y preparaciones, los requests de más quedan esperando un hilo sin límite y todos terminan
+vencidos juntos, incluidos los GET baratos. Este middleware los admite antes de llegar al
+threadpool según la clase de la ruta:
+
+- lectura: GET y HEAD, y los POST que no escriben (cotizar, simular producción)
+- escritura: el resto de POST, PUT, PATCH y DELETE
+- pesada: importaciones, exportaciones y tareas de administración (ver RUTAS_PESADAS)
+
+Cada clase tiene un máximo de requests en curso, una cola de espera acotada y una espera
+máxima en la cola. Además hay un máximo total de requests en curso; cuando se libera un lugar
+se lo da primero a la lectura, después a la escritura y por último a las pesadas. Si la cola
+de la clase está llena, o la espera vence, se responde enseguida 503 con Retry-After (estimado
+con la cola y la duración media de los requests de la clase).
+
+Límites por clase: PANADERIA_ADMISION_<CLASE>_LIMITE, _COLA y _ESPERA_S (por ejemplo
+PANADERIA_ADMISION_ESCRITURA_LIMITE). PANADERIA_ADMISION=0 lo desactiva. Las colas, los
+requests en curso y los rechazos se publican en /metrics.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+ADMISION = os.getenv("PANADERIA_ADMISION", "1").lower() in ("1", "true", "si", "sí")
+# Por defecto, el tamaño del threadpool de cada worker
+ADMISION_TOTAL = int(os.getenv("PANADERIA_ADMISION_TOTAL", "40"))
+
+LECTURA = "lectura"
+ESCRITURA = "escritura"
+PESADA = "pesada"
+
+# (limite, cola, espera_s) por defecto de cada clase, en orden de prioridad
+LIMITES_POR_DEFECTO = {
+    LECTURA: (40, 200, 10.0),
+    ESCRITURA: (16, 100, 10.0),
+    PESADA: (2, 4, 30.0),
+}
+
+# Streams de larga duración y endpoints de monitoreo: nunca esperan ni se rechazan
+RUTAS_SIN_CONTROL = {"/api/eventos", "/metrics"}
+# POST que solo leen
+RUTAS_LECTURA = {"/api/ventas/cotizar", "/api/produccion/simular"}
+# Prefijos de rutas pesadas (cualquier método)
+RUTAS_PESADAS = tuple(
+    ruta.strip() for ruta in os.getenv(
+        "PANADERIA_ADMISION_RUTAS_PESADAS",
+        "/api/importar,/api/exportar,/api/init-database,/api/reportes/reconstruir,/api/reportes/copia,/api/movimientos/snapshots"
+    ).split(",") if ruta.strip()
+)
+
+# Peso de cada request nuevo en la duración media de su clase
+PESO_DURACION = 0.1
+
+def clase_de_ruta(metodo: str, ruta: str) -> Optional[str]:
+    """Clase de un request, o None si no pasa por el control"""
+    if ruta in RUTAS_SIN_CONTROL:
+        return None
+    if ruta.startswith(RUTAS_PESADAS):
+        return PESADA
+    if metodo in ("GET", "HEAD") or ruta in RUTAS_LECTURA:
+        return LECTURA
+    if metodo == "OPTIONS":
+        return None
+    return ESCRITURA
+
+class ClaseRuta:
+    """Requests en curso y en cola de una clase"""
+
+    def __init__(self, nombre: str, limite: int, cola: int, espera_s: float):
+        self.nombre = nombre
+        self.limite = limite
+        self.cola_max = cola
+        self.espera_s = espera_s
+        self.en_curso = 0
+        self.cola: Deque[asyncio.Future] = deque()
+        self.admitidos = 0
+        self.rechazos: Dict[str, int] = {"cola_llena": 0, "espera": 0}
+        self.segundos_en_cola = 0.0
+        self.duracion_media_s = 0.0
+
+    def retry_after(self) -> int:
+        """Segundos sugeridos para reintentar: lo que tarda en vaciarse la cola actual"""
+        estimado = (len(self.cola) + 1) * self.duracion_media_s / max(self.limite, 1)
+        return max(1, min(math.ceil(estimado), 60))
+
+class ControlAdmision:
+    """Lugares en curso por clase y total, con prioridad por orden de las clases
+
+    Se usa solo desde el event loop, así que no necesita locks.
+    """
+
+    def __init__(self, total: int = ADMISION_TOTAL, clases: Optional[List[ClaseRuta]] = None):
+        self.total = total
+        self.en_curso = 0
+        self.clases = clases if clases is not None else [
+            ClaseRuta(
+                nombre,
+                int(os.getenv(f"PANADERIA_ADMISION_{nombre.upper()}_LIMITE", str(limite))),
+                int(os.getenv(f"PANADERIA_ADMISION_{nombre.upper()}_COLA", str(cola))),
+                float(os.getenv(f"PANADERIA_ADMISION_{nombre.upper()}_ESPERA_S", str(espera_s)))
+            )
+            for nombre, (limite, cola, espera_s) in LIMITES_POR_DEFECTO.items()
+        ]
+        self._por_nombre = {clase.nombre: clase for clase in self.clases}
+
+    def clase(self, nombre: str) -> ClaseRuta:
+        return self._por_nombre[nombre]
+
+    def _hay_lugar(self, clase: ClaseRuta) -> bool:
+        return clase.en_curso < clase.limite and self.en_curso < self.total
+
+    def _ocupar(self, clase: ClaseRuta):
+        clase.en_curso += 1
+        self.en_curso += 1
+        clase.admitidos += 1
+
+    async def admitir(self, clase: ClaseRuta) -> bool:
+        """Esperar un lugar para un request de la clase. Devuelve False si se rechaza"""
+        # Sin saltear a los que ya esperan (la cola vacía garantiza el orden de llegada)
+        if not clase.cola and self._hay_lugar(clase):
+            self._ocupar(clase)
+            return True
+        if len(clase.cola) >= clase.cola_max:
+            clase.rechazos["cola_llena"] += 1
+            return False
+
+        turno = asyncio.get_running_loop().create_future()
+        clase.cola.append(turno)
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait({turno}, timeout=clase.espera_s)
+        except asyncio.CancelledError:
+            # El cliente se desconectó: si ya tenía el lugar, se devuelve
+            if turno.done() and not turno.cancelled():
+                self.liberar(clase)
+            else:
+                clase.cola.remove(turno)
+                turno.cancel()
+            raise
+        finally:
+            clase.segundos_en_cola += time.perf_counter() - inicio
+        if turno.done():
+            return True
+        clase.cola.remove(turno)
+        turno.cancel()
+        clase.rechazos["espera"] += 1
+        return False
+
+    def liberar(self, clase: ClaseRuta, duracion_s: Optional[float] = None):
+        clase.en_curso -= 1
+        self.en_curso -= 1
+        if duracion_s is not None:
+            clase.duracion_media_s += PESO_DURACION * (duracion_s - clase.duracion_media_s)
+        self._despachar()
+
+    def _despachar(self):
+        """Dar los lugares libres a los que esperan, en orden de prioridad de las clases"""
+        for clase in self.clases:
+            while clase.cola and self._hay_lugar(clase):
+                self._ocupar(clase)
+                clase.cola.popleft().set_result(True)
+            if self.en_curso >= self.total:
+                return
+
+control = ControlAdmision() if ADMISION else None
+
+# ==================== MIDDLEWARE ====================
+
+class AdmisionMiddleware:
+    """Middleware ASGI que admite, demora o rechaza cada request según su clase"""
+
+    def __init__(self, app, control_admision: Optional[ControlAdmision] = None):
+        self.app = app
+        self.control = control_admision if control_admision is not None else control
+
+    async def __call__(self, scope, receive, send):
+        nombre = clase_de_ruta(scope["method"], scope["path"]) if scope["type"] == "http" and self.control is not None else None
+        if nombre is None:
+            await self.app(scope, receive, send)
+            return
+
+        clase = self.control.clase(nombre)
+        if not await self.control.admitir(clase):
+            await _enviar_rechazo(send, clase)
+            return
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.liberar(clase, time.perf_counter() - inicio)
+
+async def _enviar_rechazo(send, clase: ClaseRuta):
+    cuerpo = json.dumps(
+        {"detail": f"Servidor ocupado: hay demasiados requests de {clase.nombre} en espera. Intenta nuevamente en unos segundos"},
+        ensure_ascii=False
+    ).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(cuerpo)).encode()),
+            (b"retry-after", str(clase.retry_after()).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
+
+def lineas_metricas() -> List[str]:
+    """Colas y rechazos por clase para /metrics (ver metricas.registrar_colector)"""
+    if control is None:
+        return []
+    lineas = [
+        "# HELP panaderia_admision_en_curso Requests admitidos en curso por clase",
+        "# TYPE panaderia_admision_en_curso gauge",
+    ]
+    lineas += [f'panaderia_admision_en_curso{{clase="{clase.nombre}"}} {clase.en_curso}' for clase in control.clases]
+    lineas += [
+        "# HELP panaderia_admision_en_cola Requests esperando lugar por clase",
+        "# TYPE panaderia_admision_en_cola gauge",
+    ]
+    lineas += [f'panaderia_admision_en_cola{{clase="{clase.nombre}"}} {len(clase.cola)}' for clase in control.clases]
+    lineas += [
+        "# HELP panaderia_admision_admitidos_total Requests admitidos por clase",
+        "# TYPE panaderia_admision_admitidos_total counter",
+    ]
+    lineas += [f'panaderia_admision_admitidos_total{{clase="{clase.nombre}"}} {clase.admitidos}' for clase in control.clases]
+    lineas += [
+        "# HELP panaderia_admision_rechazos_total Requests rechazados con 503 por clase y motivo",
+        "# TYPE panaderia_admision_rechazos_total counter",
+    ]
+    for clase in control.clases:
+        for motivo, cantidad in clase.rechazos.items():
+            lineas.append(f'panaderia_admision_rechazos_total{{clase="{clase.nombre}",motivo="{motivo}"}} {cantidad}')
+    lineas += [
+        "# HELP panaderia_admision_espera_segundos_total Tiempo total esperado en cola por clase",
+        "# TYPE panaderia_admision_espera_segundos_total counter",
+    ]
+    lineas += [f'panaderia_admision_espera_segundos_total{{clase="{clase.nombre}"}} {clase.segundos_en_cola:.6f}' for clase in control.clases]
+    return lineas
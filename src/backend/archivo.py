@@ -0,0 +1,295 @@
+"""
+Archivo de ventas por mes en archivos SQLite de solo lectura
+
+Las tablas ventas e items_venta solo crecen. El archivado mueve cada mes cerrado (anterior a
+los últimos PANADERIA_ARCHIVO_MESES_CALIENTES meses) a un archivo propio,
+PANADERIA_ARCHIVO_DIR/ventas_YYYY-MM.db, que queda compactado (VACUUM) y de solo lectura.
+La tabla archivos_ventas registra cada mes archivado con su rango de ids.
+
+- Los reportes leen los resúmenes precalculados, que no se archivan, así que no cambian.
+- GET /api/ventas/{id}, GET /api/ventas, la exportación de ventas y la reconstrucción de los
+  resúmenes adjuntan (ATTACH) el archivo del mes que necesitan solo mientras lo consultan.
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.archivo --archivar
+    python -m src.backend.archivo --archivar --meses-calientes 6
+    python -m src.backend.archivo --mes 2024-01
+    python -m src.backend.archivo --listar
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.backend import models
+from src.backend import schemas
+
+ARCHIVO_DIR = os.getenv("PANADERIA_ARCHIVO_DIR", "./archivo_ventas")
+ARCHIVO_MESES_CALIENTES = int(os.getenv("PANADERIA_ARCHIVO_MESES_CALIENTES", "3"))
+
+# Nombre con el que se adjunta el archivo que se está escribiendo durante el archivado
+ALIAS_DESTINO = "archivo_destino"
+
+logger = logging.getLogger("panaderia.archivo")
+
+def _tabla_destino(tabla: Table, metadata: MetaData) -> Table:
+    """Copia de una tabla en el archivo adjunto, sin claves foráneas (productos no se archiva)"""
+    return Table(
+        tabla.name, metadata,
+        *(Column(columna.name, columna.type, primary_key=columna.primary_key, nullable=columna.nullable) for columna in tabla.columns),
+        schema=ALIAS_DESTINO
+    )
+
+_metadata_destino = MetaData()
+ventas_destino = _tabla_destino(models.Venta.__table__, _metadata_destino)
+items_destino = _tabla_destino(models.ItemVenta.__table__, _metadata_destino)
+Index("ix_ventas_creada_en", ventas_destino.c.creada_en)
+Index("ix_items_venta_venta_id", items_destino.c.venta_id)
+
+def rango_mes(mes: str) -> Tuple[datetime, datetime]:
+    """Primer instante del mes y del mes siguiente"""
+    inicio = datetime.strptime(mes, "%Y-%m")
+    return inicio, datetime(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+
+def ruta_archivo(nombre: str) -> str:
+    return os.path.join(ARCHIVO_DIR, nombre)
+
+# ==================== ARCHIVADO ====================
+
+def meses_a_archivar(db: Session, meses_calientes: int = ARCHIVO_MESES_CALIENTES, hoy: Optional[date] = None) -> List[str]:
+    """Meses con ventas anteriores a la ventana caliente (el mes en curso y los `meses_calientes` anteriores)"""
+    hoy = hoy or date.today()
+    indice = hoy.year * 12 + hoy.month - 1 - meses_calientes
+    limite = datetime(indice // 12, indice % 12 + 1, 1)
+    mes = func.strftime("%Y-%m", models.Venta.creada_en)
+    return [fila[0] for fila in db.query(mes).filter(models.Venta.creada_en < limite).distinct().order_by(mes)]
+
+def archivar_mes(engine, mes: str) -> dict:
+    """Mover las ventas del mes (y sus items) a su archivo, compactarlo y dejarlo de solo lectura
+
+    Se puede volver a ejecutar sobre un mes ya archivado (por ejemplo después de un corte a
+    mitad de camino, o si se registraron ventas con fecha de ese mes): agrega lo que falte.
+    """
+    inicio, fin = rango_mes(mes)
+    nombre = f"ventas_{mes}.db"
+    ruta = ruta_archivo(nombre)
+    os.makedirs(ARCHIVO_DIR, exist_ok=True)
+    if os.path.exists(ruta):
+        os.chmod(ruta, 0o644)
+
+    del_mes = (models.Venta.creada_en >= inicio) & (models.Venta.creada_en < fin)
+    ids_del_mes = select(models.Venta.id).where(del_mes)
+    with engine.connect() as conexion:
+        conexion.exec_driver_sql(f"ATTACH DATABASE ? AS {ALIAS_DESTINO}", (ruta,))
+        try:
+            _metadata_destino.create_all(conexion)
+            columnas_ventas = [columna.name for columna in ventas_destino.columns]
+            columnas_items = [columna.name for columna in items_destino.columns]
+
+            # Con WAL una transacción sobre dos bases no es atómica en conjunto: primero se
+            # confirma la copia y recién después se borra de la base principal
+            conexion.execute(
+                insert(ventas_destino).prefix_with("OR IGNORE").from_select(
+                    columnas_ventas,
+                    select(*(models.Venta.__table__.c[c] for c in columnas_ventas)).where(del_mes)
+                )
+            )
+            conexion.execute(
+                insert(items_destino).prefix_with("OR IGNORE").from_select(
+                    columnas_items,
+                    select(*(models.ItemVenta.__table__.c[c] for c in columnas_items))
+                    .where(models.ItemVenta.venta_id.in_(ids_del_mes))
+                )
+            )
+            conexion.commit()
+
+            en_base = conexion.execute(
+                select(func.count()).select_from(models.ItemVenta).where(models.ItemVenta.venta_id.in_(ids_del_mes))
+            ).scalar()
+            en_archivo = conexion.execute(
+                select(func.count()).select_from(items_destino).where(items_destino.c.venta_id.in_(
+                    select(ventas_destino.c.id).where(ventas_destino.c.creada_en >= inicio, ventas_destino.c.creada_en < fin)
+                ))
+            ).scalar()
+            if en_archivo < en_base:
+                raise RuntimeError(f"{en_base - en_archivo} items del mes {mes} no se copiaron al archivo")
+
+            conexion.execute(delete(models.ItemVenta).where(models.ItemVenta.venta_id.in_(ids_del_mes)))
+            conexion.execute(delete(models.Venta).where(del_mes))
+            primera, ultima, ventas = conexion.execute(
+                select(func.min(ventas_destino.c.id), func.max(ventas_destino.c.id), func.count())
+            ).one()
+            items = conexion.execute(select(func.count()).select_from(items_destino)).scalar()
+            registro = {
+                "mes": mes,
+                "archivo": nombre,
+                "primera_venta_id": primera or 0,
+                "ultima_venta_id": ultima or 0,
+                "ventas": ventas,
+                "items": items,
+                "archivado_en": datetime.now()
+            }
+            sentencia = sqlite_insert(models.ArchivoVentas.__table__)
+            conexion.execute(
+                sentencia.on_conflict_do_update(
+                    index_elements=["mes"],
+                    set_={campo: sentencia.excluded[campo] for campo in registro if campo != "mes"}
+                ),
+                registro
+            )
+            conexion.commit()
+        finally:
+            conexion.rollback()
+            conexion.exec_driver_sql(f"DETACH DATABASE {ALIAS_DESTINO}")
+
+    compactado = sqlite3.connect(ruta)
+    try:
+        compactado.execute("VACUUM")
+    finally:
+        compactado.close()
+    os.chmod(ruta, 0o444)
+    return registro
+
+# ==================== CONSULTAS SOBRE LOS ARCHIVOS ====================
+
+def _uri_solo_lectura(nombre: str) -> str:
+    return f"file:{quote(os.path.abspath(ruta_archivo(nombre)))}?mode=ro"
+
+@contextmanager
+def adjuntar(db: Session, registro: models.ArchivoVentas):
+    """Adjuntar el archivo de un mes a la conexión de la sesión mientras dura el bloque
+
+    Devuelve las execution_options que redirigen las tablas ventas e items_venta al archivo.
+    """
+    alias = "archivo_" + registro.mes.replace("-", "_")
+    conexion = db.connection()
+    conexion.exec_driver_sql(f"ATTACH DATABASE ? AS {alias}", (_uri_solo_lectura(registro.archivo),))
+    try:
+        yield {"schema_translate_map": {None: alias}}
+    finally:
+        conexion.exec_driver_sql(f"DETACH DATABASE {alias}")
+
+def archivos(db: Session, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> List[models.ArchivoVentas]:
+    """Meses archivados (del más antiguo al más reciente) que se superponen con el rango"""
+    desde = desde.replace(tzinfo=None) if desde is not None else None
+    hasta = hasta.replace(tzinfo=None) if hasta is not None else None
+    registros = []
+    for registro in db.query(models.ArchivoVentas).order_by(models.ArchivoVentas.mes).all():
+        inicio, fin = rango_mes(registro.mes)
+        if (desde is not None and fin <= desde) or (hasta is not None and inicio >= hasta):
+            continue
+        if not os.path.exists(ruta_archivo(registro.archivo)):
+            logger.warning("No se encontró el archivo %s del mes %s", registro.archivo, registro.mes)
+            continue
+        registros.append(registro)
+    return registros
+
+def _leer_ventas(db: Session, opciones: dict, condiciones: list, limite: Optional[int] = None) -> List[schemas.VentaResponse]:
+    """Ventas con sus items desde un archivo adjunto, de la más reciente a la más antigua"""
+    sentencia = (
+        select(models.Venta.id, models.Venta.fecha, models.Venta.total)
+        .where(*condiciones)
+        .order_by(models.Venta.id.desc())
+    )
+    if limite is not None:
+        sentencia = sentencia.limit(limite)
+    filas = db.execute(sentencia, execution_options=opciones).all()
+    items = {fila.id: [] for fila in filas}
+    if items:
+        for item in db.execute(
+            select(models.ItemVenta.__table__).where(models.ItemVenta.venta_id.in_(items)).order_by(models.ItemVenta.id),
+            execution_options=opciones
+        ):
+            items[item.venta_id].append(schemas.ItemVentaResponse.model_validate(item, from_attributes=True))
+    return [schemas.VentaResponse(id=fila.id, fecha=fila.fecha, total=fila.total, items=items[fila.id]) for fila in filas]
+
+def obtener_venta(db: Session, venta_id: int) -> Optional[schemas.VentaResponse]:
+    """Buscar una venta en el archivo del mes que corresponde a su id"""
+    for registro in db.query(models.ArchivoVentas).filter(
+        models.ArchivoVentas.primera_venta_id <= venta_id,
+        models.ArchivoVentas.ultima_venta_id >= venta_id
+    ).all():
+        if not os.path.exists(ruta_archivo(registro.archivo)):
+            continue
+        with adjuntar(db, registro) as opciones:
+            ventas = _leer_ventas(db, opciones, [models.Venta.id == venta_id])
+        if ventas:
+            return ventas[0]
+    return None
+
+def ventas_archivadas(
+    db: Session,
+    limite: int,
+    cursor: Optional[int] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None
+) -> List[schemas.VentaResponse]:
+    """Hasta `limite` ventas archivadas con los mismos filtros que GET /api/ventas"""
+    condiciones = []
+    if cursor is not None:
+        condiciones.append(models.Venta.id < cursor)
+    if desde is not None:
+        condiciones.append(models.Venta.creada_en >= desde)
+    if hasta is not None:
+        condiciones.append(models.Venta.creada_en < hasta)
+
+    ventas = []
+    for registro in reversed(archivos(db, desde, hasta)):
+        if cursor is not None and registro.primera_venta_id >= cursor:
+            continue
+        with adjuntar(db, registro) as opciones:
+            ventas += _leer_ventas(db, opciones, condiciones, limite - len(ventas))
+        if len(ventas) >= limite:
+            break
+    return sorted(ventas, key=lambda venta: venta.id, reverse=True)
+
+def opciones_historial(db: Session, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> Iterator[dict]:
+    """execution_options para recorrer el historial completo: cada archivo del rango y la base
+
+    Cada archivo queda adjunto mientras se consume su iteración.
+    """
+    for registro in archivos(db, desde, hasta):
+        with adjuntar(db, registro) as opciones:
+            yield opciones
+    yield {}
+
+if __name__ == "__main__":
+    from src.backend.database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Archivar ventas de meses cerrados en archivos SQLite por mes")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--archivar", action="store_true", help="Archivar los meses anteriores a la ventana caliente")
+    grupo.add_argument("--mes", help="Archivar un mes puntual (YYYY-MM)")
+    grupo.add_argument("--listar", action="store_true", help="Mostrar los meses archivados")
+    parser.add_argument("--meses-calientes", type=int, default=ARCHIVO_MESES_CALIENTES)
+    args = parser.parse_args()
+
+    if engine.dialect.name != "sqlite":
+        print("✗ El archivo de ventas solo está disponible con SQLite")
+        sys.exit(1)
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.listar:
+            for registro in db.query(models.ArchivoVentas).order_by(models.ArchivoVentas.mes):
+                print(f"{registro.mes}: {registro.ventas} ventas, {registro.items} items ({registro.archivo})")
+            sys.exit(0)
+        meses = [args.mes] if args.mes else meses_a_archivar(db, args.meses_calientes)
+    finally:
+        db.close()
+
+    if not meses:
+        print("✓ No hay meses para archivar")
+    for mes in meses:
+        registro = archivar_mes(engine, mes)
+        print(f"✓ {mes}: {registro['ventas']} ventas y {registro['items']} items en {ruta_archivo(registro['archivo'])}")
@@ -0,0 +1,53 @@
+"""
+Versiones async de los endpoints más usados
+
+Con PANADERIA_ASYNC_DB habilitado, main registra este router antes que las rutas sync, así
+que estas versiones tienen prioridad para los mismos paths. Cada handler ejecuta la lógica
+del endpoint sync con AsyncSession.run_sync: las reglas de negocio son exactamente las mismas,
+pero la espera de la base de datos no ocupa un hilo del threadpool.
+
+La respuesta se serializa dentro de run_sync porque las relaciones lazy (items, receta) solo
+pueden cargarse ahí.
+"""
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.backend import ingesta
+from src.backend import schemas
+from src.backend.database import get_async_db
+
+router = APIRouter()
+
+def _main():
+    # Import diferido: main importa este módulo al iniciar para registrar el router
+    from src.backend import main
+    return main
+
+@router.get("/api/productos", response_model=List[schemas.ProductoResponse], tags=["Productos"])
+async def get_productos_async(if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    """Obtener todos los productos"""
+    return await db.run_sync(lambda sesion: _main().get_productos(if_none_match, sesion))
+
+@router.post("/api/productos/{producto_id}/preparar", response_model=schemas.ProductoResponse, tags=["Recetas"])
+async def preparar_receta_async(producto_id: int, preparar: schemas.PrepararRecetaRequest, db: AsyncSession = Depends(get_async_db)):
+    """Preparar una receta (descontar ingredientes del stock y aumentar stock del producto)"""
+    def preparar_sync(sesion):
+        producto = _main().preparar_receta(producto_id, preparar, sesion)
+        return schemas.ProductoResponse.model_validate(producto)
+    return await db.run_sync(preparar_sync)
+
+@router.post("/api/ventas", response_model=schemas.VentaResponse, status_code=status.HTTP_201_CREATED, tags=["Ventas"])
+async def create_venta_async(venta: schemas.VentaCreate, db: AsyncSession = Depends(get_async_db)):
+    """Crear una nueva venta"""
+    if ingesta.cola_ventas is not None:
+        # La validación y la reserva son sync; la espera del commit no ocupa el event loop
+        futuro = await db.run_sync(lambda sesion: ingesta.cola_ventas.encolar(sesion, venta))
+        return await asyncio.wrap_future(futuro)
+
+    def crear_sync(sesion):
+        db_venta = _main().create_venta(venta, sesion)
+        return schemas.VentaResponse.model_validate(db_venta)
+    return await db.run_sync(crear_sync)
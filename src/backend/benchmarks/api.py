@@ -0,0 +1,325 @@
+"""
+Benchmark de los endpoints más usados de la API
+
+Genera una base sintética a la escala indicada, y ejecuta cada escenario:
+- en proceso: llamando a la aplicación ASGI directamente (sin red)
+- por HTTP: contra un uvicorn local levantado en un hilo del mismo proceso
+
+con la concurrencia configurada. Para cada escenario informa latencias p50/p95/p99,
+throughput y sentencias SQL por request, en JSON para poder comparar entre commits.
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.benchmarks.api --productos 2000 --items-venta 1000000 --salida bench.json
+    python -m src.backend.benchmarks.api --productos 200 --items-venta 20000 --requests 200 --modo en_proceso
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ESCENARIOS = ("get_productos", "get_stock", "get_ventas", "reporte_ventas", "create_venta", "preparar_receta", "produccion")
+MODOS = ("en_proceso", "http")
+
+class ContadorSQL:
+    """Cuenta las sentencias SQL ejecutadas por los engines de la aplicación"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.total += 1
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))
+    return ordenados[indice]
+
+def generador_requests(escenario, producto_ids, rng):
+    """Devuelve una función que arma (método, path, body) para el escenario"""
+    hoy = datetime.now().date()
+
+    def get_productos():
+        return "GET", "/api/productos", None
+
+    def get_stock():
+        return "GET", "/api/stock", None
+
+    def get_ventas():
+        return "GET", "/api/ventas?limite=100", None
+
+    def reporte_ventas():
+        desde = hoy - timedelta(days=30)
+        return "GET", f"/api/reportes/ventas?granularidad=dia&desde={desde.isoformat()}&hasta={hoy.isoformat()}", None
+
+    def create_venta():
+        items = [
+            {"producto_id": rng.choice(producto_ids), "cantidad": rng.randint(1, 4), "tipo_venta": "unidad"}
+            for _ in range(rng.randint(1, 5))
+        ]
+        return "POST", "/api/ventas", {"items": items}
+
+    def preparar_receta():
+        return "POST", f"/api/productos/{rng.choice(producto_ids)}/preparar", {"cantidad": 1}
+
+    def produccion():
+        items = [{"producto_id": producto_id, "cantidad": 1} for producto_id in rng.sample(producto_ids, k=min(20, len(producto_ids)))]
+        return "POST", "/api/produccion", {"items": items}
+
+    return {
+        "get_productos": get_productos,
+        "get_stock": get_stock,
+        "get_ventas": get_ventas,
+        "reporte_ventas": reporte_ventas,
+        "create_venta": create_venta,
+        "preparar_receta": preparar_receta,
+        "produccion": produccion
+    }[escenario]
+
+def resumir(escenario, modo, concurrencia, latencias, errores, duracion, sentencias):
+    requests = len(latencias) + errores
+    return {
+        "escenario": escenario,
+        "modo": modo,
+        "concurrencia": concurrencia,
+        "requests": requests,
+        "errores": errores,
+        "duracion_s": round(duracion, 3),
+        "throughput_rps": round(requests / duracion, 1) if duracion > 0 else None,
+        "latencia_ms": {
+            "p50": round(percentil(latencias, 50) * 1000, 3) if latencias else None,
+            "p95": round(percentil(latencias, 95) * 1000, 3) if latencias else None,
+            "p99": round(percentil(latencias, 99) * 1000, 3) if latencias else None,
+            "max": round(max(latencias) * 1000, 3) if latencias else None,
+            "media": round(sum(latencias) / len(latencias) * 1000, 3) if latencias else None
+        },
+        "sql_por_request": round(sentencias / requests, 2) if requests else None
+    }
+
+# ==================== EN PROCESO (ASGI) ====================
+
+async def _llamar_asgi(app, metodo, path, body):
+    """Ejecutar un request contra la aplicación ASGI y devolver el status"""
+    ruta, _, query = path.partition("?")
+    contenido = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": metodo,
+        "scheme": "http",
+        "path": ruta,
+        "raw_path": ruta.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json"), (b"content-length", str(len(contenido)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80)
+    }
+    enviado = False
+    respuesta = {}
+
+    async def receive():
+        nonlocal enviado
+        if not enviado:
+            enviado = True
+            return {"type": "http.request", "body": contenido, "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(mensaje):
+        if mensaje["type"] == "http.response.start":
+            respuesta["status"] = mensaje["status"]
+
+    await app(scope, receive, send)
+    return respuesta.get("status", 500)
+
+async def _ejecutar_en_proceso(app, generar, cantidad, concurrencia):
+    latencias, errores = [], 0
+    pendientes = iter(range(cantidad))
+
+    async def trabajador():
+        nonlocal errores
+        for _ in pendientes:
+            metodo, path, body = generar()
+            inicio = time.perf_counter()
+            estado = await _llamar_asgi(app, metodo, path, body)
+            if estado >= 400:
+                errores += 1
+            else:
+                latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    return latencias, errores, time.perf_counter() - inicio
+
+# ==================== HTTP (UVICORN LOCAL) ====================
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _iniciar_uvicorn(app):
+    import uvicorn
+
+    puerto = _puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning"))
+    thread = threading.Thread(target=servidor.run, daemon=True)
+    thread.start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor, thread, puerto
+
+def _ejecutar_http(puerto, generar, cantidad, concurrencia):
+    latencias, errores = [], 0
+    lock = threading.Lock()
+    pendientes = iter(range(cantidad))
+
+    def trabajador():
+        nonlocal errores
+        conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+        propias, fallidas = [], 0
+        while True:
+            with lock:
+                if next(pendientes, None) is None:
+                    break
+                metodo, path, body = generar()
+            contenido = json.dumps(body) if body is not None else None
+            inicio = time.perf_counter()
+            conexion.request(metodo, path, body=contenido, headers={"Content-Type": "application/json"})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status >= 400:
+                fallidas += 1
+            else:
+                propias.append(time.perf_counter() - inicio)
+        conexion.close()
+        with lock:
+            latencias.extend(propias)
+            errores += fallidas
+
+    threads = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencias, errores, time.perf_counter() - inicio
+
+# ==================== EJECUCIÓN ====================
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def ejecutar(args) -> dict:
+    # La URL de la base se define antes de importar la aplicación (database.py la lee al importar)
+    ruta_base = args.base or os.path.join(tempfile.mkdtemp(prefix="bench_api_"), "bench.db")
+    reusar = args.reusar and os.path.exists(ruta_base)
+    os.environ["PANADERIA_DATABASE_URL"] = f"sqlite:///{ruta_base}"
+
+    from sqlalchemy import event
+    from src.backend import database, models
+    from src.backend.benchmarks.datos import generar_datos
+    from src.backend.main import app
+
+    models.Base.metadata.create_all(bind=database.engine)
+    filas = None
+    if not reusar:
+        print(f"Generando datos en {ruta_base}...", file=sys.stderr)
+        db = database.SessionLocal()
+        try:
+            filas = generar_datos(
+                db,
+                productos=args.productos,
+                ingredientes=args.ingredientes,
+                items_venta=args.items_venta,
+                semilla=args.semilla
+            )
+        finally:
+            db.close()
+
+    contador = ContadorSQL()
+    event.listen(database.engine, "before_cursor_execute", contador)
+    if database.async_engine is not None:
+        event.listen(database.async_engine.sync_engine, "before_cursor_execute", contador)
+
+    db = database.SessionLocal()
+    producto_ids = [producto_id for (producto_id,) in db.query(models.Producto.id).all()]
+    db.close()
+
+    rng = random.Random(args.semilla)
+    modos = MODOS if args.modo == "ambos" else (args.modo,)
+    resultados = []
+
+    servidor = None
+    if "http" in modos:
+        servidor, thread, puerto = _iniciar_uvicorn(app)
+
+    try:
+        for escenario in args.escenarios:
+            generar = generador_requests(escenario, producto_ids, rng)
+            for modo in modos:
+                print(f"Ejecutando {escenario} ({modo})...", file=sys.stderr)
+                sentencias_antes = contador.total
+                if modo == "en_proceso":
+                    latencias, errores, duracion = asyncio.run(_ejecutar_en_proceso(app, generar, args.requests, args.concurrencia))
+                else:
+                    latencias, errores, duracion = _ejecutar_http(puerto, generar, args.requests, args.concurrencia)
+                resultados.append(resumir(escenario, modo, args.concurrencia, latencias, errores, duracion, contador.total - sentencias_antes))
+    finally:
+        if servidor is not None:
+            servidor.should_exit = True
+            thread.join()
+
+    return {
+        "commit": _commit_actual(),
+        "fecha": datetime.now().isoformat(),
+        "configuracion": {
+            "base": ruta_base,
+            "datos_generados": filas,
+            "requests_por_escenario": args.requests,
+            "concurrencia": args.concurrencia,
+            "async_db": database.ASYNC_DB,
+            "sqlite_perfil": database.SQLITE_PERFIL
+        },
+        "resultados": resultados
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los endpoints más usados de la API")
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--ingredientes", type=int, default=300)
+    parser.add_argument("--items-venta", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests por escenario y modo")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--modo", choices=(*MODOS, "ambos"), default="ambos")
+    parser.add_argument("--escenarios", nargs="+", choices=ESCENARIOS, default=list(ESCENARIOS))
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--base", help="Archivo SQLite a usar (por defecto uno temporal)")
+    parser.add_argument("--reusar", action="store_true", help="No regenerar los datos si --base ya existe")
+    parser.add_argument("--salida", help="Archivo donde guardar el JSON (por defecto se imprime)")
+    args = parser.parse_args()
+
+    resultado = ejecutar(args)
+    salida = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            archivo.write(salida)
+        print(f"Resultados guardados en {args.salida}", file=sys.stderr)
+    else:
+        print(salida)
@@ -0,0 +1,117 @@
+"""
+Generación de datos sintéticos para benchmarks
+
+Crea un catálogo y un historial de ventas a escala configurable (mucho más grande que los
+5 productos de /api/init-database) usando inserciones en lote. Los datos son deterministas
+para una misma semilla, así los resultados se pueden comparar entre commits.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from src.backend import models
+from src.backend import reportes
+
+TAMANO_LOTE = 10000
+
+def _en_lotes(filas, tamano=TAMANO_LOTE):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def generar_datos(
+    db: Session,
+    productos: int = 2000,
+    ingredientes: int = 300,
+    items_venta: int = 1000000,
+    items_por_venta: int = 4,
+    dias: int = 180,
+    semilla: int = 42
+) -> dict:
+    """Poblar una base vacía con datos sintéticos. Devuelve la cantidad de filas creadas"""
+    rng = random.Random(semilla)
+
+    # Ingredientes con stock de sobra para que los benchmarks no fallen por faltantes
+    db.execute(insert(models.Stock), [
+        {"nombre": f"Ingrediente {i:04d}", "cantidad": 1e9, "unidad": rng.choice(["kg", "L"])}
+        for i in range(ingredientes)
+    ])
+
+    db.execute(insert(models.Producto), [
+        {
+            "nombre": f"Producto {i:05d}",
+            "precio": round(rng.uniform(50, 5000), 2),
+            "unidades": 1e9,
+            "peso_kg": 1e9,
+            "unidades_por_receta": float(rng.choice([1, 6, 8, 10, 12, 24])),
+            "peso_por_receta": round(rng.uniform(0.2, 3.0), 2)
+        }
+        for i in range(productos)
+    ])
+
+    producto_filas = db.query(models.Producto.id, models.Producto.precio, models.Producto.unidades_por_receta).all()
+    receta_filas = []
+    for producto_id, _, _ in producto_filas:
+        for ingrediente in rng.sample(range(ingredientes), k=min(ingredientes, rng.randint(3, 8))):
+            receta_filas.append({
+                "producto_id": producto_id,
+                "ingrediente": f"Ingrediente {ingrediente:04d}",
+                "cantidad": round(rng.uniform(0.01, 0.5), 3),
+                "unidad": "kg"
+            })
+    for lote in _en_lotes(receta_filas):
+        db.execute(insert(models.IngredienteReceta), lote)
+
+    # Historial de ventas repartido en los últimos `dias` días
+    cantidad_ventas = max(1, items_venta // items_por_venta)
+    inicio = datetime.now() - timedelta(days=dias)
+    paso = timedelta(days=dias) / cantidad_ventas
+    venta_id = 0
+    items_creados = 0
+    ventas_lote, items_lote = [], []
+    for n in range(cantidad_ventas):
+        venta_id += 1
+        fecha = inicio + paso * n
+        total = 0.0
+        for _ in range(items_por_venta):
+            producto_id, precio, unidades_por_receta = producto_filas[rng.randrange(len(producto_filas))]
+            cantidad = float(rng.randint(1, 6))
+            precio_unidad = precio / unidades_por_receta
+            total += precio_unidad * cantidad
+            items_lote.append({
+                "venta_id": venta_id,
+                "producto_id": producto_id,
+                "producto_nombre": f"Producto {producto_id:05d}",
+                "producto_precio": precio_unidad,
+                "cantidad": cantidad,
+                "tipo_venta": models.TipoVentaEnum.UNIDAD,
+                "cantidad_peso_kg": None
+            })
+        items_creados += items_por_venta
+        ventas_lote.append({"id": venta_id, "fecha": fecha.isoformat(), "creada_en": fecha, "total": total})
+        if len(items_lote) >= TAMANO_LOTE:
+            db.execute(insert(models.Venta), ventas_lote)
+            db.execute(insert(models.ItemVenta), items_lote)
+            ventas_lote, items_lote = [], []
+    if ventas_lote:
+        db.execute(insert(models.Venta), ventas_lote)
+        db.execute(insert(models.ItemVenta), items_lote)
+    db.commit()
+
+    # Los reportes leen de los resúmenes, que se completan igual que en una base real
+    reportes.reconstruir_resumenes(db)
+
+    return {
+        "productos": productos,
+        "ingredientes": ingredientes,
+        "ingredientes_receta": len(receta_filas),
+        "ventas": cantidad_ventas,
+        "items_venta": items_creados
+    }
@@ -0,0 +1,111 @@
+"""
+Comparación de la serialización con schemas y la serialización rápida (ver serializacion.py)
+
+Sobre una base sintética, pide GET /api/productos (sin caché) y páginas de GET /api/ventas
+por los dos caminos, verifica que las respuestas tengan exactamente los mismos bytes e
+informa la latencia de cada uno.
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.benchmarks.serializacion --productos 2000 --items-venta 200000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+async def _obtener(app, path: str) -> bytes:
+    """GET contra la aplicación ASGI, devuelve el cuerpo de la respuesta"""
+    ruta, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": ruta,
+        "raw_path": ruta.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80)
+    }
+    partes = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        if mensaje["type"] == "http.response.start" and mensaje["status"] != 200:
+            raise RuntimeError(f"{path} respondió {mensaje['status']}")
+        if mensaje["type"] == "http.response.body":
+            partes.append(mensaje.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(partes)
+
+def ejecutar(args) -> dict:
+    ruta_base = args.base or os.path.join(tempfile.mkdtemp(prefix="bench_serializacion_"), "bench.db")
+    reusar = args.reusar and os.path.exists(ruta_base)
+    os.environ["PANADERIA_DATABASE_URL"] = f"sqlite:///{ruta_base}"
+
+    from src.backend import database, models, serializacion
+    from src.backend.benchmarks.datos import generar_datos
+    from src.backend.cache import cache_catalogo
+    from src.backend.main import app
+
+    models.Base.metadata.create_all(bind=database.engine)
+    if not reusar:
+        print(f"Generando datos en {ruta_base}...", file=sys.stderr)
+        db = database.SessionLocal()
+        try:
+            generar_datos(db, productos=args.productos, ingredientes=args.ingredientes, items_venta=args.items_venta, semilla=args.semilla)
+        finally:
+            db.close()
+
+    paths = ["/api/productos", *(f"/api/ventas?limite={limite}" for limite in (100, 1000))]
+    resultados = []
+    for path in paths:
+        cuerpos, tiempos = {}, {}
+        for rapida in (False, True):
+            serializacion.SERIALIZACION_RAPIDA = rapida
+            muestras = []
+            for _ in range(args.repeticiones):
+                cache_catalogo.invalidar()
+                inicio = time.perf_counter()
+                cuerpos[rapida] = asyncio.run(_obtener(app, path))
+                muestras.append(time.perf_counter() - inicio)
+            tiempos[rapida] = statistics.median(muestras) * 1000
+        resultados.append({
+            "path": path,
+            "bytes": len(cuerpos[False]),
+            "identicos": cuerpos[False] == cuerpos[True],
+            "schemas_ms": round(tiempos[False], 2),
+            "rapida_ms": round(tiempos[True], 2),
+            "aceleracion": round(tiempos[False] / tiempos[True], 2) if tiempos[True] else None
+        })
+    return {
+        "encoder": "orjson" if serializacion.orjson is not None else "json",
+        "base": ruta_base,
+        "resultados": resultados
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparar la serialización con schemas y la rápida")
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--ingredientes", type=int, default=300)
+    parser.add_argument("--items-venta", type=int, default=200000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--base", help="Archivo SQLite a usar (por defecto uno temporal)")
+    parser.add_argument("--reusar", action="store_true", help="No regenerar los datos si --base ya existe")
+    args = parser.parse_args()
+
+    resultado = ejecutar(args)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if not all(fila["identicos"] for fila in resultado["resultados"]):
+        sys.exit(1)
@@ -0,0 +1,115 @@
+"""
+Benchmark de perfiles de conexión SQLite
+
+Compara el perfil "compatible" (sin PRAGMAs, journal en modo DELETE) contra el perfil
+"produccion" (WAL, synchronous=NORMAL, busy_timeout, cache y mmap) con escritores que
+registran ventas y lectores que listan productos y stock al mismo tiempo.
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.benchmarks.sqlite_perfil --escritores 4 --lectores 8 --segundos 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from src.backend import models
+from src.backend import schemas
+from src.backend import main
+from src.backend.database import crear_engine
+
+PERFILES = ("compatible", "produccion")
+
+def preparar_base(SessionPrueba, productos: int):
+    db = SessionPrueba()
+    db.add_all([models.Stock(nombre=f"Ingrediente {i}", cantidad=1e9, unidad="kg") for i in range(20)])
+    db.add_all([
+        models.Producto(nombre=f"Producto {i}", precio=100 + i, unidades=1e9, peso_kg=1e9, unidades_por_receta=10, peso_por_receta=1.0)
+        for i in range(productos)
+    ])
+    db.commit()
+    ids = [producto_id for (producto_id,) in db.query(models.Producto.id).all()]
+    db.close()
+    return ids
+
+def escritor(SessionPrueba, producto_ids, fin, contadores, lock, indice):
+    ventas, bloqueos = 0, 0
+    i = indice
+    while time.perf_counter() < fin:
+        db = SessionPrueba()
+        try:
+            item = schemas.ItemVentaCreate(producto_id=producto_ids[i % len(producto_ids)], cantidad=1, tipo_venta=schemas.TipoVenta.UNIDAD)
+            main.create_venta(schemas.VentaCreate(items=[item]), db)
+            ventas += 1
+        except OperationalError:
+            db.rollback()
+            bloqueos += 1
+        except HTTPException:
+            pass
+        finally:
+            db.close()
+        i += 1
+    with lock:
+        contadores["escrituras"] += ventas
+        contadores["bloqueos_escritura"] += bloqueos
+
+def lector(SessionPrueba, fin, contadores, lock):
+    lecturas, bloqueos = 0, 0
+    while time.perf_counter() < fin:
+        db = SessionPrueba()
+        try:
+            db.query(models.Producto).options(selectinload(models.Producto.receta)).all()
+            db.query(models.Stock).all()
+            lecturas += 1
+        except OperationalError:
+            bloqueos += 1
+        finally:
+            db.close()
+    with lock:
+        contadores["lecturas"] += lecturas
+        contadores["bloqueos_lectura"] += bloqueos
+
+def medir(perfil: str, escritores: int, lectores: int, segundos: float, productos: int) -> dict:
+    directorio = tempfile.mkdtemp(prefix=f"perfil_{perfil}_")
+    engine = crear_engine(f"sqlite:///{os.path.join(directorio, 'bench.db')}", perfil=perfil)
+    models.Base.metadata.create_all(bind=engine)
+    SessionPrueba = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    producto_ids = preparar_base(SessionPrueba, productos)
+
+    contadores = {"escrituras": 0, "lecturas": 0, "bloqueos_escritura": 0, "bloqueos_lectura": 0}
+    lock = threading.Lock()
+    fin = time.perf_counter() + segundos
+    threads = [threading.Thread(target=escritor, args=(SessionPrueba, producto_ids, fin, contadores, lock, i)) for i in range(escritores)]
+    threads += [threading.Thread(target=lector, args=(SessionPrueba, fin, contadores, lock)) for _ in range(lectores)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracion = time.perf_counter() - inicio
+    engine.dispose()
+
+    return {
+        "perfil": perfil,
+        "escrituras_por_segundo": round(contadores["escrituras"] / duracion, 1),
+        "lecturas_por_segundo": round(contadores["lecturas"] / duracion, 1),
+        **contadores,
+        "duracion_segundos": round(duracion, 2)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparar perfiles de conexión SQLite bajo lecturas y escrituras concurrentes")
+    parser.add_argument("--escritores", type=int, default=4)
+    parser.add_argument("--lectores", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--productos", type=int, default=200)
+    args = parser.parse_args()
+
+    resultados = [medir(perfil, args.escritores, args.lectores, args.segundos, args.productos) for perfil in PERFILES]
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
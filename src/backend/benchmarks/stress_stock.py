@@ -0,0 +1,183 @@
+"""
+Prueba de estrés de descuentos concurrentes de stock
+
+Lanza ventas y preparaciones en paralelo sobre los mismos productos e ingredientes,
+cada hilo con su propia sesión (como varios workers de uvicorn), y verifica al final que:
+- ningún stock quedó negativo
+- el stock final coincide exactamente con el inicial menos lo vendido/consumido más lo producido
+  (es decir, que no se perdió ninguna actualización)
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.benchmarks.stress_stock --hilos 16 --operaciones 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.backend import models
+from src.backend import schemas
+from src.backend import main
+
+TOLERANCIA = 1e-6
+
+def preparar_base(SessionPrueba):
+    """Crear un catálogo chico para que todos los hilos compitan por las mismas filas"""
+    db = SessionPrueba()
+    db.add_all([
+        models.Stock(nombre="Harina", cantidad=50, unidad="kg"),
+        models.Stock(nombre="Levadura", cantidad=5, unidad="kg"),
+    ])
+    pan = models.Producto(nombre="Pan", precio=800, unidades=200, peso_kg=25, unidades_por_receta=8, peso_por_receta=1.0)
+    factura = models.Producto(nombre="Factura", precio=100, unidades=300, peso_kg=9, unidades_por_receta=10, peso_por_receta=0.3)
+    db.add_all([pan, factura])
+    db.flush()
+    db.add_all([
+        models.IngredienteReceta(producto_id=pan.id, ingrediente="Harina", cantidad=0.5, unidad="kg"),
+        models.IngredienteReceta(producto_id=pan.id, ingrediente="Levadura", cantidad=0.05, unidad="kg"),
+        models.IngredienteReceta(producto_id=factura.id, ingrediente="Harina", cantidad=0.2, unidad="kg"),
+    ])
+    db.commit()
+    ids = [pan.id, factura.id]
+    db.close()
+    return ids
+
+def leer_estado(SessionPrueba):
+    db = SessionPrueba()
+    stock = {s.nombre: s.cantidad for s in db.query(models.Stock).all()}
+    productos = {p.id: (p.unidades, p.peso_kg) for p in db.query(models.Producto).all()}
+    recetas = {
+        p.id: [(i.ingrediente, i.cantidad) for i in p.receta]
+        for p in db.query(models.Producto).all()
+    }
+    db.close()
+    return stock, productos, recetas
+
+def trabajador(SessionPrueba, producto_ids, operaciones, semilla, registro, lock):
+    rng = random.Random(semilla)
+    vendidos = []
+    preparados = []
+    rechazos = 0
+    for _ in range(operaciones):
+        db = SessionPrueba()
+        producto_id = rng.choice(producto_ids)
+        try:
+            if rng.random() < 0.7:
+                if rng.random() < 0.5:
+                    item = schemas.ItemVentaCreate(producto_id=producto_id, cantidad=rng.randint(1, 6), tipo_venta=schemas.TipoVenta.UNIDAD)
+                else:
+                    peso = round(rng.uniform(0.1, 1.0), 3)
+                    item = schemas.ItemVentaCreate(producto_id=producto_id, cantidad=peso, tipo_venta=schemas.TipoVenta.PESO, cantidad_peso_kg=peso)
+                venta = main.create_venta(schemas.VentaCreate(items=[item]), db)
+                vendidos.append(venta.id)
+            else:
+                cantidad = rng.randint(1, 4)
+                main.preparar_receta(producto_id, schemas.PrepararRecetaRequest(cantidad=cantidad), db)
+                preparados.append((producto_id, cantidad))
+        except HTTPException:
+            rechazos += 1
+        finally:
+            db.close()
+    with lock:
+        registro["ventas"].extend(vendidos)
+        registro["preparaciones"].extend(preparados)
+        registro["rechazos"] += rechazos
+
+def verificar(SessionPrueba, inicial, registro):
+    stock_inicial, productos_inicial, recetas = inicial
+    stock_final, productos_final, _ = leer_estado(SessionPrueba)
+    errores = []
+
+    # Stock esperado de ingredientes
+    stock_esperado = dict(stock_inicial)
+    productos_esperado = {pid: list(valores) for pid, valores in productos_inicial.items()}
+    db = SessionPrueba()
+    productos = {p.id: p for p in db.query(models.Producto).all()}
+    for producto_id, cantidad in registro["preparaciones"]:
+        for ingrediente, por_receta in recetas[producto_id]:
+            stock_esperado[ingrediente] -= por_receta * cantidad
+        productos_esperado[producto_id][0] += productos[producto_id].unidades_por_receta * cantidad
+        productos_esperado[producto_id][1] += productos[producto_id].peso_por_receta * cantidad
+
+    for venta in db.query(models.Venta).all():
+        for item in venta.items:
+            producto = productos[item.producto_id]
+            kg_por_unidad = producto.peso_por_receta / producto.unidades_por_receta
+            if item.tipo_venta == models.TipoVentaEnum.UNIDAD:
+                unidades, peso = item.cantidad, item.cantidad * kg_por_unidad
+            else:
+                peso = item.cantidad_peso_kg or item.cantidad
+                unidades = peso / kg_por_unidad
+            productos_esperado[item.producto_id][0] -= unidades
+            productos_esperado[item.producto_id][1] -= peso
+    cantidad_ventas = db.query(models.Venta).count()
+    db.close()
+
+    if cantidad_ventas != len(registro["ventas"]):
+        errores.append(f"Ventas confirmadas: {len(registro['ventas'])}, ventas en la base: {cantidad_ventas}")
+
+    for nombre, cantidad in stock_final.items():
+        if cantidad < -TOLERANCIA:
+            errores.append(f"Stock negativo de {nombre}: {cantidad}")
+        if abs(cantidad - stock_esperado[nombre]) > TOLERANCIA:
+            errores.append(f"Actualización perdida en {nombre}: esperado {stock_esperado[nombre]}, final {cantidad}")
+
+    for producto_id, (unidades, peso_kg) in productos_final.items():
+        esperado_unidades, esperado_peso = productos_esperado[producto_id]
+        if unidades < -TOLERANCIA or peso_kg < -TOLERANCIA:
+            errores.append(f"Stock negativo del producto {producto_id}: {unidades} unidades, {peso_kg} kg")
+        if abs(unidades - esperado_unidades) > TOLERANCIA or abs(peso_kg - esperado_peso) > TOLERANCIA:
+            errores.append(
+                f"Actualización perdida en producto {producto_id}: esperado {esperado_unidades} u / {esperado_peso} kg, "
+                f"final {unidades} u / {peso_kg} kg"
+            )
+    return errores
+
+def ejecutar(hilos: int, operaciones: int, semilla: int) -> int:
+    directorio = tempfile.mkdtemp(prefix="stress_stock_")
+    ruta = os.path.join(directorio, "stress.db")
+    engine = create_engine(f"sqlite:///{ruta}", connect_args={"check_same_thread": False, "timeout": 30})
+    models.Base.metadata.create_all(bind=engine)
+    SessionPrueba = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    producto_ids = preparar_base(SessionPrueba)
+    inicial = leer_estado(SessionPrueba)
+
+    registro = {"ventas": [], "preparaciones": [], "rechazos": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=trabajador, args=(SessionPrueba, producto_ids, operaciones, semilla + i, registro, lock))
+        for i in range(hilos)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    errores = verificar(SessionPrueba, inicial, registro)
+    engine.dispose()
+
+    print(f"Ventas confirmadas: {len(registro['ventas'])}")
+    print(f"Preparaciones confirmadas: {len(registro['preparaciones'])}")
+    print(f"Operaciones rechazadas por stock: {registro['rechazos']}")
+    if errores:
+        print("✗ Se detectaron inconsistencias:")
+        for error in errores:
+            print(f"  - {error}")
+        return 1
+    print("✓ Stock consistente: sin actualizaciones perdidas ni valores negativos")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de estrés de descuentos concurrentes de stock")
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--operaciones", type=int, default=200, help="Operaciones por hilo")
+    parser.add_argument("--semilla", type=int, default=1234)
+    args = parser.parse_args()
+    sys.exit(ejecutar(args.hilos, args.operaciones, args.semilla))
@@ -0,0 +1,109 @@
+"""
+Búsqueda de productos e ingredientes del stock por nombre (GET /api/productos/buscar y
+GET /api/stock/buscar)
+
+Cada tabla tiene un índice FTS5 de contenido externo (productos_fts y stock_fts) con el
+tokenizador unicode61 sin diacríticos, así "azucar" encuentra "Azúcar", y con índices de
+prefijo para buscar mientras se escribe ("az" encuentra "Azúcar" y "Azafrán"). Los resultados
+se ordenan por relevancia (bm25).
+
+Los índices se crean junto con las tablas y triggers de SQLite los mantienen al día ante
+cualquier escritura. Si se crean sobre una base existente se cargan con las filas actuales.
+Con otra base de datos (o un SQLite sin FTS5) la búsqueda usa un LIKE sin índice.
+"""
+import logging
+import re
+from typing import List
+
+from sqlalchemy import event, func, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from src.backend import models
+
+logger = logging.getLogger("panaderia.busqueda")
+
+TABLAS = {
+    "productos": models.Producto,
+    "stock": models.Stock,
+}
+
+def sentencias_fts(tabla: str) -> List[str]:
+    """Tabla virtual FTS5 sobre la columna nombre y los triggers que la sincronizan"""
+    fts = f"{tabla}_fts"
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+    nombre, content='{tabla}', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+)""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {tabla}
+BEGIN
+    INSERT INTO {fts} (rowid, nombre) VALUES (NEW.id, NEW.nombre);
+END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {tabla}
+BEGIN
+    INSERT INTO {fts} ({fts}, rowid, nombre) VALUES ('delete', OLD.id, OLD.nombre);
+END""",
+        # Solo cuando cambia el nombre (no con los descuentos de stock ni el versionado)
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF nombre ON {tabla}
+BEGIN
+    INSERT INTO {fts} ({fts}, rowid, nombre) VALUES ('delete', OLD.id, OLD.nombre);
+    INSERT INTO {fts} (rowid, nombre) VALUES (NEW.id, NEW.nombre);
+END""",
+    ]
+
+def instalar_fts(conexion) -> bool:
+    """Crear los índices de búsqueda y sus triggers. Devuelve False si no hay FTS5 disponible"""
+    if conexion.dialect.name != "sqlite":
+        return False
+    for tabla in TABLAS:
+        fts = f"{tabla}_fts"
+        existia = conexion.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+        ).first() is not None
+        try:
+            for sentencia in sentencias_fts(tabla):
+                conexion.exec_driver_sql(sentencia)
+        except OperationalError as e:
+            logger.warning("No se pudo crear el índice de búsqueda %s (se usará LIKE): %s", fts, e)
+            return False
+        if not existia:
+            # Base existente: indexar las filas que ya tiene
+            conexion.exec_driver_sql(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    return True
+
+@event.listens_for(models.Base.metadata, "after_create")
+def _instalar_despues_de_create_all(metadata, conexion, **kwargs):
+    instalar_fts(conexion)
+
+def consulta_fts(texto: str) -> str:
+    """Convertir lo que escribió el usuario en una consulta FTS5: todas las palabras, como prefijo
+
+    Cada palabra va entre comillas para que los operadores de FTS5 (AND, OR, NEAR, *, ...)
+    se busquen como texto.
+    """
+    return " ".join(f'"{palabra}"*' for palabra in re.findall(r"\w+", texto))
+
+def _usa_fts(db: Session, tabla: str) -> bool:
+    if db.get_bind().dialect.name != "sqlite":
+        return False
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nombre"), {"nombre": f"{tabla}_fts"}
+    ).first() is not None
+
+def buscar(db: Session, tabla: str, texto: str, limite: int) -> List[int]:
+    """Ids de las filas cuyo nombre coincide con el texto, de la más a la menos relevante"""
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    if _usa_fts(db, tabla):
+        return list(db.execute(
+            text(f"SELECT rowid FROM {tabla}_fts WHERE {tabla}_fts MATCH :consulta ORDER BY rank LIMIT :limite"),
+            {"consulta": consulta, "limite": limite}
+        ).scalars())
+
+    modelo = TABLAS[tabla]
+    condiciones = [modelo.nombre.icontains(palabra, autoescape=True) for palabra in re.findall(r"\w+", texto)]
+    return list(db.execute(
+        db.query(modelo.id).filter(*condiciones).order_by(func.length(modelo.nombre), modelo.id).limit(limite).statement
+    ).scalars())
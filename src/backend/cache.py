@@ -0,0 +1,105 @@
+"""
+Caché de lectura del catálogo (stock y productos)
+
+Guarda las respuestas ya serializadas de los listados de stock y productos, asociadas a una
+versión del catálogo: la versión de sincronización de la base (sync.version_actual, que los
+triggers incrementan con cada escritura sobre stock, productos o recetas, venga del worker que
+venga). Además invalidar() descarta las respuestas guardadas después de cada escritura local.
+
+La versión también se usa como ETag. Como es la misma en todos los workers, un If-None-Match
+emitido por un worker da 304 en cualquier otro. El costo es que cada request, incluso uno que
+termina en 304, lee la versión de la base (una consulta por clave primaria): el 304 evita
+armar y enviar el listado, no tocar la base.
+
+En las bases sin triggers de sincronización la versión de la base no cambia, así que el ETag
+lleva también la generación local de invalidar(). En ese caso la caché solo ve las escrituras
+de su proceso y no sirve para varios workers.
+"""
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+class CacheCatalogo:
+    """Respuestas serializadas por clave, válidas mientras no cambie la versión del catálogo
+
+    `version_bd` es la versión de sincronización de la base, leída por el llamador antes que
+    los datos: si hay una escritura en el medio, la próxima consulta ve una versión mayor y
+    vuelve a generar la respuesta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Si la versión de la base cambia con cada escritura (hay triggers, ver sync.py)
+        self.version_compartida = False
+        self._generacion = 0
+        self._version_bd: Optional[int] = None
+        self._respuestas: Dict[str, bytes] = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.no_modificados = 0
+
+    @property
+    def generacion(self) -> int:
+        """Cantidad de invalidaciones locales (las escrituras de este worker)"""
+        return self._generacion
+
+    def etag(self, version_bd: int) -> str:
+        if self.version_compartida:
+            return f'"{version_bd}"'
+        return f'"{version_bd}-{self._generacion}"'
+
+    def no_modificado(self, if_none_match: str, version_bd: int) -> bool:
+        """Indicar si el ETag enviado por el cliente corresponde a la versión actual"""
+        if not if_none_match:
+            return False
+        etag = self.etag(version_bd)
+        coincide = any(valor.strip() in (etag, "*") for valor in if_none_match.split(","))
+        if coincide:
+            with self._lock:
+                self.no_modificados += 1
+        return coincide
+
+    def obtener(self, clave: str, version_bd: int, generar: Callable[[], bytes]) -> Tuple[bytes, str]:
+        """Obtener la respuesta serializada de una clave, generándola si no está en caché
+
+        Devuelve el contenido y el ETag de la versión con la que se generó.
+        """
+        with self._lock:
+            if self._version_bd is None or version_bd > self._version_bd:
+                # Otro worker (o este) escribió en la base desde que se guardaron las respuestas
+                self._version_bd = version_bd
+                self._respuestas.clear()
+            # Una lectura que empezó antes de la última versión vista no usa ni guarda la caché
+            vigente = version_bd == self._version_bd
+            generacion = self._generacion
+            etag = self.etag(version_bd)
+            contenido = self._respuestas.get(clave) if vigente else None
+            if contenido is not None:
+                self.aciertos += 1
+                return contenido, etag
+            self.fallos += 1
+
+        contenido = generar()
+        with self._lock:
+            # Si hubo una escritura mientras se generaba, la respuesta puede estar desactualizada
+            if vigente and self._version_bd == version_bd and self._generacion == generacion:
+                self._respuestas[clave] = contenido
+        return contenido, etag
+
+    def invalidar(self):
+        """Incrementar la generación local y descartar las respuestas guardadas"""
+        with self._lock:
+            self._generacion += 1
+            self._respuestas.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "version": self._version_bd,
+                "generacion": self._generacion,
+                "entradas": len(self._respuestas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "no_modificados": self.no_modificados
+            }
+
+cache_catalogo = CacheCatalogo()
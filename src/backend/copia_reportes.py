@@ -0,0 +1,281 @@
+"""
+Copia de solo lectura de la base para reportes
+
+Con PANADERIA_REPORTES_COPIA habilitado (y SQLite en un archivo), los endpoints de reportes
+no leen la base principal sino una copia que se regenera cada
+PANADERIA_REPORTES_COPIA_INTERVALO_S segundos (por defecto 5 minutos) o a pedido con
+POST /api/reportes/copia. Así un reporte pesado nunca compite con las ventas del mostrador por
+la base principal.
+
+La copia se hace con la API de backup online de SQLite sobre un archivo temporal, que después
+reemplaza a la copia anterior con un rename atómico. Con el perfil "produccion" (WAL) el backup
+es una sola lectura, que no bloquea escrituras; en modo DELETE se copia de a
+PANADERIA_REPORTES_COPIA_PAGINAS páginas y se libera el lock entre pasos. La copia se deja en
+modo DELETE y se abre inmutable (mode=ro&immutable=1): nunca cambia en el lugar, así que las
+lecturas no toman locks. Cada copia guarda el momento en que se generó, que los reportes
+devuelven en `datos_al` y `antiguedad_s`.
+
+Los reportes leídos de la copia pueden no incluir las ventas de los últimos minutos. Mientras
+no exista una copia (o con la opción deshabilitada) se lee la base principal.
+
+Para regenerar la copia a mano o ver su antigüedad:
+    python -m src.backend.copia_reportes --actualizar
+    python -m src.backend.copia_reportes --estado
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import HTTPException
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.backend.database import (
+    SQLALCHEMY_DATABASE_URL, SQLITE_BUSY_TIMEOUT_MS, SQLITE_JOURNAL_MODE, SQLITE_PERFIL,
+    SessionLocal, _es_sqlite_en_memoria, crear_engine
+)
+
+logger = logging.getLogger("panaderia.copia_reportes")
+
+REPORTES_COPIA = os.getenv("PANADERIA_REPORTES_COPIA", "0").lower() in ("1", "true", "si", "sí")
+COPIA_INTERVALO_S = float(os.getenv("PANADERIA_REPORTES_COPIA_INTERVALO_S", "300"))
+# -1 copia todo en un paso (una sola transacción de lectura)
+COPIA_PAGINAS = int(os.getenv(
+    "PANADERIA_REPORTES_COPIA_PAGINAS",
+    "-1" if SQLITE_PERFIL == "produccion" and SQLITE_JOURNAL_MODE.upper() == "WAL" else "1024"
+))
+
+# Tabla que se agrega a cada copia con el momento en que se generó
+TABLA_GENERADA_EN = "copia_reportes"
+
+def ruta_base_principal(url: str = SQLALCHEMY_DATABASE_URL) -> Optional[str]:
+    """Ruta del archivo de la base principal, o None si no es SQLite en un archivo"""
+    if not url.startswith("sqlite") or _es_sqlite_en_memoria(url):
+        return None
+    return make_url(url).database or None
+
+def ruta_copia_por_defecto(ruta_origen: str) -> str:
+    base, extension = os.path.splitext(ruta_origen)
+    return f"{base}_reportes{extension or '.db'}"
+
+class CopiaReportes:
+    """Copia de la base principal y el engine de solo lectura que la consulta"""
+
+    def __init__(self, ruta_origen: str, ruta: Optional[str] = None, paginas: int = COPIA_PAGINAS):
+        self.ruta_origen = ruta_origen
+        self.ruta = ruta or ruta_copia_por_defecto(ruta_origen)
+        self.paginas = paginas
+        self.engine = crear_engine(
+            f"sqlite:///file:{quote(os.path.abspath(self.ruta))}?mode=ro&immutable=1&uri=true",
+            perfil="compatible"
+        )
+        self._sesiones = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        # Archivo que abren las conexiones del pool: (inodo, mtime) de la copia
+        self._archivo: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._lock_actualizacion = threading.Lock()
+        self.actualizaciones = 0
+        self.errores = 0
+        self.ultima_duracion_s = 0.0
+
+    def _archivo_actual(self) -> Optional[Tuple[int, int]]:
+        try:
+            estado = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        return estado.st_ino, estado.st_mtime_ns
+
+    def actualizar(self) -> Tuple[datetime, float]:
+        """Regenerar la copia. Devuelve el momento de los datos copiados y la duración en segundos"""
+        with self._lock_actualizacion:
+            inicio = time.perf_counter()
+            # Un temporal por proceso: con varios workers cada uno escribe el suyo
+            temporal = f"{self.ruta}.{os.getpid()}.tmp"
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            origen = sqlite3.connect(self.ruta_origen, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            destino = sqlite3.connect(temporal)
+            try:
+                # La copia se puede regenerar en cualquier momento, así que no se sincroniza a disco
+                destino.execute("PRAGMA synchronous=OFF")
+                generada_en = datetime.now()
+                origen.backup(destino, pages=self.paginas)
+                destino.execute("PRAGMA journal_mode=DELETE")
+                destino.execute(f"CREATE TABLE {TABLA_GENERADA_EN} (generada_en TEXT NOT NULL)")
+                destino.execute(f"INSERT INTO {TABLA_GENERADA_EN} VALUES (?)", (generada_en.isoformat(),))
+                destino.commit()
+            except Exception:
+                destino.close()
+                os.remove(temporal)
+                self.errores += 1
+                raise
+            finally:
+                origen.close()
+                destino.close()
+            os.replace(temporal, self.ruta)
+            self.actualizaciones += 1
+            self.ultima_duracion_s = time.perf_counter() - inicio
+            return generada_en, self.ultima_duracion_s
+
+    def actualizar_si_corresponde(self, intervalo_s: float) -> bool:
+        """Regenerar la copia si tiene más de `intervalo_s` segundos. Devuelve True si la regeneró"""
+        try:
+            if time.time() - os.path.getmtime(self.ruta) < intervalo_s:
+                return False
+        except FileNotFoundError:
+            pass
+        self.actualizar()
+        return True
+
+    def sesion(self) -> Optional[Session]:
+        """Sesión sobre la copia más reciente, o None si todavía no hay copia"""
+        archivo = self._archivo_actual()
+        if archivo is None:
+            return None
+        with self._lock:
+            if archivo != self._archivo:
+                # La copia se reemplazó (en este proceso o en otro): las conexiones del pool
+                # siguen abiertas sobre el archivo anterior, así que se descartan
+                self.engine.dispose()
+                self._archivo = archivo
+        db = self._sesiones()
+        db.info["copia_reportes"] = True
+        return db
+
+    def generada_en(self, db: Session) -> datetime:
+        """Momento de los datos de la copia que lee la sesión"""
+        valor = db.connection().exec_driver_sql(f"SELECT generada_en FROM {TABLA_GENERADA_EN}").scalar()
+        return datetime.fromisoformat(valor)
+
+    def antiguedad_s(self) -> Optional[float]:
+        """Segundos desde que se escribió la copia (para /metrics)"""
+        try:
+            return time.time() - os.path.getmtime(self.ruta)
+        except FileNotFoundError:
+            return None
+
+_ruta_origen = ruta_base_principal()
+if REPORTES_COPIA and _ruta_origen is None:
+    logger.warning("PANADERIA_REPORTES_COPIA solo funciona con SQLite en un archivo: los reportes leen la base principal")
+copia = (
+    CopiaReportes(_ruta_origen, os.getenv("PANADERIA_REPORTES_COPIA_RUTA") or None)
+    if REPORTES_COPIA and _ruta_origen is not None else None
+)
+
+# Dependency para los endpoints de reportes
+def get_db_reportes():
+    db = copia.sesion() if copia is not None else None
+    if db is None:
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def antiguedad(db: Session) -> Tuple[Optional[datetime], Optional[float]]:
+    """(datos_al, antiguedad_s) de una sesión de get_db_reportes; (None, None) si lee la base principal"""
+    if not db.info.get("copia_reportes"):
+        return None, None
+    momento = copia.generada_en(db)
+    return momento, (datetime.now() - momento).total_seconds()
+
+def actualizar_copia() -> Tuple[datetime, float]:
+    if copia is None:
+        raise HTTPException(
+            status_code=400,
+            detail="La copia de reportes no está habilitada (requiere PANADERIA_REPORTES_COPIA=1 y SQLite en un archivo)"
+        )
+    return copia.actualizar()
+
+# ==================== ACTUALIZACIÓN PERIÓDICA ====================
+
+class CopiaPeriodica:
+    """Hilo que regenera la copia al iniciar y después cada `intervalo_s` segundos"""
+
+    def __init__(self, intervalo_s: float = COPIA_INTERVALO_S):
+        self.intervalo_s = intervalo_s
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        if copia is None or self.intervalo_s <= 0 or self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="copia-reportes", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is not None:
+            self._detener.set()
+            self._hilo.join()
+            self._hilo = None
+
+    def _bucle(self):
+        while True:
+            try:
+                # Con varios workers, el primero que llega la regenera y los demás ven una reciente
+                copia.actualizar_si_corresponde(self.intervalo_s)
+            except Exception:
+                logger.exception("No se pudo regenerar la copia de reportes")
+            if self._detener.wait(self.intervalo_s):
+                return
+
+copia_periodica = CopiaPeriodica()
+
+def lineas_metricas():
+    """Estado de la copia para /metrics (ver metricas.registrar_colector)"""
+    if copia is None:
+        return []
+    lineas = [
+        "# HELP panaderia_reportes_copia_actualizaciones_total Copias de reportes generadas por este proceso",
+        "# TYPE panaderia_reportes_copia_actualizaciones_total counter",
+        f"panaderia_reportes_copia_actualizaciones_total {copia.actualizaciones}",
+        "# HELP panaderia_reportes_copia_errores_total Copias de reportes que fallaron",
+        "# TYPE panaderia_reportes_copia_errores_total counter",
+        f"panaderia_reportes_copia_errores_total {copia.errores}",
+        "# HELP panaderia_reportes_copia_duracion_segundos Duración de la última copia generada por este proceso",
+        "# TYPE panaderia_reportes_copia_duracion_segundos gauge",
+        f"panaderia_reportes_copia_duracion_segundos {copia.ultima_duracion_s}",
+    ]
+    antiguedad = copia.antiguedad_s()
+    if antiguedad is not None:
+        lineas += [
+            "# HELP panaderia_reportes_copia_antiguedad_segundos Segundos desde que se escribió la copia de reportes",
+            "# TYPE panaderia_reportes_copia_antiguedad_segundos gauge",
+            f"panaderia_reportes_copia_antiguedad_segundos {antiguedad:.3f}",
+        ]
+    return lineas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerar la copia de reportes o ver su antigüedad")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--actualizar", action="store_true", help="Regenerar la copia desde la base principal")
+    grupo.add_argument("--estado", action="store_true", help="Mostrar cuándo se generó la copia")
+    args = parser.parse_args()
+
+    if _ruta_origen is None:
+        print("✗ La copia de reportes requiere SQLite en un archivo")
+        sys.exit(1)
+    # El comando funciona aunque el servidor no tenga la copia habilitada
+    copia_cli = copia or CopiaReportes(_ruta_origen, os.getenv("PANADERIA_REPORTES_COPIA_RUTA") or None)
+    if args.actualizar:
+        momento, duracion = copia_cli.actualizar()
+        print(f"✓ Copia {copia_cli.ruta} con los datos al {momento:%Y-%m-%d %H:%M:%S} ({duracion * 1000:.0f} ms)")
+    else:
+        db = copia_cli.sesion()
+        if db is None:
+            print(f"✗ Todavía no existe la copia {copia_cli.ruta}")
+            sys.exit(1)
+        try:
+            momento = copia_cli.generada_en(db)
+        finally:
+            db.close()
+        print(f"✓ Copia {copia_cli.ruta} con los datos al {momento:%Y-%m-%d %H:%M:%S} "
+              f"({(datetime.now() - momento).total_seconds():.0f} s de antigüedad)")
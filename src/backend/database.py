@@ -1,21 +1,117 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
 import atexit
+import os
 
-# Configuración de la base de datos SQLite
-SQLALCHEMY_DATABASE_URL = "sqlite:///./panaderia.db"
+# Cargar variables de entorno desde un archivo .env si existe
+load_dotenv()
 
-# Crear el motor de la base de datos con poolclass NullPool para SQLite
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},  # Solo necesario para SQLite
-    poolclass=None  # Deshabilitar el pool de conexiones para SQLite
-)
+# Configuración de la base de datos (por defecto SQLite en la raíz del proyecto)
+SQLALCHEMY_DATABASE_URL = os.getenv("PANADERIA_DATABASE_URL", "sqlite:///./panaderia.db")
+
+# Perfil de SQLite aplicado a cada conexión:
+# - "produccion": WAL, synchronous=NORMAL, busy_timeout, cache y mmap configurables
+# - "compatible": sin PRAGMAs (comportamiento por defecto de SQLite, journal en modo DELETE)
+SQLITE_PERFIL = os.getenv("PANADERIA_SQLITE_PERFIL", "produccion")
+SQLITE_JOURNAL_MODE = os.getenv("PANADERIA_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("PANADERIA_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("PANADERIA_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("PANADERIA_SQLITE_CACHE_SIZE_KB", "65536"))  # 64 MB por conexión
+SQLITE_MMAP_SIZE = int(os.getenv("PANADERIA_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256 MB
+
+# Pool de conexiones por proceso. Cada worker de uvicorn atiende los endpoints sync desde un
+# threadpool (40 hilos por defecto), así que pool_size + max_overflow debería acompañar ese número
+DB_POOL_SIZE = int(os.getenv("PANADERIA_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("PANADERIA_DB_MAX_OVERFLOW", "30"))
+DB_POOL_TIMEOUT = int(os.getenv("PANADERIA_DB_POOL_TIMEOUT", "30"))
+
+def _es_sqlite_en_memoria(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+def aplicar_perfil_sqlite(engine, perfil: str = SQLITE_PERFIL):
+    """Registrar los PRAGMAs del perfil para que se ejecuten en cada conexión nueva"""
+    if perfil != "produccion":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _configurar_conexion(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+def crear_engine(url: str = SQLALCHEMY_DATABASE_URL, perfil: str = SQLITE_PERFIL):
+    """Crear un engine con el perfil de conexión y el pool configurados"""
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True
+        )
+
+    connect_args = {"check_same_thread": False}  # Solo necesario para SQLite
+    if _es_sqlite_en_memoria(url):
+        # Una base en memoria existe solo dentro de su conexión: el pool por defecto la comparte
+        engine = create_engine(url, connect_args=connect_args)
+    else:
+        connect_args["timeout"] = SQLITE_BUSY_TIMEOUT_MS / 1000
+        engine = create_engine(
+            url,
+            connect_args=connect_args,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT
+        )
+    aplicar_perfil_sqlite(engine, perfil)
+    return engine
+
+# Crear el motor de la base de datos
+engine = crear_engine()
 
 # Crear la sesión local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Modo async: los endpoints más usados se atienden con AsyncSession (aiosqlite en local,
+# asyncpg con PostgreSQL) en lugar de ocupar un hilo del threadpool durante toda la consulta
+ASYNC_DB = os.getenv("PANADERIA_ASYNC_DB", "0").lower() in ("1", "true", "si", "sí")
+
+def url_async(url: str) -> str:
+    """Convertir la URL sync en su equivalente con driver async"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("PANADERIA_ASYNC_DATABASE_URL", url_async(SQLALCHEMY_DATABASE_URL))
+
+async_engine = None
+AsyncSessionLocal = None
+
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    if ASYNC_DATABASE_URL.startswith("sqlite"):
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000})
+        aplicar_perfil_sqlite(async_engine.sync_engine)
+    else:
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True
+        )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+
 # Base para los modelos
 Base = declarative_base()
 
@@ -27,9 +123,18 @@ def get_db():
     finally:
         db.close()
 
+# Dependency para obtener la sesión async (solo con PANADERIA_ASYNC_DB habilitado)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Función para cerrar el engine al terminar la aplicación
 def close_database_connection():
     engine.dispose()
 
+async def close_async_database_connection():
+    if async_engine is not None:
+        await async_engine.dispose()
+
 # Registrar la función de limpieza
 atexit.register(close_database_connection)
@@ -0,0 +1,281 @@
+"""
+Eventos de cambios del catálogo para el stream SSE (GET /api/eventos)
+
+Los endpoints de escritura publican, después del commit, un evento por cambio con solo los
+campos que cambiaron:
+
+- stock.creado / producto.creado: el item completo
+- stock.actualizado / producto.actualizado: id y los campos editados con su nuevo valor
+- stock.eliminado / producto.eliminado: id
+- stock.delta / producto.delta: id y la variación de cantidad (unidades, peso_kg) por
+  ventas y preparaciones
+- receta.ingrediente_agregado / receta.ingrediente_eliminado: producto_id y el ingrediente
+- venta.creada: id, fecha y total
+- reinicio: el catálogo cambió por completo, el cliente tiene que recargar todo
+
+Cada evento tiene un id "<época>-<n>": la época identifica al proceso (cambia al reiniciarlo)
+y n es un contador creciente. Los últimos PANADERIA_EVENTOS_BUFFER eventos se guardan en un
+buffer circular para que un cliente que se reconecta con Last-Event-ID reciba lo que se
+perdió. Si su id ya salió del buffer, o es de otra época (de antes de un reinicio o de otro
+worker), recibe un evento "reinicio".
+
+Los eventos que publican los endpoints son por proceso: con varios workers, un stream no ve
+los de otro worker. Para que ninguna escritura se pierda, cada proceso tiene además un hilo
+(VigiaCambios) que cada PANADERIA_EVENTOS_INTERVALO_S segundos lee de la base, con
+sync.obtener_cambios, todo lo que cambió desde la última revisión, venga del worker que venga,
+y lo publica con los valores absolutos de cada fila (nunca como variación):
+
+- stock.actualizado / producto.actualizado / receta.ingrediente_actualizado: la fila completa
+  con su versión de sincronización (alta o modificación)
+- stock.eliminado / producto.eliminado / receta.ingrediente_eliminado: id
+
+Por eso los clientes que mantienen un estado local deben aplicar solo valores absolutos: los
+eventos *.delta de las ventas y preparaciones hechas en otro worker no llegan nunca.
+venta.creada también es solo del worker que registró la venta. Con una base sin triggers de
+sincronización la versión no cambia y el hilo no publica nada.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from typing import Deque, List, Optional, Set, Tuple
+
+from src.backend import schemas
+from src.backend import sync
+from src.backend.database import SessionLocal
+
+logger = logging.getLogger("panaderia.eventos")
+
+EVENTOS_BUFFER = int(os.getenv("PANADERIA_EVENTOS_BUFFER", "1000"))
+# Cada cuánto se leen de la base los cambios de todos los workers
+EVENTOS_INTERVALO_S = float(os.getenv("PANADERIA_EVENTOS_INTERVALO_S", "1"))
+# Eventos que puede acumular un cliente lento antes de que se lo desconecte
+EVENTOS_MAX_PENDIENTES = 1000
+HEARTBEAT_S = 15
+
+class Evento:
+    __slots__ = ("epoca", "id", "tipo", "datos", "_mensaje")
+
+    def __init__(self, epoca: str, id: int, tipo: str, datos: dict):
+        self.epoca = epoca
+        self.id = id
+        self.tipo = tipo
+        self.datos = datos
+        self._mensaje: Optional[bytes] = None
+
+    def mensaje(self) -> bytes:
+        """El evento en formato SSE (se serializa una sola vez para todos los clientes)"""
+        if self._mensaje is None:
+            datos = json.dumps(self.datos, ensure_ascii=False, default=str)
+            self._mensaje = f"id: {self.epoca}-{self.id}\nevent: {self.tipo}\ndata: {datos}\n\n".encode()
+        return self._mensaje
+
+def leer_id(valor: Optional[str]) -> Optional[Tuple[str, int]]:
+    """(época, n) de un id de evento "<época>-<n>", o None si no tiene ese formato"""
+    epoca, separador, numero = (valor or "").strip().rpartition("-")
+    if not separador or not epoca or not numero.isdigit():
+        return None
+    return epoca, int(numero)
+
+class Suscripcion:
+    """Cola de eventos de un cliente conectado, en el event loop que atiende su stream"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.cola: "asyncio.Queue[Optional[Evento]]" = asyncio.Queue()
+        self.desbordada = False
+
+    def _entregar(self, evento: Evento):
+        if self.desbordada:
+            return
+        if self.cola.qsize() >= EVENTOS_MAX_PENDIENTES:
+            # Cliente demasiado lento: se corta el stream y se reconecta con Last-Event-ID
+            self.desbordada = True
+            self.cola.put_nowait(None)
+            return
+        self.cola.put_nowait(evento)
+
+class BusEventos:
+    """Publicación de eventos desde cualquier hilo y buffer circular para reanudar streams"""
+
+    def __init__(self, tamano_buffer: int = EVENTOS_BUFFER):
+        self._lock = threading.Lock()
+        self.epoca = uuid.uuid4().hex[:8]
+        self._ultimo_id = 0
+        self._buffer: Deque[Evento] = deque(maxlen=tamano_buffer)
+        self._suscripciones: Set[Suscripcion] = set()
+
+    def publicar(self, tipo: str, datos: dict):
+        """Publicar un evento (se puede llamar desde el threadpool o desde otros hilos)"""
+        with self._lock:
+            self._ultimo_id += 1
+            evento = Evento(self.epoca, self._ultimo_id, tipo, datos)
+            self._buffer.append(evento)
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._entregar, evento)
+            except RuntimeError:
+                # El event loop del cliente ya se cerró
+                self.desuscribir(suscripcion)
+
+    def publicar_varios(self, eventos: List[Tuple[str, dict]]):
+        for tipo, datos in eventos:
+            self.publicar(tipo, datos)
+
+    def suscribir(self, ultimo_id: Optional[str] = None) -> Tuple[Suscripcion, List[Evento], bool]:
+        """Registrar un cliente desde su event loop
+
+        Devuelve la suscripción, los eventos del buffer posteriores a `ultimo_id` (un id
+        "<época>-<n>") y si hace falta un reinicio: el id ya no está en el buffer, no tiene el
+        formato esperado o es de otra época (otro proceso, o este antes de reiniciarse).
+        """
+        suscripcion = Suscripcion(asyncio.get_running_loop())
+        leido = leer_id(ultimo_id) if ultimo_id else None
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if not ultimo_id:
+                return suscripcion, [], False
+            if leido is None or leido[0] != self.epoca or leido[1] > self._ultimo_id:
+                return suscripcion, [], True
+            numero = leido[1]
+            perdidos = [evento for evento in self._buffer if evento.id > numero]
+            primero = self._buffer[0].id if self._buffer else self._ultimo_id + 1
+            reinicio = numero < primero - 1
+        return suscripcion, ([] if reinicio else perdidos), reinicio
+
+    def desuscribir(self, suscripcion: Suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    @property
+    def ultimo_id(self) -> int:
+        with self._lock:
+            return self._ultimo_id
+
+    def evento_reinicio(self) -> Evento:
+        """Evento "reinicio" con el id actual, para que el cliente se reconecte desde acá"""
+        with self._lock:
+            return Evento(self.epoca, self._ultimo_id, "reinicio", {})
+
+    def clientes(self) -> int:
+        with self._lock:
+            return len(self._suscripciones)
+
+bus_eventos = BusEventos()
+
+def eventos_delta_stock(descuentos: dict) -> List[Tuple[str, dict]]:
+    """Eventos stock.delta a partir de los descuentos {stock_id: cantidad}"""
+    return [("stock.delta", {"id": stock_id, "cantidad": -cantidad}) for stock_id, cantidad in descuentos.items()]
+
+def eventos_delta_productos(consumo: dict, signo: float = -1) -> List[Tuple[str, dict]]:
+    """Eventos producto.delta a partir de {producto_id: (unidades, peso_kg, ...)}"""
+    return [
+        ("producto.delta", {"id": producto_id, "unidades": signo * valores[0], "peso_kg": signo * valores[1]})
+        for producto_id, valores in consumo.items()
+    ]
+
+# ==================== CAMBIOS DE OTROS WORKERS ====================
+
+def eventos_cambios(cambios: dict) -> List[Tuple[str, dict]]:
+    """Eventos con los valores absolutos de la salida de sync.obtener_cambios"""
+    respuesta = schemas.SyncResponse.model_validate(cambios)
+    eventos = [("stock.actualizado", fila.model_dump()) for fila in respuesta.stock]
+    eventos += [("producto.actualizado", fila.model_dump()) for fila in respuesta.productos]
+    eventos += [("receta.ingrediente_actualizado", fila.model_dump()) for fila in respuesta.ingredientes_receta]
+    eventos += [("stock.eliminado", {"id": fila_id}) for fila_id in respuesta.eliminados.stock]
+    eventos += [("producto.eliminado", {"id": fila_id}) for fila_id in respuesta.eliminados.productos]
+    eventos += [("receta.ingrediente_eliminado", {"id": fila_id}) for fila_id in respuesta.eliminados.ingredientes_receta]
+    return eventos
+
+class VigiaCambios:
+    """Hilo que publica en el bus los cambios del catálogo leídos de la base, de cualquier worker"""
+
+    def __init__(self, intervalo_s: float = EVENTOS_INTERVALO_S):
+        self.intervalo_s = intervalo_s
+        self._version: Optional[int] = None
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.revisiones = 0
+
+    def iniciar(self):
+        if self.intervalo_s <= 0 or self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="vigia-eventos", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is not None:
+            self._detener.set()
+            self._hilo.join()
+            self._hilo = None
+
+    def revisar(self) -> int:
+        """Publicar los cambios posteriores a la última revisión. Devuelve la cantidad de eventos publicados"""
+        with SessionLocal() as db:
+            version = sync.version_actual(db)
+            # Sin clientes conectados no hay a quién avisar: solo se sigue la versión
+            if self._version is None or bus_eventos.clientes() == 0:
+                self._version = version
+                return 0
+            if version == self._version:
+                return 0
+            if version < self._version:
+                # La base se volvió a crear
+                self._version = version
+                bus_eventos.publicar("reinicio", {})
+                return 1
+            cambios = sync.obtener_cambios(db, self._version)
+        # obtener_cambios lee la versión antes que las filas: lo que se confirme en el medio
+        # puede publicarse dos veces, pero nunca se pierde
+        self._version = cambios["version"]
+        self.revisiones += 1
+        eventos = eventos_cambios(cambios)
+        bus_eventos.publicar_varios(eventos)
+        return len(eventos)
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo_s):
+            try:
+                self.revisar()
+            except Exception:
+                logger.exception("No se pudieron leer los cambios para el stream de eventos")
+
+vigia_cambios = VigiaCambios()
+
+async def stream(ultimo_id: Optional[str]):
+    """Generador del cuerpo de la respuesta SSE de un cliente"""
+    suscripcion, perdidos, reinicio = bus_eventos.suscribir(ultimo_id)
+    try:
+        yield f"retry: 3000\n: conectado, ultimo id {bus_eventos.epoca}-{bus_eventos.ultimo_id}\n\n".encode()
+        if reinicio:
+            yield bus_eventos.evento_reinicio().mensaje()
+        for evento in perdidos:
+            yield evento.mensaje()
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=HEARTBEAT_S)
+            except asyncio.TimeoutError:
+                # Comentario SSE para mantener viva la conexión a través de proxies
+                yield b": heartbeat\n\n"
+                continue
+            if evento is None:
+                return
+            yield evento.mensaje()
+    finally:
+        bus_eventos.desuscribir(suscripcion)
+
+def lineas_metricas() -> List[str]:
+    """Clientes conectados y eventos publicados para /metrics (ver metricas.registrar_colector)"""
+    return [
+        "# HELP panaderia_eventos_clientes Clientes conectados al stream de eventos",
+        "# TYPE panaderia_eventos_clientes gauge",
+        f"panaderia_eventos_clientes {bus_eventos.clientes()}",
+        "# HELP panaderia_eventos_publicados_total Eventos publicados",
+        "# TYPE panaderia_eventos_publicados_total counter",
+        f"panaderia_eventos_publicados_total {bus_eventos.ultimo_id}",
+    ]
@@ -0,0 +1,324 @@
+"""
+Idempotency-Key para los endpoints de escritura
+
+Un punto de venta con mala conexión puede reintentar un POST cuya respuesta se perdió, y sin
+protección la venta (y el descuento de stock) se registra dos veces. Si el request trae el
+header Idempotency-Key, la primera respuesta exitosa se guarda y los reintentos con la misma
+clave reciben esa misma respuesta sin volver a validar ni escribir nada.
+
+- La clave se asocia al método y al path: la misma clave en otro endpoint es otra operación.
+- Si llega la misma clave con otro cuerpo se responde 422.
+- Si la primera ejecución todavía está en curso se responde 409 (el cliente reintenta después).
+- Solo se guardan respuestas 2xx: un error no escribió nada y puede volver a intentarse.
+- Las rutas que leen el cuerpo a medida que llega (RUTAS_EN_STREAM, la importación masiva) no
+  se leen enteras para calcular la huella: la clave sola identifica la operación, y el 422
+  por cuerpo distinto no aplica.
+
+Almacenes (PANADERIA_IDEMPOTENCIA):
+- "memoria" (por defecto): LRU acotado con TTL, por proceso.
+- "sqlite": tabla claves_idempotencia en la base de la aplicación, compartida entre workers.
+- "desactivada": se ignora el header.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from src.backend import models
+
+IDEMPOTENCIA = os.getenv("PANADERIA_IDEMPOTENCIA", "memoria")
+IDEMPOTENCIA_TTL_S = int(os.getenv("PANADERIA_IDEMPOTENCIA_TTL_S", str(24 * 60 * 60)))
+IDEMPOTENCIA_MAX_CLAVES = int(os.getenv("PANADERIA_IDEMPOTENCIA_MAX_CLAVES", "10000"))
+
+# Tiempo máximo que una clave puede quedar "en curso": si el worker se cae a mitad del
+# request, la clave vuelve a quedar libre pasado este tiempo
+EN_CURSO_S = 60
+
+METODOS = ("POST", "PUT", "PATCH", "DELETE")
+# Prefijos de rutas cuyo cuerpo se procesa en stream (ver main._importar): se pasa sin leerlo
+RUTAS_EN_STREAM = ("/api/importar",)
+HUELLA_EN_STREAM = "en-stream"
+LARGO_MAXIMO_CLAVE = 255
+
+# Resultados de reservar una clave
+RESERVADA = "reservada"
+EN_CURSO = "en_curso"
+GUARDADA = "guardada"
+DISTINTA = "distinta"
+
+class RespuestaGuardada(NamedTuple):
+    status_code: int
+    content_type: Optional[str]
+    cuerpo: bytes
+
+class AlmacenMemoria:
+    """Respuestas por clave en un LRU acotado con TTL, seguro para usar desde varios hilos"""
+
+    bloqueante = False
+
+    def __init__(self, max_claves: int = IDEMPOTENCIA_MAX_CLAVES, ttl_s: int = IDEMPOTENCIA_TTL_S):
+        self._lock = threading.Lock()
+        self._max_claves = max_claves
+        self._ttl = timedelta(seconds=ttl_s)
+        # clave -> (huella, respuesta o None si está en curso, vencimiento)
+        self._entradas: "OrderedDict[str, Tuple[str, Optional[RespuestaGuardada], datetime]]" = OrderedDict()
+
+    def reservar(self, clave: str, huella: str) -> Tuple[str, Optional[RespuestaGuardada]]:
+        """Reservar la clave para ejecutar el request, o devolver su estado si ya existe"""
+        ahora = datetime.now()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[2] > ahora:
+                self._entradas.move_to_end(clave)
+                return _evaluar(entrada[0], entrada[1], huella)
+            self._entradas[clave] = (huella, None, ahora + timedelta(seconds=EN_CURSO_S))
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self._max_claves:
+                self._entradas.popitem(last=False)
+        return RESERVADA, None
+
+    def guardar(self, clave: str, huella: str, respuesta: RespuestaGuardada):
+        with self._lock:
+            self._entradas[clave] = (huella, respuesta, datetime.now() + self._ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self._max_claves:
+                self._entradas.popitem(last=False)
+
+    def liberar(self, clave: str):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[1] is None:
+                del self._entradas[clave]
+
+    def cantidad(self) -> int:
+        with self._lock:
+            return len(self._entradas)
+
+class AlmacenSQLite:
+    """Respuestas por clave en la tabla claves_idempotencia, compartida entre workers"""
+
+    bloqueante = True
+    PURGAR_CADA = 100  # Reservas entre cada limpieza de claves vencidas
+
+    def __init__(self, engine, max_claves: int = IDEMPOTENCIA_MAX_CLAVES, ttl_s: int = IDEMPOTENCIA_TTL_S):
+        self._engine = engine
+        self._tabla = models.ClaveIdempotencia.__table__
+        self._max_claves = max_claves
+        self._ttl = timedelta(seconds=ttl_s)
+        self._lock = threading.Lock()
+        self._reservas = 0
+
+    def reservar(self, clave: str, huella: str) -> Tuple[str, Optional[RespuestaGuardada]]:
+        """Reservar la clave para ejecutar el request, o devolver su estado si ya existe
+
+        La clave primaria de la tabla resuelve la carrera entre workers: solo un INSERT gana.
+        """
+        tabla = self._tabla
+        ahora = datetime.now()
+        try:
+            with self._engine.begin() as conn:
+                conn.execute(delete(tabla).where(tabla.c.clave == clave, tabla.c.expira_en <= ahora))
+                conn.execute(insert(tabla).values(clave=clave, huella=huella, expira_en=ahora + timedelta(seconds=EN_CURSO_S)))
+        except IntegrityError:
+            with self._engine.connect() as conn:
+                fila = conn.execute(select(tabla).where(tabla.c.clave == clave)).first()
+            if fila is None:
+                # Se liberó entre el INSERT y la lectura: que el cliente reintente
+                return EN_CURSO, None
+            respuesta = None
+            if fila.status_code is not None:
+                respuesta = RespuestaGuardada(fila.status_code, fila.content_type, fila.cuerpo)
+            return _evaluar(fila.huella, respuesta, huella)
+
+        with self._lock:
+            self._reservas += 1
+            purgar = self._reservas % self.PURGAR_CADA == 0
+        if purgar:
+            self.purgar()
+        return RESERVADA, None
+
+    def guardar(self, clave: str, huella: str, respuesta: RespuestaGuardada):
+        tabla = self._tabla
+        with self._engine.begin() as conn:
+            conn.execute(
+                update(tabla)
+                .where(tabla.c.clave == clave)
+                .values(
+                    status_code=respuesta.status_code,
+                    content_type=respuesta.content_type,
+                    cuerpo=respuesta.cuerpo,
+                    expira_en=datetime.now() + self._ttl
+                )
+            )
+
+    def liberar(self, clave: str):
+        tabla = self._tabla
+        with self._engine.begin() as conn:
+            conn.execute(delete(tabla).where(tabla.c.clave == clave, tabla.c.status_code.is_(None)))
+
+    def purgar(self):
+        """Eliminar las claves vencidas y las más viejas por encima del máximo"""
+        tabla = self._tabla
+        with self._engine.begin() as conn:
+            conn.execute(delete(tabla).where(tabla.c.expira_en <= datetime.now()))
+            sobrantes = select(tabla.c.clave).order_by(tabla.c.expira_en.desc()).offset(self._max_claves)
+            conn.execute(delete(tabla).where(tabla.c.clave.in_(sobrantes.scalar_subquery())))
+
+    def cantidad(self) -> int:
+        with self._engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self._tabla)).scalar_one()
+
+def _evaluar(huella_guardada: str, respuesta: Optional[RespuestaGuardada], huella: str) -> Tuple[str, Optional[RespuestaGuardada]]:
+    if huella_guardada != huella:
+        return DISTINTA, None
+    if respuesta is None:
+        return EN_CURSO, None
+    return GUARDADA, respuesta
+
+def crear_almacen(tipo: str = IDEMPOTENCIA):
+    if tipo == "desactivada":
+        return None
+    if tipo == "sqlite":
+        from src.backend.database import engine
+        return AlmacenSQLite(engine)
+    return AlmacenMemoria()
+
+almacen = crear_almacen()
+
+# Requests con Idempotency-Key por resultado de la reserva
+_lock_contadores = threading.Lock()
+contadores: Dict[str, int] = {RESERVADA: 0, GUARDADA: 0, EN_CURSO: 0, DISTINTA: 0}
+
+# ==================== MIDDLEWARE ====================
+
+class IdempotenciaMiddleware:
+    """Middleware ASGI que aplica Idempotency-Key a los métodos de escritura"""
+
+    def __init__(self, app, almacen_respuestas=None):
+        self.app = app
+        self.almacen = almacen_respuestas if almacen_respuestas is not None else almacen
+
+    async def _llamar(self, funcion, *args):
+        # El almacén SQLite hace I/O: se ejecuta fuera del event loop
+        if self.almacen.bloqueante:
+            return await run_in_threadpool(funcion, *args)
+        return funcion(*args)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METODOS or self.almacen is None:
+            await self.app(scope, receive, send)
+            return
+
+        clave_cliente = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"idempotency-key":
+                clave_cliente = valor.decode("latin-1").strip()
+                break
+        if not clave_cliente:
+            await self.app(scope, receive, send)
+            return
+        if len(clave_cliente) > LARGO_MAXIMO_CLAVE:
+            await _enviar_error(send, 400, f"El header Idempotency-Key no puede superar los {LARGO_MAXIMO_CLAVE} caracteres")
+            return
+
+        en_stream = scope["path"].startswith(RUTAS_EN_STREAM)
+        if en_stream:
+            # Leerlo entero anularía el stream (y su memoria acotada)
+            cuerpo, huella = None, HUELLA_EN_STREAM
+        else:
+            # Leer el cuerpo completo para calcular su huella
+            partes = []
+            while True:
+                mensaje = await receive()
+                if mensaje["type"] == "http.disconnect":
+                    return
+                partes.append(mensaje.get("body", b""))
+                if not mensaje.get("more_body", False):
+                    break
+            cuerpo = b"".join(partes)
+            huella = hashlib.sha256(cuerpo).hexdigest()
+        query = scope.get("query_string", b"").decode("latin-1")
+        clave = f"{scope['method']} {scope['path']}{'?' + query if query else ''} {clave_cliente}"
+
+        estado, guardada = await self._llamar(self.almacen.reservar, clave, huella)
+        with _lock_contadores:
+            contadores[estado] += 1
+        if estado == GUARDADA:
+            await _enviar(send, guardada, repetida=True)
+            return
+        if estado == EN_CURSO:
+            await _enviar_error(send, 409, "Ya hay un request en curso con este Idempotency-Key. Intenta nuevamente en unos segundos")
+            return
+        if estado == DISTINTA:
+            await _enviar_error(send, 422, "El Idempotency-Key ya se usó con un cuerpo distinto")
+            return
+
+        entregado = False
+
+        async def receive_guardado():
+            nonlocal entregado
+            if not entregado:
+                entregado = True
+                return {"type": "http.request", "body": cuerpo, "more_body": False}
+            return await receive()
+
+        respuesta = {"status": None, "content_type": None, "cuerpo": []}
+
+        async def send_guardando(mensaje):
+            if mensaje["type"] == "http.response.start":
+                respuesta["status"] = mensaje["status"]
+                for nombre, valor in mensaje.get("headers", []):
+                    if nombre.lower() == b"content-type":
+                        respuesta["content_type"] = valor.decode("latin-1")
+            elif mensaje["type"] == "http.response.body":
+                respuesta["cuerpo"].append(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive if en_stream else receive_guardado, send_guardando)
+        except BaseException:
+            await self._llamar(self.almacen.liberar, clave)
+            raise
+        if respuesta["status"] is not None and 200 <= respuesta["status"] < 300:
+            guardada = RespuestaGuardada(respuesta["status"], respuesta["content_type"], b"".join(respuesta["cuerpo"]))
+            await self._llamar(self.almacen.guardar, clave, huella, guardada)
+        else:
+            await self._llamar(self.almacen.liberar, clave)
+
+async def _enviar(send, respuesta: RespuestaGuardada, repetida: bool = False):
+    headers = [(b"content-length", str(len(respuesta.cuerpo)).encode())]
+    if respuesta.content_type:
+        headers.append((b"content-type", respuesta.content_type.encode("latin-1")))
+    if repetida:
+        headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": respuesta.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": respuesta.cuerpo})
+
+async def _enviar_error(send, status_code: int, detalle: str):
+    cuerpo = json.dumps({"detail": detalle}, ensure_ascii=False).encode()
+    await _enviar(send, RespuestaGuardada(status_code, "application/json", cuerpo))
+
+def lineas_metricas() -> List[str]:
+    """Contadores para /metrics (ver metricas.registrar_colector)"""
+    with _lock_contadores:
+        copia = dict(contadores)
+    lineas = [
+        "# HELP panaderia_idempotencia_requests_total Requests con Idempotency-Key por resultado",
+        "# TYPE panaderia_idempotencia_requests_total counter",
+    ]
+    for resultado, cantidad in sorted(copia.items()):
+        lineas.append(f'panaderia_idempotencia_requests_total{{resultado="{resultado}"}} {cantidad}')
+    if almacen is not None:
+        lineas += [
+            "# HELP panaderia_idempotencia_claves Claves guardadas en el almacén de idempotencia",
+            "# TYPE panaderia_idempotencia_claves gauge",
+            f"panaderia_idempotencia_claves {almacen.cantidad()}",
+        ]
+    return lineas
@@ -0,0 +1,349 @@
+"""
+Ingesta de ventas con commits agrupados
+
+Con PANADERIA_INGESTA_AGRUPADA habilitado, POST /api/ventas ya no escribe en la base desde el
+hilo del request. Cada venta:
+
+1. se valida contra una vista en memoria del stock de los productos (stock confirmado en la
+   base menos lo reservado por ventas que todavía esperan su commit),
+2. reserva su consumo en esa vista y se encola,
+3. espera a que un único hilo escritor la confirme.
+
+El escritor toma hasta PANADERIA_INGESTA_MAX_VENTAS ventas, o las que llegaron en
+PANADERIA_INGESTA_MAX_ESPERA_MS desde la primera, y las registra en una sola transacción
+(un solo commit, un solo fsync). El request responde recién después del commit, así que la
+confirmación al cliente es tan durable como en el modo normal.
+
+La vista en memoria solo adelanta el rechazo de las ventas sin stock: el descuento en la base
+sigue siendo el UPDATE condicional de siempre. Si otro proceso (u otro endpoint) cambió el stock
+y el grupo ya no entra, el escritor relee el stock y reparte lo disponible entre las ventas
+del grupo en orden de llegada; las que no entran se rechazan con 409.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from src.backend import models
+from src.backend import schemas
+from src.backend.cache import cache_catalogo
+from src.backend.database import SessionLocal
+from src.backend.eventos import bus_eventos
+
+INGESTA_AGRUPADA = os.getenv("PANADERIA_INGESTA_AGRUPADA", "0").lower() in ("1", "true", "si", "sí")
+INGESTA_MAX_VENTAS = int(os.getenv("PANADERIA_INGESTA_MAX_VENTAS", "100"))
+INGESTA_MAX_ESPERA_MS = float(os.getenv("PANADERIA_INGESTA_MAX_ESPERA_MS", "5"))
+
+# Reintentos del escritor cuando el stock de la base no alcanza para el grupo
+REINTENTOS_ESCRITURA = 3
+
+def _main():
+    # Import diferido: main importa este módulo al iniciar
+    from src.backend import main
+    return main
+
+class Pedido:
+    """Venta validada que espera en la cola su commit"""
+
+    __slots__ = ("items_data", "total", "fecha", "consumo", "futuro")
+
+    def __init__(self, items_data: List[dict], total: float, fecha: datetime, consumo: Dict[int, List[float]]):
+        self.items_data = items_data
+        self.total = total
+        self.fecha = fecha
+        self.consumo = consumo  # {producto_id: [unidades, peso_kg]} reservado en la vista
+        self.futuro: Future = Future()
+
+class ColaVentas:
+    """Vista del stock en memoria y cola de ventas con un único escritor"""
+
+    def __init__(self, max_ventas: int = INGESTA_MAX_VENTAS, max_espera_ms: float = INGESTA_MAX_ESPERA_MS):
+        self.max_ventas = max_ventas
+        self.max_espera = max_espera_ms / 1000
+        self._lock = threading.Lock()
+        # Stock confirmado en la base según la última lectura y los commits del escritor
+        self._stock: Dict[int, List[float]] = {}
+        # Consumo de las ventas encoladas que todavía no tienen commit
+        self._reservado: Dict[int, List[float]] = {}
+        # Se incrementa en cada commit e invalidación para descartar lecturas que quedaron viejas
+        self._generacion = 0
+        self._cola: "queue.Queue[Optional[Pedido]]" = queue.Queue()
+        self._escritor: Optional[threading.Thread] = None
+        self.grupos = 0
+        self.ventas = 0
+        self.rechazos = 0
+
+    # ==================== ENCOLADO ====================
+
+    def encolar(self, db: Session, venta: schemas.VentaCreate) -> Future:
+        """Validar una venta contra la vista en memoria, reservar su stock y encolarla
+
+        Lanza HTTPException si la venta no es válida. El futuro devuelto se resuelve con la
+        VentaResponse después del commit (o con la HTTPException si el escritor la rechaza).
+        """
+        if not venta.items or len(venta.items) == 0:
+            raise HTTPException(status_code=400, detail="La venta debe tener al menos un item")
+
+        producto_ids = {item.producto_id for item in venta.items}
+        with self._lock:
+            generacion = self._generacion
+        productos = {
+            producto.id: producto
+            for producto in db.query(models.Producto).filter(models.Producto.id.in_(producto_ids)).all()
+        }
+
+        calcular_item = _main()._calcular_item_venta
+        with self._lock:
+            for producto in productos.values():
+                if producto.id not in self._stock and generacion == self._generacion:
+                    self._stock[producto.id] = [producto.unidades, producto.peso_kg]
+
+            total = 0
+            items_data = []
+            consumo: Dict[int, List[float]] = {}
+            for item in venta.items:
+                producto = productos.get(item.producto_id)
+                if not producto:
+                    raise HTTPException(status_code=404, detail=f"Producto con id {item.producto_id} no encontrado")
+
+                unidades, peso_kg = self._disponible(producto)
+                usado = consumo.setdefault(producto.id, [0.0, 0.0])
+                item_data = calcular_item(producto, item, unidades - usado[0], peso_kg - usado[1])
+                usado[0] += item_data["unidades_a_descontar"]
+                usado[1] += item_data["peso_a_descontar"]
+                total += item_data["subtotal"]
+                items_data.append(item_data)
+
+            for producto_id, (unidades, peso_kg) in consumo.items():
+                reservado = self._reservado.setdefault(producto_id, [0.0, 0.0])
+                reservado[0] += unidades
+                reservado[1] += peso_kg
+
+        # Devolver la conexión al pool mientras se espera al escritor (que necesita una)
+        db.rollback()
+
+        pedido = Pedido(items_data, total, datetime.now(), consumo)
+        self._iniciar_escritor()
+        self._cola.put(pedido)
+        return pedido.futuro
+
+    def _disponible(self, producto: models.Producto):
+        stock = self._stock.get(producto.id, (producto.unidades, producto.peso_kg))
+        reservado = self._reservado.get(producto.id, (0.0, 0.0))
+        return stock[0] - reservado[0], stock[1] - reservado[1]
+
+    def invalidar(self, producto_ids: Optional[Iterable[int]] = None):
+        """Descartar el stock en memoria (de algunos productos o de todos) para releerlo de la base
+
+        Se llama cuando el stock de productos cambia por fuera de la cola (preparaciones,
+        ediciones, ventas en lote). Las reservas de las ventas encoladas se mantienen.
+        """
+        with self._lock:
+            self._generacion += 1
+            if producto_ids is None:
+                self._stock.clear()
+            else:
+                for producto_id in producto_ids:
+                    self._stock.pop(producto_id, None)
+
+    def _liberar(self, pedido: Pedido, confirmado: bool):
+        """Quitar la reserva de un pedido; si se confirmó, descontar su consumo del stock"""
+        for producto_id, (unidades, peso_kg) in pedido.consumo.items():
+            reservado = self._reservado[producto_id]
+            reservado[0] -= unidades
+            reservado[1] -= peso_kg
+            if reservado[0] <= 1e-9 and reservado[1] <= 1e-9:
+                del self._reservado[producto_id]
+            stock = self._stock.get(producto_id)
+            if stock is not None:
+                if confirmado:
+                    stock[0] -= unidades
+                    stock[1] -= peso_kg
+                else:
+                    # La vista no coincidía con la base: releer en la próxima venta
+                    del self._stock[producto_id]
+
+    # ==================== ESCRITOR ====================
+
+    def _iniciar_escritor(self):
+        if self._escritor is not None:
+            return
+        with self._lock:
+            if self._escritor is None:
+                self._escritor = threading.Thread(target=self._bucle, name="ingesta-ventas", daemon=True)
+                self._escritor.start()
+
+    def detener(self):
+        """Escribir las ventas pendientes y terminar el hilo escritor"""
+        with self._lock:
+            escritor = self._escritor
+        if escritor is not None:
+            self._cola.put(None)
+            escritor.join()
+            with self._lock:
+                self._escritor = None
+
+    def _bucle(self):
+        while True:
+            pedido = self._cola.get()
+            if pedido is None:
+                return
+            grupo = [pedido]
+            limite = time.monotonic() + self.max_espera
+            terminar = False
+            while len(grupo) < self.max_ventas:
+                restante = limite - time.monotonic()
+                try:
+                    siguiente = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if siguiente is None:
+                    terminar = True
+                    break
+                grupo.append(siguiente)
+            self._escribir(grupo)
+            if terminar:
+                return
+
+    def _escribir(self, grupo: List[Pedido]):
+        """Registrar un grupo de ventas en una transacción y resolver sus futuros"""
+        main = _main()
+        db = SessionLocal()
+        rechazados: List[Pedido] = []
+        try:
+            pendientes = grupo
+            for intento in range(REINTENTOS_ESCRITURA):
+                if intento > 0:
+                    # El stock de la base cambió por fuera de la vista: repartir lo que hay
+                    pendientes, sin_stock = _repartir_stock(db, pendientes)
+                    rechazados += sin_stock
+                if not pendientes:
+                    break
+
+                ventas = [
+                    (indice, models.Venta(fecha=pedido.fecha.isoformat(), creada_en=pedido.fecha, total=pedido.total), pedido.items_data, pedido.fecha)
+                    for indice, pedido in enumerate(pendientes)
+                ]
+                if main._registrar_ventas(db, ventas) is None:
+                    # Serializar antes del commit para no recargar cada venta expirada
+                    respuestas = [schemas.VentaResponse.model_validate(db_venta) for _, db_venta, _, _ in ventas]
+                    eventos = main.eventos_ventas(ventas)
+                    db.commit()
+                    break
+                db.rollback()
+            else:
+                rechazados += pendientes
+                pendientes = []
+        except BaseException as e:
+            db.rollback()
+            with self._lock:
+                for pedido in grupo:
+                    self._liberar(pedido, confirmado=False)
+            for pedido in grupo:
+                pedido.futuro.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        with self._lock:
+            for pedido in pendientes:
+                self._liberar(pedido, confirmado=True)
+            for pedido in rechazados:
+                self._liberar(pedido, confirmado=False)
+            self._generacion += 1
+            self.grupos += 1
+            self.ventas += len(pendientes)
+            self.rechazos += len(rechazados)
+        if pendientes:
+            cache_catalogo.invalidar()
+            bus_eventos.publicar_varios(eventos)
+
+        for pedido, respuesta in zip(pendientes, respuestas if pendientes else []):
+            pedido.futuro.set_result(respuesta)
+        for pedido in rechazados:
+            pedido.futuro.set_exception(HTTPException(
+                status_code=409,
+                detail="El stock cambió mientras la venta esperaba su registro y ya no alcanza. Intenta nuevamente"
+            ))
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "en_cola": self._cola.qsize(),
+                "grupos": self.grupos,
+                "ventas": self.ventas,
+                "rechazos": self.rechazos,
+                "ventas_por_grupo": round(self.ventas / self.grupos, 2) if self.grupos else None
+            }
+
+def _repartir_stock(db: Session, pedidos: List[Pedido]):
+    """Releer el stock y aceptar los pedidos en orden de llegada mientras alcance
+
+    Usa las mismas validaciones que el UPDATE condicional del descuento: el consumo total de
+    unidades se valida si algún item del producto se vende por unidad, y el de peso si alguno
+    se vende por peso.
+    """
+    producto_ids = {producto_id for pedido in pedidos for producto_id in pedido.consumo}
+    stock = {
+        producto_id: (unidades, peso_kg)
+        for producto_id, unidades, peso_kg in db.query(models.Producto.id, models.Producto.unidades, models.Producto.peso_kg)
+        .filter(models.Producto.id.in_(producto_ids))
+        .all()
+    }
+    db.rollback()  # Terminar la transacción de lectura antes de escribir
+
+    aceptados, rechazados = [], []
+    acumulado: Dict[int, List] = {}
+    for pedido in pedidos:
+        propuesto = {producto_id: list(valores) for producto_id, valores in acumulado.items()}
+        for item_data in pedido.items_data:
+            total = propuesto.setdefault(item_data["producto_id"], [0.0, 0.0, False, False])
+            total[0] += item_data["unidades_a_descontar"]
+            total[1] += item_data["peso_a_descontar"]
+            total[2] = total[2] or item_data["tipo_venta"] == schemas.TipoVenta.UNIDAD
+            total[3] = total[3] or item_data["tipo_venta"] == schemas.TipoVenta.PESO
+        alcanza = all(
+            producto_id in stock
+            and (not validar_unidades or stock[producto_id][0] >= unidades)
+            and (not validar_peso or stock[producto_id][1] >= peso_kg)
+            for producto_id, (unidades, peso_kg, validar_unidades, validar_peso) in propuesto.items()
+        )
+        if alcanza:
+            acumulado = propuesto
+            aceptados.append(pedido)
+        else:
+            rechazados.append(pedido)
+    return aceptados, rechazados
+
+cola_ventas = ColaVentas() if INGESTA_AGRUPADA else None
+
+def invalidar_stock(producto_ids: Optional[Iterable[int]] = None):
+    """Avisar a la cola que el stock de productos cambió por fuera de ella (sin efecto si está deshabilitada)"""
+    if cola_ventas is not None:
+        cola_ventas.invalidar(producto_ids)
+
+def lineas_metricas() -> List[str]:
+    """Estado de la cola para /metrics (ver metricas.registrar_colector)"""
+    if cola_ventas is None:
+        return []
+    estadisticas = cola_ventas.estadisticas()
+    return [
+        "# HELP panaderia_ingesta_en_cola Ventas encoladas esperando su commit",
+        "# TYPE panaderia_ingesta_en_cola gauge",
+        f"panaderia_ingesta_en_cola {estadisticas['en_cola']}",
+        "# HELP panaderia_ingesta_grupos_total Commits agrupados del escritor",
+        "# TYPE panaderia_ingesta_grupos_total counter",
+        f"panaderia_ingesta_grupos_total {estadisticas['grupos']}",
+        "# HELP panaderia_ingesta_ventas_total Ventas confirmadas por el escritor",
+        "# TYPE panaderia_ingesta_ventas_total counter",
+        f"panaderia_ingesta_ventas_total {estadisticas['ventas']}",
+        "# HELP panaderia_ingesta_rechazos_total Ventas rechazadas al escribir porque el stock ya no alcanzaba",
+        "# TYPE panaderia_ingesta_rechazos_total counter",
+        f"panaderia_ingesta_rechazos_total {estadisticas['rechazos']}",
+    ]
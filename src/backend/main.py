@@ -1,13 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session, selectinload
+from pydantic import TypeAdapter
+from typing import List, Optional
+from datetime import date, datetime, timedelta
 import atexit
 
 from src.backend import models
 from src.backend import schemas
-from src.backend.database import engine, get_db, close_database_connection
+from src.backend import reportes
+from src.backend import metricas
+from src.backend import idempotencia
+from src.backend import ingesta
+from src.backend import sync
+from src.backend import masivo
+from src.backend import archivo
+from src.backend import busqueda
+from src.backend import serializacion
+from src.backend import planificacion
+from src.backend import recetas
+from src.backend import movimientos
+from src.backend import precios
+from src.backend import copia_reportes
+from src.backend import admision
+from src.backend.database import ASYNC_DB, SessionLocal, async_engine, engine, get_db, close_database_connection, close_async_database_connection
+from src.backend.recetas import cache_recetas, descontar_ingredientes
+from src.backend.cache import cache_catalogo
+from src.backend import eventos
+from src.backend.eventos import bus_eventos, eventos_delta_productos, eventos_delta_stock
 
 app = FastAPI(
     title="Panadería API",
@@ -15,6 +38,16 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Reintentos con Idempotency-Key en los endpoints de escritura (ver idempotencia.py).
+# Se registra antes que CORS para que las respuestas repetidas también lleven sus headers
+if idempotencia.almacen is not None:
+    app.add_middleware(idempotencia.IdempotenciaMiddleware)
+
+# Límites de requests en curso y colas acotadas por clase de ruta (ver admision.py). Queda
+# dentro de CORS para que los 503 lleven sus headers y dentro de las métricas para contarlos
+if admision.control is not None:
+    app.add_middleware(admision.AdmisionMiddleware)
+
 # Configurar CORS para permitir peticiones desde el frontend
 app.add_middleware(
     CORSMiddleware,
@@ -22,25 +55,148 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Siguiente-Cursor", "ETag", "Idempotent-Replayed", "Retry-After"],
 )
 
+# Métricas de latencia por ruta y de uso de la base de datos (ver metricas.py)
+app.add_middleware(metricas.MetricasMiddleware)
+metricas.instrumentar_engine(engine)
+if async_engine is not None:
+    metricas.instrumentar_engine(async_engine.sync_engine)
+metricas.registro.registrar_colector(idempotencia.lineas_metricas)
+metricas.registro.registrar_colector(ingesta.lineas_metricas)
+metricas.registro.registrar_colector(eventos.lineas_metricas)
+metricas.registro.registrar_colector(copia_reportes.lineas_metricas)
+metricas.registro.registrar_colector(admision.lineas_metricas)
+if copia_reportes.copia is not None:
+    metricas.instrumentar_engine(copia_reportes.copia.engine)
+
+# En modo async, las versiones async de los endpoints más usados se registran antes que las
+# sync para que tengan prioridad (ver async_api.py)
+if ASYNC_DB:
+    from src.backend.async_api import router as async_router
+    app.include_router(async_router)
+
 @app.on_event("startup")
 async def startup_event():
     """Evento que se ejecuta al iniciar la aplicación"""
     # Crear las tablas en la base de datos
     models.Base.metadata.create_all(bind=engine)
+    with engine.connect() as conexion:
+        cache_catalogo.version_compartida = sync.triggers_instalados(conexion)
+    db = SessionLocal()
+    try:
+        movimientos.iniciar_libro(db)
+    finally:
+        db.close()
+    movimientos.snapshots_periodicos.iniciar()
+    copia_reportes.copia_periodica.iniciar()
+    eventos.vigia_cambios.iniciar()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento que se ejecuta al detener la aplicación"""
+    if ingesta.cola_ventas is not None:
+        await run_in_threadpool(ingesta.cola_ventas.detener)
+    await run_in_threadpool(movimientos.snapshots_periodicos.detener)
+    await run_in_threadpool(copia_reportes.copia_periodica.detener)
+    await run_in_threadpool(eventos.vigia_cambios.detener)
     close_database_connection()
+    await close_async_database_connection()
+
+# ==================== DESCUENTOS ATÓMICOS DE STOCK ====================
+# Los descuentos de productos (y de ingredientes, ver recetas.descontar_ingredientes) se hacen
+# con un UPDATE condicional (cantidad = cantidad - x WHERE cantidad >= x) en lugar de leer,
+# comparar y escribir desde Python. Así dos workers que venden o preparan al mismo tiempo
+# no pisan sus escrituras y el stock nunca queda negativo.
+
+def _descontar_producto(db: Session, producto_id: int, unidades: float, peso_kg: float, validar_unidades: bool, validar_peso: bool) -> bool:
+    """Descontar unidades y peso de un producto si alcanzan. Devuelve False si no se descontó
+
+    Solo se exige stock suficiente en las dimensiones indicadas (la que se vende); la otra
+    se descuenta de forma proporcional, igual que en la validación previa.
+    """
+    condiciones = [models.Producto.id == producto_id]
+    if validar_unidades:
+        condiciones.append(models.Producto.unidades >= unidades)
+    if validar_peso:
+        condiciones.append(models.Producto.peso_kg >= peso_kg)
+
+    resultado = db.execute(
+        update(models.Producto)
+        .where(*condiciones)
+        .values(
+            unidades=models.Producto.unidades - unidades,
+            peso_kg=models.Producto.peso_kg - peso_kg
+        )
+    )
+    return resultado.rowcount == 1
+
+# ==================== CACHÉ DEL CATÁLOGO ====================
+# Los listados de stock y productos se sirven desde una caché de respuestas serializadas
+# (ver cache.py), validadas contra la versión de sincronización de la base. Además, todas las
+# escrituras sobre stock, productos o recetas llaman a cache_catalogo.invalidar() después del
+# commit, para las bases sin triggers de sincronización.
+
+_stock_adapter = TypeAdapter(List[schemas.StockResponse])
+_productos_adapter = TypeAdapter(List[schemas.ProductoResponse])
+
+def _respuesta_catalogo(clave: str, if_none_match: Optional[str], db: Session, generar) -> Response:
+    """Responder un listado del catálogo desde la caché, o 304 si el cliente ya lo tiene"""
+    # La versión se lee antes que los datos (ver CacheCatalogo)
+    version = sync.version_actual(db)
+    if cache_catalogo.no_modificado(if_none_match, version):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": cache_catalogo.etag(version)})
+    contenido, etag = cache_catalogo.obtener(clave, version, generar)
+    return Response(
+        content=contenido,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
 
 # ==================== ENDPOINTS DE STOCK ====================
 
 @app.get("/api/stock", response_model=List[schemas.StockResponse], tags=["Stock"])
-def get_stock(db: Session = Depends(get_db)):
+def get_stock(if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     """Obtener todos los items del stock"""
-    return db.query(models.Stock).all()
+    return _respuesta_catalogo(
+        "stock", if_none_match, db,
+        lambda: _stock_adapter.dump_json(_stock_adapter.validate_python(db.query(models.Stock).all(), from_attributes=True))
+    )
+
+# Declarada antes que /api/stock/{stock_id} para que "buscar" no se tome como un id
+@app.get("/api/stock/buscar", response_model=List[schemas.StockResponse], tags=["Stock"])
+def buscar_stock(
+    q: str = Query(..., min_length=1, description="Texto a buscar (prefijos, sin distinguir acentos)"),
+    limite: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Buscar items del stock por nombre, ordenados por relevancia (ver busqueda.py)"""
+    ids = busqueda.buscar(db, "stock", q, limite)
+    items = {item.id: item for item in db.query(models.Stock).filter(models.Stock.id.in_(ids))}
+    return [items[stock_id] for stock_id in ids if stock_id in items]
+
+@app.get("/api/stock/historico", response_model=schemas.StockHistoricoResponse, tags=["Stock"])
+def get_stock_historico(
+    fecha: datetime = Query(..., description="Instante del que se quiere el stock"),
+    db: Session = Depends(get_db)
+):
+    """Stock de todos los items y productos en un instante pasado (ver movimientos.py)
+
+    Parte del último snapshot anterior al instante y le suma los movimientos posteriores
+    hasta ese instante.
+    """
+    snapshot, (stock, productos), aplicados = movimientos.stock_en(db, fecha)
+    return schemas.StockHistoricoResponse(
+        fecha=fecha,
+        snapshot_id=snapshot.id if snapshot is not None else None,
+        movimientos_aplicados=aplicados,
+        stock=[schemas.StockHistorico(id=stock_id, cantidad=cantidad) for stock_id, cantidad in sorted(stock.items())],
+        productos=[
+            schemas.ProductoHistorico(id=producto_id, unidades=unidades, peso_kg=peso_kg)
+            for producto_id, (unidades, peso_kg) in sorted(productos.items())
+        ]
+    )
 
 @app.get("/api/stock/{stock_id}", response_model=schemas.StockResponse, tags=["Stock"])
 def get_stock_item(stock_id: int, db: Session = Depends(get_db)):
@@ -60,8 +216,14 @@ def create_stock(stock: schemas.StockCreate, db: Session = Depends(get_db)):
     
     db_stock = models.Stock(**stock.model_dump())
     db.add(db_stock)
+    db.flush()
+    movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, stock={db_stock.id: db_stock.cantidad})
     db.commit()
+    cache_catalogo.invalidar()
+    # Una receta que referenciaba este nombre ahora puede resolverse
+    cache_recetas.invalidar_todo()
     db.refresh(db_stock)
+    bus_eventos.publicar("stock.creado", schemas.StockResponse.model_validate(db_stock).model_dump())
     return db_stock
 
 @app.put("/api/stock/{stock_id}", response_model=schemas.StockResponse, tags=["Stock"])
@@ -72,11 +234,18 @@ def update_stock(stock_id: int, stock: schemas.StockUpdate, db: Session = Depend
         raise HTTPException(status_code=404, detail="Item de stock no encontrado")
     
     update_data = stock.model_dump(exclude_unset=True)
+    cantidad_anterior = db_stock.cantidad
     for key, value in update_data.items():
         setattr(db_stock, key, value)
+    if "cantidad" in update_data:
+        movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, stock={stock_id: db_stock.cantidad - cantidad_anterior})
     
     db.commit()
+    cache_catalogo.invalidar()
+    if "nombre" in update_data:
+        cache_recetas.invalidar_todo()
     db.refresh(db_stock)
+    bus_eventos.publicar("stock.actualizado", {"id": stock_id, **update_data})
     return db_stock
 
 @app.delete("/api/stock/{stock_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Stock"])
@@ -87,15 +256,42 @@ def delete_stock(stock_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Item de stock no encontrado")
     
     db.delete(db_stock)
+    movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, stock={stock_id: -db_stock.cantidad})
     db.commit()
+    cache_catalogo.invalidar()
+    cache_recetas.invalidar_todo()
+    bus_eventos.publicar("stock.eliminado", {"id": stock_id})
     return None
 
 # ==================== ENDPOINTS DE PRODUCTOS ====================
 
 @app.get("/api/productos", response_model=List[schemas.ProductoResponse], tags=["Productos"])
-def get_productos(db: Session = Depends(get_db)):
+def get_productos(if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
     """Obtener todos los productos"""
-    return db.query(models.Producto).all()
+    if serializacion.SERIALIZACION_RAPIDA:
+        return _respuesta_catalogo("productos", if_none_match, db, lambda: serializacion.productos_json(db))
+    return _respuesta_catalogo(
+        "productos", if_none_match, db,
+        lambda: _productos_adapter.dump_json(_productos_adapter.validate_python(
+            db.query(models.Producto).options(selectinload(models.Producto.receta)).all(),
+            from_attributes=True
+        ))
+    )
+
+# Declarada antes que /api/productos/{producto_id} para que "buscar" no se tome como un id
+@app.get("/api/productos/buscar", response_model=List[schemas.ProductoResponse], tags=["Productos"])
+def buscar_productos(
+    q: str = Query(..., min_length=1, description="Texto a buscar (prefijos, sin distinguir acentos)"),
+    limite: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Buscar productos por nombre para el buscador del punto de venta, ordenados por relevancia"""
+    ids = busqueda.buscar(db, "productos", q, limite)
+    productos = {
+        producto.id: producto
+        for producto in db.query(models.Producto).options(selectinload(models.Producto.receta)).filter(models.Producto.id.in_(ids))
+    }
+    return [productos[producto_id] for producto_id in ids if producto_id in productos]
 
 @app.get("/api/productos/{producto_id}", response_model=schemas.ProductoResponse, tags=["Productos"])
 def get_producto(producto_id: int, db: Session = Depends(get_db)):
@@ -110,8 +306,13 @@ def create_producto(producto: schemas.ProductoCreate, db: Session = Depends(get_
     """Crear un nuevo producto"""
     db_producto = models.Producto(**producto.model_dump())
     db.add(db_producto)
+    db.flush()
+    movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, productos={db_producto.id: (db_producto.unidades, db_producto.peso_kg)})
     db.commit()
+    cache_catalogo.invalidar()
     db.refresh(db_producto)
+    precios.tabla_precios.actualizar(db_producto)
+    bus_eventos.publicar("producto.creado", schemas.ProductoResponse.model_validate(db_producto).model_dump(mode="json"))
     return db_producto
 
 @app.put("/api/productos/{producto_id}", response_model=schemas.ProductoResponse, tags=["Productos"])
@@ -122,11 +323,28 @@ def update_producto(producto_id: int, producto: schemas.ProductoUpdate, db: Sess
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
     update_data = producto.model_dump(exclude_unset=True)
+    anterior = (db_producto.unidades, db_producto.peso_kg)
     for key, value in update_data.items():
         setattr(db_producto, key, value)
+    if update_data.keys() & {"unidades", "peso_kg"}:
+        movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, productos={
+            producto_id: (db_producto.unidades - anterior[0], db_producto.peso_kg - anterior[1])
+        })
+    if "nombre" in update_data:
+        # Las recetas que lo usan como subreceta muestran su nombre
+        db.query(models.IngredienteReceta).filter(models.IngredienteReceta.subproducto_id == producto_id).update(
+            {models.IngredienteReceta.ingrediente: update_data["nombre"]}, synchronize_session=False
+        )
     
     db.commit()
+    cache_catalogo.invalidar()
+    ingesta.invalidar_stock([producto_id])
+    if update_data.keys() & {"unidades_por_receta", "peso_por_receta"}:
+        # Cambia cuánto rinde como subreceta de otros productos
+        cache_recetas.invalidar_producto(producto_id)
     db.refresh(db_producto)
+    precios.tabla_precios.actualizar(db_producto)
+    bus_eventos.publicar("producto.actualizado", {"id": producto_id, **update_data})
     return db_producto
 
 @app.delete("/api/productos/{producto_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Productos"])
@@ -135,9 +353,23 @@ def delete_producto(producto_id: int, db: Session = Depends(get_db)):
     db_producto = db.query(models.Producto).filter(models.Producto.id == producto_id).first()
     if not db_producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    usado_en = db.query(models.Producto.nombre).join(
+        models.IngredienteReceta, models.IngredienteReceta.producto_id == models.Producto.id
+    ).filter(models.IngredienteReceta.subproducto_id == producto_id).distinct().all()
+    if usado_en:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El producto se usa como subreceta de: {', '.join(nombre for nombre, in usado_en)}"
+        )
     
     db.delete(db_producto)
+    movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, productos={producto_id: (-db_producto.unidades, -db_producto.peso_kg)})
     db.commit()
+    cache_catalogo.invalidar()
+    cache_recetas.invalidar_producto(producto_id)
+    ingesta.invalidar_stock([producto_id])
+    precios.tabla_precios.quitar(producto_id)
+    bus_eventos.publicar("producto.eliminado", {"id": producto_id})
     return None
 
 # ==================== ENDPOINTS DE RECETAS ====================
@@ -150,19 +382,42 @@ def add_ingrediente_receta(producto_id: int, ingrediente: schemas.IngredienteRec
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    # Verificar que el ingrediente existe en el stock
-    stock_item = db.query(models.Stock).filter(models.Stock.nombre == ingrediente.ingrediente).first()
-    if not stock_item:
-        raise HTTPException(status_code=404, detail=f"El ingrediente '{ingrediente.ingrediente}' no existe en el stock")
+    datos = ingrediente.model_dump()
+    if ingrediente.subproducto_id is not None:
+        # Subreceta: el ingrediente es otro producto, que no puede incluir a este
+        subproducto = db.query(models.Producto).filter(models.Producto.id == ingrediente.subproducto_id).first()
+        if not subproducto:
+            raise HTTPException(status_code=404, detail="Subproducto no encontrado")
+        if recetas.factor_subreceta(ingrediente.cantidad, ingrediente.unidad, subproducto.unidades_por_receta, subproducto.peso_por_receta) is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"La cantidad de una subreceta se indica en {', '.join(recetas.UNIDADES_POR_PESO + recetas.UNIDADES_POR_PIEZA)} y el subproducto debe tener rendimiento en esa unidad"
+            )
+        if not subproducto.receta:
+            raise HTTPException(status_code=400, detail=f"El producto {subproducto.nombre} no tiene receta definida")
+        if recetas.crea_ciclo(db, producto_id, subproducto.id):
+            raise HTTPException(status_code=400, detail=f"La receta de {subproducto.nombre} ya usa {producto.nombre}: se formaría un ciclo")
+        datos["ingrediente"] = subproducto.nombre
+    else:
+        # Verificar que el ingrediente existe en el stock
+        stock_item = db.query(models.Stock).filter(models.Stock.nombre == ingrediente.ingrediente).first()
+        if not stock_item:
+            raise HTTPException(status_code=404, detail=f"El ingrediente '{ingrediente.ingrediente}' no existe en el stock")
     
     # Crear el ingrediente de la receta
     db_ingrediente = models.IngredienteReceta(
         producto_id=producto_id,
-        **ingrediente.model_dump()
+        **datos
     )
     db.add(db_ingrediente)
     db.commit()
+    cache_catalogo.invalidar()
+    cache_recetas.invalidar_producto(producto_id)
     db.refresh(db_ingrediente)
+    bus_eventos.publicar("receta.ingrediente_agregado", {
+        "producto_id": producto_id,
+        "ingrediente": schemas.IngredienteRecetaResponse.model_validate(db_ingrediente).model_dump()
+    })
     return db_ingrediente
 
 @app.delete("/api/productos/{producto_id}/receta/{ingrediente_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Recetas"])
@@ -178,6 +433,9 @@ def delete_ingrediente_receta(producto_id: int, ingrediente_id: int, db: Session
     
     db.delete(ingrediente)
     db.commit()
+    cache_catalogo.invalidar()
+    cache_recetas.invalidar_producto(producto_id)
+    bus_eventos.publicar("receta.ingrediente_eliminado", {"producto_id": producto_id, "id": ingrediente_id})
     return None
 
 @app.post("/api/productos/{producto_id}/preparar", response_model=schemas.ProductoResponse, tags=["Recetas"])
@@ -192,55 +450,271 @@ def preparar_receta(producto_id: int, preparar: schemas.PrepararRecetaRequest, d
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
+    # Receta compilada: ingredientes ya resueltos contra el stock (se cachea por producto)
+    receta = cache_recetas.obtener(db, producto.id)
+    
     # Verificar que tiene receta
-    if not producto.receta or len(producto.receta) == 0:
+    if not receta:
         raise HTTPException(status_code=400, detail="Este producto no tiene receta definida")
     
-    # Verificar stock suficiente de todos los ingredientes
-    for ingrediente in producto.receta:
-        stock_item = db.query(models.Stock).filter(models.Stock.nombre == ingrediente.ingrediente).first()
-        if not stock_item:
-            raise HTTPException(status_code=404, detail=f"El ingrediente '{ingrediente.ingrediente}' no existe en el stock")
-        
-        cantidad_necesaria = ingrediente.cantidad * preparar.cantidad
-        if stock_item.cantidad < cantidad_necesaria:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"No hay suficiente {ingrediente.ingrediente}. Necesitas {cantidad_necesaria} {ingrediente.unidad} pero solo hay {stock_item.cantidad} {stock_item.unidad}"
-            )
+    for ingrediente in receta:
+        if ingrediente.stock_id is None:
+            raise HTTPException(status_code=404, detail=f"El ingrediente '{ingrediente.nombre}' no existe en el stock")
     
-    # Descontar ingredientes del stock
-    for ingrediente in producto.receta:
-        stock_item = db.query(models.Stock).filter(models.Stock.nombre == ingrediente.ingrediente).first()
-        cantidad_a_descontar = ingrediente.cantidad * preparar.cantidad
-        stock_item.cantidad -= cantidad_a_descontar
+    # Descontar todos los ingredientes con un único UPDATE condicional en lote
+    descuentos = {ingrediente.stock_id: ingrediente.cantidad * preparar.cantidad for ingrediente in receta}
+    if not descontar_ingredientes(db, descuentos):
+        db.rollback()
+        # Buscar qué ingrediente no alcanzó para informarlo
+        stock_items = {
+            stock_item.id: stock_item
+            for stock_item in db.query(models.Stock).filter(models.Stock.id.in_(descuentos)).all()
+        }
+        for ingrediente in receta:
+            stock_item = stock_items.get(ingrediente.stock_id)
+            if not stock_item:
+                cache_recetas.invalidar_todo()
+                raise HTTPException(status_code=404, detail=f"El ingrediente '{ingrediente.nombre}' no existe en el stock")
+            cantidad_necesaria = descuentos[ingrediente.stock_id]
+            if stock_item.cantidad < cantidad_necesaria:
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"No hay suficiente {ingrediente.nombre}. Necesitas {cantidad_necesaria} {ingrediente.unidad} pero solo hay {stock_item.cantidad} {stock_item.unidad}"
+                )
+        # Al releer ya alcanzaba: otra transacción repuso stock en el medio
+        raise HTTPException(status_code=409, detail="El stock cambió durante la preparación. Intenta nuevamente")
     
     # Aumentar stock del producto (unidades y peso según la receta)
     unidades_producidas = producto.unidades_por_receta * preparar.cantidad
     peso_producido = producto.peso_por_receta * preparar.cantidad
     
-    producto.unidades += unidades_producidas
-    producto.peso_kg += peso_producido
+    db.execute(
+        update(models.Producto)
+        .where(models.Producto.id == producto.id)
+        .values(
+            unidades=models.Producto.unidades + unidades_producidas,
+            peso_kg=models.Producto.peso_kg + peso_producido
+        )
+    )
+    movimientos.registrar(
+        db, models.TipoMovimientoEnum.PRODUCCION,
+        stock={stock_id: -cantidad for stock_id, cantidad in descuentos.items()},
+        productos={producto.id: (unidades_producidas, peso_producido)}
+    )
     
     db.commit()
+    cache_catalogo.invalidar()
+    ingesta.invalidar_stock([producto.id])
+    bus_eventos.publicar_varios(
+        eventos_delta_stock(descuentos)
+        + eventos_delta_productos({producto.id: (unidades_producidas, peso_producido)}, signo=1)
+    )
     db.refresh(producto)
     return producto
 
+@app.get("/api/produccion/maximo", response_model=List[schemas.MaximoProducible], tags=["Recetas"])
+def get_maximo_producible(db: Session = Depends(get_db)):
+    """Cuántas recetas de cada producto se pueden preparar con el stock actual (no modifica nada)"""
+    return planificacion.maximos_producibles(db)
+
+@app.post("/api/produccion/simular", response_model=schemas.SimulacionResponse, tags=["Recetas"])
+def simular_produccion(plan: schemas.ProduccionRequest, db: Session = Depends(get_db)):
+    """Calcular el stock que quedaría después de un plan de producción, sin prepararlo
+
+    Valida el plan igual que POST /api/produccion pero en lugar de rechazarlo cuando falta
+    stock informa qué ingredientes no alcanzan y por cuánto.
+    """
+    return planificacion.simular_plan(db, plan)
+
+@app.post("/api/produccion", response_model=List[schemas.ProductoResponse], tags=["Recetas"])
+def preparar_produccion(plan: schemas.ProduccionRequest, db: Session = Depends(get_db)):
+    """Preparar varias recetas en una sola transacción (plan de producción)
+
+    Suma la demanda de cada ingrediente entre todas las recetas del plan, verifica de una vez
+    que el stock alcance para todo y aplica los descuentos y los aumentos de stock de productos
+    juntos: o se prepara el plan completo o no se prepara nada.
+    """
+    if not plan.items:
+        raise HTTPException(status_code=400, detail="El plan de producción debe tener al menos un producto")
+
+    # Cantidad de recetas por producto (un producto puede repetirse en el plan)
+    cantidades = {}
+    for item in plan.items:
+        cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+
+    productos = {
+        producto.id: producto
+        for producto in db.query(models.Producto).filter(models.Producto.id.in_(cantidades)).all()
+    }
+    for producto_id in cantidades:
+        if producto_id not in productos:
+            raise HTTPException(status_code=404, detail=f"Producto con id {producto_id} no encontrado")
+
+    # Demanda total por ingrediente a partir de las recetas compiladas
+    compiladas = cache_recetas.obtener_varios(db, cantidades)
+    demanda = {}
+    ingredientes = {}
+    for producto_id, cantidad in cantidades.items():
+        if not compiladas[producto_id]:
+            raise HTTPException(status_code=400, detail=f"El producto {productos[producto_id].nombre} no tiene receta definida")
+        for ingrediente in compiladas[producto_id]:
+            if ingrediente.stock_id is None:
+                raise HTTPException(status_code=404, detail=f"El ingrediente '{ingrediente.nombre}' no existe en el stock")
+            demanda[ingrediente.stock_id] = demanda.get(ingrediente.stock_id, 0) + ingrediente.cantidad * cantidad
+            ingredientes.setdefault(ingrediente.stock_id, ingrediente)
+
+    # Verificar factibilidad de todo el plan en una pasada
+    stock_items = {
+        stock_item.id: stock_item
+        for stock_item in db.query(models.Stock).filter(models.Stock.id.in_(demanda)).all()
+    }
+    faltantes = []
+    for stock_id, cantidad_necesaria in demanda.items():
+        stock_item = stock_items.get(stock_id)
+        if not stock_item:
+            cache_recetas.invalidar_todo()
+            raise HTTPException(status_code=404, detail=f"El ingrediente '{ingredientes[stock_id].nombre}' no existe en el stock")
+        if stock_item.cantidad < cantidad_necesaria:
+            faltantes.append(
+                f"{stock_item.nombre}: necesitas {cantidad_necesaria} {ingredientes[stock_id].unidad} pero solo hay {stock_item.cantidad} {stock_item.unidad}"
+            )
+    if faltantes:
+        raise HTTPException(status_code=400, detail="No hay stock suficiente para el plan. " + "; ".join(faltantes))
+
+    # Aplicar todos los descuentos y aumentos en la misma transacción
+    if not descontar_ingredientes(db, demanda):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El stock cambió durante la preparación del plan. Intenta nuevamente")
+
+    productos_table = models.Producto.__table__
+    db.execute(
+        update(productos_table)
+        .where(productos_table.c.id == bindparam("b_producto_id"))
+        .values(
+            unidades=productos_table.c.unidades + bindparam("b_unidades"),
+            peso_kg=productos_table.c.peso_kg + bindparam("b_peso_kg")
+        ),
+        [
+            {
+                "b_producto_id": producto_id,
+                "b_unidades": productos[producto_id].unidades_por_receta * cantidad,
+                "b_peso_kg": productos[producto_id].peso_por_receta * cantidad
+            }
+            for producto_id, cantidad in cantidades.items()
+        ]
+    )
+    movimientos.registrar(
+        db, models.TipoMovimientoEnum.PRODUCCION,
+        stock={stock_id: -cantidad for stock_id, cantidad in demanda.items()},
+        productos={
+            producto_id: (productos[producto_id].unidades_por_receta * cantidad, productos[producto_id].peso_por_receta * cantidad)
+            for producto_id, cantidad in cantidades.items()
+        }
+    )
+    db.commit()
+    cache_catalogo.invalidar()
+    ingesta.invalidar_stock(cantidades)
+    bus_eventos.publicar_varios(
+        eventos_delta_stock(demanda)
+        + eventos_delta_productos({
+            producto_id: (productos[producto_id].unidades_por_receta * cantidad, productos[producto_id].peso_por_receta * cantidad)
+            for producto_id, cantidad in cantidades.items()
+        }, signo=1)
+    )
+
+    return (
+        db.query(models.Producto)
+        .options(selectinload(models.Producto.receta))
+        .filter(models.Producto.id.in_(cantidades))
+        .order_by(models.Producto.id)
+        .all()
+    )
+
 # ==================== ENDPOINTS DE VENTAS ====================
 
 @app.get("/api/ventas", response_model=List[schemas.VentaResponse], tags=["Ventas"])
-def get_ventas(db: Session = Depends(get_db)):
-    """Obtener todas las ventas"""
-    return db.query(models.Venta).order_by(models.Venta.id.desc()).all()
+def get_ventas(
+    response: Response,
+    limite: int = Query(100, ge=1, le=1000, description="Cantidad máxima de ventas por página"),
+    cursor: Optional[int] = Query(None, description="ID de la última venta de la página anterior"),
+    desde: Optional[datetime] = Query(None, description="Incluir ventas desde este instante"),
+    hasta: Optional[datetime] = Query(None, description="Incluir ventas anteriores a este instante"),
+    db: Session = Depends(get_db)
+):
+    """Obtener las ventas de la más reciente a la más antigua, paginadas por cursor
+
+    Para pedir la página siguiente se envía como `cursor` el valor del header
+    `X-Siguiente-Cursor` de la respuesta anterior (no se envía cuando no hay más ventas).
+    Los items de toda la página se cargan con una sola consulta. Las ventas de meses
+    archivados se leen de sus archivos cuando la página llega hasta ellas.
+    """
+    condiciones = []
+    if cursor is not None:
+        condiciones.append(models.Venta.id < cursor)
+    if desde is not None:
+        condiciones.append(models.Venta.creada_en >= desde)
+    if hasta is not None:
+        condiciones.append(models.Venta.creada_en < hasta)
+
+    if serializacion.SERIALIZACION_RAPIDA:
+        pagina = serializacion.ventas(db, condiciones, limite)
+        if len(pagina) < limite:
+            pagina += [venta.model_dump(mode="json") for venta in archivo.ventas_archivadas(db, limite - len(pagina), cursor, desde, hasta)]
+        headers = {"X-Siguiente-Cursor": str(pagina[-1]["id"])} if len(pagina) == limite else None
+        return Response(content=serializacion.dumps(pagina), media_type="application/json", headers=headers)
+
+    query = db.query(models.Venta).options(selectinload(models.Venta.items)).filter(*condiciones)
+    ventas = query.order_by(models.Venta.id.desc()).limit(limite).all()
+    if len(ventas) < limite:
+        # La página sigue en los meses archivados (ver archivo.py)
+        ventas += archivo.ventas_archivadas(db, limite - len(ventas), cursor, desde, hasta)
+    if len(ventas) == limite:
+        response.headers["X-Siguiente-Cursor"] = str(ventas[-1].id)
+    return ventas
 
 @app.get("/api/ventas/{venta_id}", response_model=schemas.VentaResponse, tags=["Ventas"])
 def get_venta(venta_id: int, db: Session = Depends(get_db)):
     """Obtener una venta específica"""
     venta = db.query(models.Venta).filter(models.Venta.id == venta_id).first()
+    if not venta:
+        # Puede pertenecer a un mes archivado
+        venta = archivo.obtener_venta(db, venta_id)
     if not venta:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     return venta
 
+def _calcular_item_venta(producto: models.Producto, item: schemas.ItemVentaCreate, unidades_disponibles: float, peso_disponible: float) -> dict:
+    """Calcular precio, subtotal y descuentos de stock de un item de venta
+
+    Los precios salen de la tabla de precios (ver precios.py). Valida el item contra el stock
+    disponible recibido (que puede no ser el del producto cuando se procesan varias ventas en
+    memoria) y lanza HTTPException si no alcanza.
+    """
+    item_data = precios.cotizar_item(producto.id, precios.tabla_precios.precio(producto), item)
+
+    if item.tipo_venta == schemas.TipoVenta.UNIDAD:
+        if unidades_disponibles < item_data["unidades_a_descontar"]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No hay suficiente stock de {producto.nombre}. Disponible: {unidades_disponibles} unidades, solicitado: {item_data['unidades_a_descontar']}"
+            )
+    elif peso_disponible < item_data["peso_a_descontar"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"No hay suficiente stock de {producto.nombre}. Disponible: {peso_disponible} kg, solicitado: {item_data['peso_a_descontar']} kg"
+        )
+
+    return {"producto": producto, **item_data}
+
+@app.post("/api/ventas/cotizar", response_model=schemas.CotizacionResponse, tags=["Ventas"])
+def cotizar_venta(venta: schemas.VentaCreate, db: Session = Depends(get_db)):
+    """Calcular el precio de un carrito sin registrar la venta
+
+    Usa los mismos precios que POST /api/ventas, desde la tabla de precios en memoria. No
+    valida el stock: la venta lo valida al registrarse.
+    """
+    return precios.cotizar(db, venta.items)
+
 @app.post("/api/ventas", response_model=schemas.VentaResponse, status_code=status.HTTP_201_CREATED, tags=["Ventas"])
 def create_venta(venta: schemas.VentaCreate, db: Session = Depends(get_db)):
     """Crear una nueva venta
@@ -249,6 +723,10 @@ def create_venta(venta: schemas.VentaCreate, db: Session = Depends(get_db)):
     - Venta por UNIDAD: descuenta unidades y calcula peso proporcional
     - Venta por PESO: descuenta peso y calcula unidades proporcionales
     """
+    # Con la ingesta agrupada la venta se valida en memoria y espera el commit del escritor
+    if ingesta.cola_ventas is not None:
+        return ingesta.cola_ventas.encolar(db, venta).result()
+
     if not venta.items or len(venta.items) == 0:
         raise HTTPException(status_code=400, detail="La venta debe tener al menos un item")
     
@@ -261,62 +739,15 @@ def create_venta(venta: schemas.VentaCreate, db: Session = Depends(get_db)):
         if not producto:
             raise HTTPException(status_code=404, detail=f"Producto con id {item.producto_id} no encontrado")
 
-        # Relación unidades/peso configurada en la receta
-        unidades_por_receta = producto.unidades_por_receta if producto.unidades_por_receta and producto.unidades_por_receta > 0 else 1
-        peso_por_receta = producto.peso_por_receta if producto.peso_por_receta and producto.peso_por_receta > 0 else 1
-
-        kg_por_unidad = peso_por_receta / unidades_por_receta if unidades_por_receta > 0 else 0
-
-        # Calcular precios derivados
-        precio_por_unidad = producto.precio / unidades_por_receta if unidades_por_receta > 0 else producto.precio
-        precio_por_kg = producto.precio / peso_por_receta if peso_por_receta > 0 else producto.precio
-
-        # Determinar qué se vende y calcular descuentos
-        if item.tipo_venta == schemas.TipoVenta.UNIDAD:
-            unidades_a_descontar = item.cantidad
-            peso_a_descontar = item.cantidad * kg_por_unidad if kg_por_unidad > 0 else 0
-
-            if producto.unidades < unidades_a_descontar:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"No hay suficiente stock de {producto.nombre}. Disponible: {producto.unidades} unidades, solicitado: {unidades_a_descontar}"
-                )
-
-            subtotal = precio_por_unidad * item.cantidad
-            precio_aplicado = precio_por_unidad
-
-        else:  # PESO
-            peso_a_descontar = item.cantidad_peso_kg if item.cantidad_peso_kg else item.cantidad
-            if peso_a_descontar <= 0:
-                raise HTTPException(status_code=400, detail="La cantidad de peso a vender debe ser mayor a 0")
-
-            if producto.peso_kg < peso_a_descontar:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"No hay suficiente stock de {producto.nombre}. Disponible: {producto.peso_kg} kg, solicitado: {peso_a_descontar} kg"
-                )
-
-            unidades_a_descontar = peso_a_descontar / kg_por_unidad if kg_por_unidad > 0 else 0
-            subtotal = precio_por_kg * peso_a_descontar
-            precio_aplicado = precio_por_kg
-
-        total += subtotal
-
-        items_data.append({
-            "producto": producto,
-            "producto_id": producto.id,
-            "producto_nombre": producto.nombre,
-            "precio_aplicado": precio_aplicado,
-            "cantidad": item.cantidad,
-            "tipo_venta": item.tipo_venta,
-            "cantidad_peso_kg": item.cantidad_peso_kg,
-            "unidades_a_descontar": unidades_a_descontar,
-            "peso_a_descontar": peso_a_descontar
-        })
+        item_data = _calcular_item_venta(producto, item, producto.unidades, producto.peso_kg)
+        total += item_data["subtotal"]
+        items_data.append(item_data)
     
     # Crear la venta
+    ahora = datetime.now()
     db_venta = models.Venta(
-        fecha=datetime.now().isoformat(),
+        fecha=ahora.isoformat(),
+        creada_en=ahora,
         total=total
     )
     db.add(db_venta)
@@ -336,14 +767,456 @@ def create_venta(venta: schemas.VentaCreate, db: Session = Depends(get_db)):
         db.add(db_item)
         
         # Descontar del stock del producto (unidades y peso)
-        producto = item_data["producto"]
-        producto.unidades -= item_data["unidades_a_descontar"]
-        producto.peso_kg -= item_data["peso_a_descontar"]
+        descontado = _descontar_producto(
+            db, item_data["producto_id"],
+            item_data["unidades_a_descontar"], item_data["peso_a_descontar"],
+            validar_unidades=item_data["tipo_venta"] == schemas.TipoVenta.UNIDAD,
+            validar_peso=item_data["tipo_venta"] == schemas.TipoVenta.PESO
+        )
+        if not descontado:
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail=f"El stock de {item_data['producto_nombre']} cambió durante la venta y ya no alcanza. Intenta nuevamente"
+            )
+    
+    reportes.acumular_items(db, ahora, items_data)
+    _registrar_movimientos_ventas(db, [(None, db_venta, items_data, ahora)])
+    eventos_venta = eventos_ventas([(None, db_venta, items_data, ahora)])
     
     db.commit()
+    cache_catalogo.invalidar()
+    bus_eventos.publicar_varios(eventos_venta)
     db.refresh(db_venta)
     return db_venta
 
+def consumo_productos(ventas) -> dict:
+    """Consumo total por producto de varias ventas ya calculadas
+
+    Devuelve {producto_id: (unidades, peso_kg, validar_unidades, validar_peso)}, donde las
+    validaciones indican qué stock tiene que alcanzar según los tipos de venta de los items.
+    """
+    consumo = {}
+    for _, _, items_data, _ in ventas:
+        for item_data in items_data:
+            unidades, peso_kg, validar_unidades, validar_peso = consumo.get(item_data["producto_id"], (0, 0, False, False))
+            consumo[item_data["producto_id"]] = (
+                unidades + item_data["unidades_a_descontar"],
+                peso_kg + item_data["peso_a_descontar"],
+                validar_unidades or item_data["tipo_venta"] == schemas.TipoVenta.UNIDAD,
+                validar_peso or item_data["tipo_venta"] == schemas.TipoVenta.PESO
+            )
+    return consumo
+
+def _registrar_movimientos_ventas(db: Session, ventas):
+    """Agregar al libro de movimientos el descuento de stock de cada venta (ver movimientos.py)"""
+    filas = []
+    for venta in ventas:
+        _, db_venta, _, fecha = venta
+        filas += movimientos.filas_movimientos(
+            models.TipoMovimientoEnum.VENTA,
+            productos={
+                producto_id: (-unidades, -peso_kg)
+                for producto_id, (unidades, peso_kg, _, _) in consumo_productos([venta]).items()
+            },
+            referencia=db_venta.id, instante=fecha
+        )
+    movimientos.insertar(db, filas)
+
+def eventos_ventas(ventas) -> list:
+    """Eventos de varias ventas: la venta y el descuento de stock de cada producto
+
+    Recibe las mismas tuplas (indice, db_venta, items_data, fecha) que _registrar_ventas. Se
+    arman antes del commit (con las ventas ya insertadas) y se publican después.
+    """
+    return (
+        [("venta.creada", {"id": db_venta.id, "fecha": db_venta.fecha, "total": db_venta.total}) for _, db_venta, _, _ in ventas]
+        + eventos_delta_productos(consumo_productos(ventas))
+    )
+
+def _registrar_ventas(db: Session, ventas) -> Optional[int]:
+    """Insertar ventas ya validadas y descontar su stock, sin commit
+
+    `ventas` son tuplas (indice, db_venta, items_data, fecha). El stock se descuenta con un
+    UPDATE condicional por producto con el consumo total de todas las ventas: si a algún
+    producto ya no le alcanza devuelve su id (el llamador debe hacer rollback), si no None.
+    """
+    # Insertar todas las ventas de una vez para obtener sus IDs
+    db.add_all([db_venta for _, db_venta, _, _ in ventas])
+    db.flush()
+
+    for _, db_venta, items_data, _ in ventas:
+        for item_data in items_data:
+            db.add(models.ItemVenta(
+                venta=db_venta,
+                producto_id=item_data["producto_id"],
+                producto_nombre=item_data["producto_nombre"],
+                producto_precio=item_data["precio_aplicado"],
+                cantidad=item_data["cantidad"],
+                tipo_venta=item_data["tipo_venta"],
+                cantidad_peso_kg=item_data["cantidad_peso_kg"]
+            ))
+
+    # La validación en memoria se hizo con el stock leído antes; el UPDATE condicional
+    # garantiza que siga alcanzando
+    for producto_id, (unidades, peso_kg, validar_unidades, validar_peso) in consumo_productos(ventas).items():
+        if not _descontar_producto(db, producto_id, unidades, peso_kg, validar_unidades, validar_peso):
+            return producto_id
+
+    reportes.acumular_ventas(db, [(fecha, items_data) for _, _, items_data, fecha in ventas])
+    _registrar_movimientos_ventas(db, ventas)
+    db.flush()
+    return None
+
+@app.post("/api/ventas/batch", response_model=schemas.VentaBatchResponse, tags=["Ventas"])
+def create_ventas_batch(lote: schemas.VentaBatchCreate, db: Session = Depends(get_db)):
+    """Registrar muchas ventas en una sola transacción
+
+    Pensado para descargar la cola offline de los puntos de venta. Todos los productos
+    referenciados se cargan con una única consulta, el stock se valida en memoria
+    (cada venta aceptada descuenta del disponible para las siguientes) y se confirma
+    una sola vez. Cada venta se informa como aceptada o rechazada de forma independiente.
+    """
+    producto_ids = {item.producto_id for venta in lote.ventas for item in venta.items}
+    productos = {
+        producto.id: producto
+        for producto in db.query(models.Producto).filter(models.Producto.id.in_(producto_ids)).all()
+    } if producto_ids else {}
+
+    # Stock disponible en memoria, se va descontando a medida que se aceptan ventas
+    disponible = {producto_id: [producto.unidades, producto.peso_kg] for producto_id, producto in productos.items()}
+
+    resultados = []
+    ventas_aceptadas = []
+
+    for indice, venta in enumerate(lote.ventas):
+        try:
+            if not venta.items:
+                raise HTTPException(status_code=400, detail="La venta debe tener al menos un item")
+
+            total = 0
+            items_data = []
+            # Descuentos acumulados de esta venta, para validar items repetidos del mismo producto
+            consumo = {}
+            for item in venta.items:
+                producto = productos.get(item.producto_id)
+                if not producto:
+                    raise HTTPException(status_code=404, detail=f"Producto con id {item.producto_id} no encontrado")
+
+                unidades_usadas, peso_usado = consumo.get(producto.id, (0, 0))
+                unidades_disponibles, peso_disponible = disponible[producto.id]
+                item_data = _calcular_item_venta(
+                    producto, item,
+                    unidades_disponibles - unidades_usadas,
+                    peso_disponible - peso_usado
+                )
+                consumo[producto.id] = (
+                    unidades_usadas + item_data["unidades_a_descontar"],
+                    peso_usado + item_data["peso_a_descontar"]
+                )
+                total += item_data["subtotal"]
+                items_data.append(item_data)
+        except HTTPException as e:
+            resultados.append(schemas.VentaBatchResultado(indice=indice, ok=False, error=e.detail))
+            continue
+
+        for producto_id, (unidades_usadas, peso_usado) in consumo.items():
+            disponible[producto_id][0] -= unidades_usadas
+            disponible[producto_id][1] -= peso_usado
+
+        ahora = datetime.now()
+        db_venta = models.Venta(fecha=ahora.isoformat(), creada_en=ahora, total=total)
+        ventas_aceptadas.append((indice, db_venta, items_data, ahora))
+
+    producto_fallido = _registrar_ventas(db, ventas_aceptadas)
+    if producto_fallido is not None:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail=f"El stock de {productos[producto_fallido].nombre} cambió durante el procesamiento del lote. Reenvía el lote"
+        )
+
+    # Armar los resultados antes del commit para no recargar cada venta expirada
+    for indice, db_venta, _, _ in ventas_aceptadas:
+        resultados.append(schemas.VentaBatchResultado(indice=indice, ok=True, venta_id=db_venta.id, total=db_venta.total))
+    resultados.sort(key=lambda resultado: resultado.indice)
+    eventos_lote = eventos_ventas(ventas_aceptadas)
+
+    db.commit()
+    cache_catalogo.invalidar()
+    ingesta.invalidar_stock(productos)
+    bus_eventos.publicar_varios(eventos_lote)
+
+    return schemas.VentaBatchResponse(
+        aceptadas=len(ventas_aceptadas),
+        rechazadas=len(resultados) - len(ventas_aceptadas),
+        resultados=resultados
+    )
+
+# ==================== LIBRO DE MOVIMIENTOS DE STOCK ====================
+
+@app.get("/api/movimientos", response_model=List[schemas.MovimientoResponse], tags=["Stock"])
+def get_movimientos(
+    response: Response,
+    limite: int = Query(100, ge=1, le=1000, description="Cantidad máxima de movimientos por página"),
+    cursor: Optional[int] = Query(None, description="ID del último movimiento de la página anterior"),
+    stock_id: Optional[int] = Query(None),
+    producto_id: Optional[int] = Query(None),
+    tipo: Optional[schemas.TipoMovimiento] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Movimientos de stock del más reciente al más antiguo, paginados por cursor como GET /api/ventas"""
+    query = db.query(models.MovimientoStock)
+    if cursor is not None:
+        query = query.filter(models.MovimientoStock.id < cursor)
+    if stock_id is not None:
+        query = query.filter(models.MovimientoStock.stock_id == stock_id)
+    if producto_id is not None:
+        query = query.filter(models.MovimientoStock.producto_id == producto_id)
+    if tipo is not None:
+        query = query.filter(models.MovimientoStock.tipo == models.TipoMovimientoEnum(tipo.value))
+    pagina = query.order_by(models.MovimientoStock.id.desc()).limit(limite).all()
+    if len(pagina) == limite:
+        response.headers["X-Siguiente-Cursor"] = str(pagina[-1].id)
+    return pagina
+
+@app.post("/api/movimientos/snapshots", response_model=schemas.SnapshotResponse, status_code=status.HTTP_201_CREATED, tags=["Stock"])
+def create_snapshot(db: Session = Depends(get_db)):
+    """Guardar ahora un snapshot del stock (además de los periódicos)"""
+    return movimientos.tomar_snapshot(db)
+
+# ==================== IMPORTACIÓN Y EXPORTACIÓN MASIVA ====================
+# Ver masivo.py. La importación lee el cuerpo a medida que llega y escribe en lotes con un
+# commit por lote; la exportación se genera mientras se envía, con su propia sesión porque
+# la del request se cierra antes de que termine el stream.
+
+async def _importar(request: Request, formato: schemas.FormatoArchivo, importador, db: Session) -> schemas.ImportacionResponse:
+    lector = masivo.LectorFilas(formato)
+    resultado = masivo.ResultadoImportacion()
+    pendientes = []
+    async for bloque in request.stream():
+        pendientes += lector.agregar(bloque)
+        while len(pendientes) >= masivo.IMPORTACION_LOTE:
+            lote, pendientes = pendientes[:masivo.IMPORTACION_LOTE], pendientes[masivo.IMPORTACION_LOTE:]
+            await run_in_threadpool(importador, db, lote, resultado)
+    pendientes += lector.terminar()
+    if pendientes:
+        await run_in_threadpool(importador, db, pendientes, resultado)
+
+    if resultado.creadas or resultado.actualizadas:
+        cache_catalogo.invalidar()
+        cache_recetas.invalidar_todo()
+        precios.tabla_precios.invalidar()
+        ingesta.invalidar_stock(resultado.producto_ids)
+        # Demasiados cambios para enviarlos uno por uno: los clientes recargan el catálogo
+        bus_eventos.publicar("reinicio", {})
+    return resultado.respuesta()
+
+def _exportar(nombre: str, formato: schemas.FormatoArchivo, generar, *args) -> StreamingResponse:
+    def contenido():
+        db = SessionLocal()
+        try:
+            yield from generar(db, formato, *args)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        contenido(),
+        media_type=masivo.MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato.value}"'}
+    )
+
+@app.post("/api/importar/stock", response_model=schemas.ImportacionResponse, tags=["Importación"])
+async def importar_stock(
+    request: Request,
+    formato: schemas.FormatoArchivo = schemas.FormatoArchivo.CSV,
+    db: Session = Depends(get_db)
+):
+    """Crear o actualizar (por nombre) items de stock desde un CSV o NDJSON
+
+    Columnas: nombre, cantidad, unidad. Las filas inválidas se informan con su número de
+    línea sin frenar el resto de la importación.
+    """
+    return await _importar(request, formato, masivo.importar_stock, db)
+
+@app.post("/api/importar/productos", response_model=schemas.ImportacionResponse, tags=["Importación"])
+async def importar_productos(
+    request: Request,
+    formato: schemas.FormatoArchivo = schemas.FormatoArchivo.CSV,
+    db: Session = Depends(get_db)
+):
+    """Crear o actualizar productos (por id, o por nombre si no hay id) desde un CSV o NDJSON
+
+    La receta es opcional (en CSV, una lista JSON en la columna receta) y reemplaza la actual.
+    """
+    return await _importar(request, formato, masivo.importar_productos, db)
+
+@app.get("/api/exportar/stock", tags=["Importación"])
+def exportar_stock(formato: schemas.FormatoArchivo = schemas.FormatoArchivo.CSV):
+    """Descargar todo el stock"""
+    return _exportar("stock", formato, masivo.exportar_stock)
+
+@app.get("/api/exportar/productos", tags=["Importación"])
+def exportar_productos(formato: schemas.FormatoArchivo = schemas.FormatoArchivo.CSV):
+    """Descargar todos los productos con sus recetas (se pueden volver a importar)"""
+    return _exportar("productos", formato, masivo.exportar_productos)
+
+@app.get("/api/exportar/ventas", tags=["Importación"])
+def exportar_ventas(
+    formato: schemas.FormatoArchivo = schemas.FormatoArchivo.CSV,
+    desde: Optional[datetime] = Query(None, description="Incluir ventas desde este instante"),
+    hasta: Optional[datetime] = Query(None, description="Incluir ventas anteriores a este instante")
+):
+    """Descargar las ventas con sus items (en CSV, una fila por item)"""
+    return _exportar("ventas", formato, masivo.exportar_ventas, desde, hasta)
+
+# ==================== SINCRONIZACIÓN INCREMENTAL ====================
+
+@app.get("/api/sync", response_model=schemas.SyncResponse, tags=["Sync"])
+def get_sync(
+    since: int = Query(0, ge=0, description="Versión devuelta por la sincronización anterior (0 para traer todo)"),
+    db: Session = Depends(get_db)
+):
+    """Obtener los cambios del catálogo posteriores a una versión
+
+    Devuelve las filas de stock, productos e ingredientes de recetas creadas o modificadas
+    después de `since`, los ids borrados y la versión actual para la próxima sincronización.
+    """
+    return sync.obtener_cambios(db, since)
+
+# ==================== EVENTOS (SSE) ====================
+
+@app.get("/api/eventos", tags=["Eventos"])
+async def get_eventos(
+    last_event_id: Optional[str] = Header(None),
+    desde: Optional[str] = Query(None, description="Último id de evento recibido (alternativa al header Last-Event-ID)")
+):
+    """Stream Server-Sent Events con los cambios de stock, productos, recetas y ventas
+
+    Al reconectarse, el navegador envía Last-Event-ID y se reenvían los eventos perdidos que
+    sigan en el buffer; si ya no están, o el id es de otro proceso, se envía un evento
+    "reinicio" para recargar todo. Las escrituras de otros workers llegan como eventos con
+    los valores absolutos de cada fila (ver eventos.VigiaCambios).
+    """
+    return StreamingResponse(
+        eventos.stream(last_event_id or desde),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ==================== ENDPOINTS DE REPORTES ====================
+
+@app.get("/api/reportes/ventas", response_model=schemas.ReporteVentasResponse, tags=["Reportes"])
+def get_reporte_ventas(
+    granularidad: schemas.Granularidad = schemas.Granularidad.DIA,
+    desde: Optional[date] = Query(None, description="Primer día incluido"),
+    hasta: Optional[date] = Query(None, description="Último día incluido"),
+    producto_id: Optional[int] = None,
+    db: Session = Depends(copia_reportes.get_db_reportes)
+):
+    """Unidades, peso e ingresos por producto y por hora o día
+
+    Se lee de los resúmenes precalculados; nunca se recorren los items de venta. Con la copia
+    de reportes habilitada se lee la copia (ver copia_reportes.py).
+    """
+    modelo = models.ResumenVentaHora if granularidad == schemas.Granularidad.HORA else models.ResumenVentaDia
+    query = (
+        db.query(modelo, models.Producto.nombre)
+        .outerjoin(models.Producto, models.Producto.id == modelo.producto_id)
+    )
+    # Los periodos son prefijos de fechas ISO, así que se filtran por comparación de strings
+    if desde is not None:
+        query = query.filter(modelo.periodo >= desde.isoformat())
+    if hasta is not None:
+        query = query.filter(modelo.periodo < (hasta + timedelta(days=1)).isoformat())
+    if producto_id is not None:
+        query = query.filter(modelo.producto_id == producto_id)
+
+    filas = [
+        schemas.ResumenVentaFila(
+            periodo=resumen.periodo,
+            producto_id=resumen.producto_id,
+            producto_nombre=nombre,
+            unidades=resumen.unidades,
+            peso_kg=resumen.peso_kg,
+            ingresos=resumen.ingresos,
+            items=resumen.items
+        )
+        for resumen, nombre in query.order_by(modelo.periodo, modelo.producto_id).all()
+    ]
+    datos_al, antiguedad_s = copia_reportes.antiguedad(db)
+    return schemas.ReporteVentasResponse(granularidad=granularidad, filas=filas, datos_al=datos_al, antiguedad_s=antiguedad_s)
+
+@app.get("/api/reportes/productos", response_model=schemas.ReporteProductosResponse, tags=["Reportes"])
+def get_reporte_productos(
+    desde: Optional[date] = Query(None, description="Primer día incluido"),
+    hasta: Optional[date] = Query(None, description="Último día incluido"),
+    db: Session = Depends(copia_reportes.get_db_reportes)
+):
+    """Totales por producto en un rango de días, ordenados por ingresos"""
+    resumen = models.ResumenVentaDia
+    query = (
+        db.query(
+            resumen.producto_id,
+            models.Producto.nombre,
+            func.sum(resumen.unidades),
+            func.sum(resumen.peso_kg),
+            func.sum(resumen.ingresos),
+            func.sum(resumen.items)
+        )
+        .outerjoin(models.Producto, models.Producto.id == resumen.producto_id)
+    )
+    if desde is not None:
+        query = query.filter(resumen.periodo >= desde.isoformat())
+    if hasta is not None:
+        query = query.filter(resumen.periodo < (hasta + timedelta(days=1)).isoformat())
+
+    filas = [
+        schemas.ReporteProductoFila(
+            producto_id=producto_id,
+            producto_nombre=nombre,
+            unidades=unidades,
+            peso_kg=peso_kg,
+            ingresos=ingresos,
+            items=items
+        )
+        for producto_id, nombre, unidades, peso_kg, ingresos, items in
+        query.group_by(resumen.producto_id, models.Producto.nombre).order_by(func.sum(resumen.ingresos).desc()).all()
+    ]
+    datos_al, antiguedad_s = copia_reportes.antiguedad(db)
+    return schemas.ReporteProductosResponse(filas=filas, datos_al=datos_al, antiguedad_s=antiguedad_s)
+
+@app.post("/api/reportes/copia", response_model=schemas.CopiaReportesResponse, tags=["Admin"])
+def actualizar_copia_reportes():
+    """Regenerar ahora la copia de la base que leen los reportes"""
+    datos_al, duracion_s = copia_reportes.actualizar_copia()
+    return schemas.CopiaReportesResponse(datos_al=datos_al, duracion_ms=duracion_s * 1000)
+
+@app.post("/api/reportes/reconstruir", tags=["Admin"])
+def reconstruir_reportes(db: Session = Depends(get_db)):
+    """Recalcular los resúmenes de ventas desde el historial completo"""
+    filas = reportes.reconstruir_resumenes(db)
+    return {"message": "Resúmenes reconstruidos correctamente", "filas": filas}
+
+# ==================== MÉTRICAS ====================
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Admin"])
+def get_metricas():
+    """Métricas de requests y base de datos en formato de texto de Prometheus"""
+    return PlainTextResponse(metricas.registro.exportar(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache/estadisticas", tags=["Admin"])
+def get_estadisticas_cache():
+    """Aciertos, fallos y respuestas 304 de la caché del catálogo"""
+    return {
+        **cache_catalogo.estadisticas(),
+        "planificacion": {
+            "aciertos": planificacion.cache_matriz.aciertos,
+            "fallos": planificacion.cache_matriz.fallos,
+            "compilaciones": planificacion.cache_matriz.compilaciones
+        }
+    }
+
 # ==================== ENDPOINT DE INICIALIZACIÓN ====================
 
 @app.post("/api/init-database", tags=["Admin"])
@@ -365,6 +1238,8 @@ def init_database(db: Session = Depends(get_db)):
     
     for item in stock_items:
         db.add(item)
+    db.flush()
+    movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, stock={item.id: item.cantidad for item in stock_items})
     
     db.commit()
     
@@ -462,8 +1337,14 @@ def init_database(db: Session = Depends(get_db)):
                 **ing_data
             )
             db.add(ingrediente)
+    movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, productos={
+        item["producto"].id: (item["producto"].unidades, item["producto"].peso_kg) for item in productos_data
+    })
     
     db.commit()
+    cache_catalogo.invalidar()
+    precios.tabla_precios.invalidar()
+    bus_eventos.publicar("reinicio", {})
     
     return {"message": "Base de datos inicializada correctamente"}
 
@@ -0,0 +1,448 @@
+"""
+Importación y exportación masiva de stock, productos y ventas en CSV o NDJSON
+
+- Importación: el cuerpo del request se lee a medida que llega y se procesa en lotes de
+  PANADERIA_IMPORTACION_LOTE filas. Cada lote se valida fila por fila, se escribe con
+  sentencias executemany (upsert) y se confirma con un commit. Las filas inválidas no
+  frenan la importación: se informan con su número de línea.
+- Exportación: las filas se leen con un cursor del lado del servidor (yield_per) y se envían
+  en bloques a medida que se generan, así la memoria no depende del tamaño de la tabla.
+
+Formatos:
+- CSV con encabezado. La receta de un producto va en la columna `receta` como lista JSON.
+- NDJSON: un objeto JSON por línea (la receta y los items de cada venta van anidados).
+"""
+import csv
+import io
+import json
+import os
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.backend import archivo
+from src.backend import models
+from src.backend import movimientos
+from src.backend import recetas
+from src.backend import schemas
+
+IMPORTACION_LOTE = int(os.getenv("PANADERIA_IMPORTACION_LOTE", "500"))
+# Errores detallados en la respuesta de una importación (el resto solo se cuenta)
+IMPORTACION_MAX_ERRORES = 1000
+EXPORTACION_LOTE = 1000
+
+MEDIA_TYPES = {
+    schemas.FormatoArchivo.CSV: "text/csv; charset=utf-8",
+    schemas.FormatoArchivo.NDJSON: "application/x-ndjson",
+}
+
+COLUMNAS_STOCK = ["id", "nombre", "cantidad", "unidad"]
+COLUMNAS_PRODUCTOS = ["id", "nombre", "precio", "unidades", "peso_kg", "unidades_por_receta", "peso_por_receta", "receta"]
+COLUMNAS_VENTAS = [
+    "venta_id", "fecha", "total", "item_id", "producto_id", "producto_nombre",
+    "producto_precio", "cantidad", "tipo_venta", "cantidad_peso_kg"
+]
+
+# ==================== LECTURA DE FILAS ====================
+
+class LectorFilas:
+    """Arma las filas de un archivo CSV o NDJSON a partir de los bloques de bytes del cuerpo
+
+    Cada fila se devuelve como (línea, datos) o (línea, mensaje de error) si no se pudo leer.
+    """
+
+    def __init__(self, formato: schemas.FormatoArchivo):
+        self.formato = formato
+        self._resto = b""
+        self._registro: List[str] = []  # Líneas de un registro CSV con un campo entre comillas abierto
+        self._linea_registro = 0
+        self._linea = 0
+        self._encabezado: Optional[List[str]] = None
+
+    def agregar(self, bloque: bytes) -> List[Tuple[int, object]]:
+        lineas = (self._resto + bloque).split(b"\n")
+        self._resto = lineas.pop()
+        return [fila for linea in lineas for fila in self._leer_linea(linea)]
+
+    def terminar(self) -> List[Tuple[int, object]]:
+        filas = list(self._leer_linea(self._resto)) if self._resto else []
+        self._resto = b""
+        if self._registro:
+            filas.append((self._linea_registro, "Campo entre comillas sin cerrar"))
+            self._registro = []
+        return filas
+
+    def _leer_linea(self, crudo: bytes) -> Iterator[Tuple[int, object]]:
+        self._linea += 1
+        try:
+            linea = crudo.decode("utf-8-sig" if self._linea == 1 else "utf-8").rstrip("\r")
+        except UnicodeDecodeError:
+            yield self._linea, "La línea no es UTF-8 válido"
+            return
+
+        if self.formato == schemas.FormatoArchivo.NDJSON:
+            if not linea.strip():
+                return
+            try:
+                datos = json.loads(linea)
+            except ValueError as e:
+                yield self._linea, f"JSON inválido: {e}"
+                return
+            yield self._linea, datos if isinstance(datos, dict) else "Se esperaba un objeto JSON"
+            return
+
+        # CSV: un campo entre comillas puede ocupar varias líneas. Las comillas escapadas ("")
+        # no cambian la paridad, así que el registro termina cuando la cantidad es par
+        if not self._registro:
+            if not linea.strip():
+                return
+            self._linea_registro = self._linea
+        self._registro.append(linea)
+        texto = "\n".join(self._registro)
+        if texto.count('"') % 2:
+            return
+        self._registro = []
+        try:
+            valores = next(csv.reader([texto]))
+        except csv.Error as e:
+            yield self._linea_registro, f"CSV inválido: {e}"
+            return
+        if self._encabezado is None:
+            self._encabezado = [columna.strip() for columna in valores]
+            return
+        if len(valores) != len(self._encabezado):
+            yield self._linea_registro, f"Se esperaban {len(self._encabezado)} columnas y hay {len(valores)}"
+            return
+        # Las celdas vacías se toman como columnas ausentes (se usa el valor por defecto)
+        datos = {columna: valor for columna, valor in zip(self._encabezado, valores) if valor != ""}
+        if isinstance(datos.get("receta"), str):
+            try:
+                datos["receta"] = json.loads(datos["receta"])
+            except ValueError:
+                yield self._linea_registro, "La columna receta no es una lista JSON válida"
+                return
+        yield self._linea_registro, datos
+
+def mensaje_validacion(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in detalle['loc'])}: {detalle['msg']}" if detalle["loc"] else detalle["msg"]
+        for detalle in error.errors()
+    )
+
+# ==================== IMPORTACIÓN ====================
+
+class ResultadoImportacion:
+    """Totales y errores acumulados a lo largo de los lotes de una importación"""
+
+    def __init__(self):
+        self.procesadas = 0
+        self.creadas = 0
+        self.actualizadas = 0
+        self.rechazadas = 0
+        self.errores: List[schemas.ErrorImportacion] = []
+        self.producto_ids: set = set()
+
+    def rechazar(self, linea: int, error: str):
+        self.rechazadas += 1
+        if len(self.errores) < IMPORTACION_MAX_ERRORES:
+            self.errores.append(schemas.ErrorImportacion(linea=linea, error=error))
+
+    def respuesta(self) -> schemas.ImportacionResponse:
+        return schemas.ImportacionResponse(
+            procesadas=self.procesadas,
+            creadas=self.creadas,
+            actualizadas=self.actualizadas,
+            rechazadas=self.rechazadas,
+            errores=self.errores
+        )
+
+def _validar(filas: List[Tuple[int, object]], esquema, resultado: ResultadoImportacion) -> list:
+    validas = []
+    for linea, datos in filas:
+        resultado.procesadas += 1
+        if isinstance(datos, str):
+            resultado.rechazar(linea, datos)
+            continue
+        try:
+            validas.append((linea, esquema.model_validate(datos)))
+        except ValidationError as e:
+            resultado.rechazar(linea, mensaje_validacion(e))
+    return validas
+
+def _confirmar(db: Session, lote: list, resultado: ResultadoImportacion, escribir) -> bool:
+    """Escribir y confirmar un lote válido. Si falla la escritura se rechaza el lote completo"""
+    if not lote:
+        return True
+    try:
+        creadas, actualizadas = escribir()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        detalle = str(e) if isinstance(e, ValueError) else e.__class__.__name__
+        for linea, _ in lote:
+            resultado.rechazar(linea, f"No se pudo guardar el lote: {detalle}")
+        return False
+    resultado.creadas += creadas
+    resultado.actualizadas += actualizadas
+    return True
+
+def importar_stock(db: Session, filas: List[Tuple[int, object]], resultado: ResultadoImportacion):
+    """Insertar o actualizar (por nombre) un lote de items de stock"""
+    lote = _validar(filas, schemas.StockCreate, resultado)
+
+    def escribir():
+        # Si un nombre se repite dentro del lote queda el último
+        por_nombre = {stock.nombre: stock.model_dump() for _, stock in lote}
+        existentes = dict(db.execute(
+            select(models.Stock.nombre, models.Stock.cantidad).where(models.Stock.nombre.in_(por_nombre))
+        ).all())
+        sentencia = sqlite_insert(models.Stock.__table__)
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=["nombre"],
+            set_={"cantidad": sentencia.excluded.cantidad, "unidad": sentencia.excluded.unidad}
+        )
+        db.execute(sentencia, list(por_nombre.values()))
+        movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, stock={
+            stock_id: cantidad - existentes.get(nombre, 0.0)
+            for stock_id, nombre, cantidad in db.execute(
+                select(models.Stock.id, models.Stock.nombre, models.Stock.cantidad).where(models.Stock.nombre.in_(por_nombre))
+            )
+        })
+        return len(por_nombre) - len(existentes), len(existentes)
+
+    _confirmar(db, lote, resultado, escribir)
+
+def importar_productos(db: Session, filas: List[Tuple[int, object]], resultado: ResultadoImportacion):
+    """Insertar o actualizar un lote de productos y reemplazar sus recetas
+
+    Un producto con `id` existente se actualiza; con un `id` inexistente se crea con ese id.
+    Sin `id` se busca por nombre (el de menor id si hay varios) y si no existe se crea.
+    Solo se actualizan las columnas presentes en la fila, y la receta se reemplaza solo si
+    la fila la incluye.
+    """
+    validas = _validar(filas, schemas.ProductoImportacion, resultado)
+
+    # Los ingredientes de las recetas tienen que existir en el stock y las subrecetas, en productos
+    nombres_ingredientes = {
+        ingrediente.ingrediente for _, producto in validas for ingrediente in (producto.receta or [])
+        if ingrediente.subproducto_id is None
+    }
+    en_stock = set(db.execute(
+        select(models.Stock.nombre).where(models.Stock.nombre.in_(nombres_ingredientes))
+    ).scalars()) if nombres_ingredientes else set()
+    ids_subproductos = {
+        ingrediente.subproducto_id for _, producto in validas for ingrediente in (producto.receta or [])
+        if ingrediente.subproducto_id is not None
+    }
+    subproductos_existentes = set(db.execute(
+        select(models.Producto.id).where(models.Producto.id.in_(ids_subproductos))
+    ).scalars()) if ids_subproductos else set()
+    lote = []
+    for linea, producto in validas:
+        receta = producto.receta or []
+        faltantes = sorted({i.ingrediente for i in receta if i.subproducto_id is None} - en_stock)
+        subproductos_faltantes = sorted({i.subproducto_id for i in receta if i.subproducto_id is not None} - subproductos_existentes)
+        if faltantes:
+            resultado.rechazar(linea, f"Ingredientes que no existen en el stock: {', '.join(faltantes)}")
+        elif subproductos_faltantes:
+            resultado.rechazar(linea, f"Subproductos que no existen: {', '.join(map(str, subproductos_faltantes))}")
+        else:
+            lote.append((linea, producto))
+
+    def escribir():
+        ids = {producto.id for _, producto in lote if producto.id is not None}
+        ids_existentes = set(db.execute(
+            select(models.Producto.id).where(models.Producto.id.in_(ids))
+        ).scalars()) if ids else set()
+        nombres = {producto.nombre for _, producto in lote if producto.id is None}
+        id_por_nombre = dict(db.execute(
+            select(models.Producto.nombre, models.Producto.id)
+            .where(models.Producto.nombre.in_(nombres))
+            .order_by(models.Producto.id.desc())
+        ).all()) if nombres else {}
+
+        # Agrupar por producto destino: si se repite dentro del lote, las filas se combinan en orden
+        destinos = {}
+        for _, producto in lote:
+            clave = ("id", producto.id) if producto.id is not None else ("nombre", producto.nombre)
+            campos = producto.model_dump(exclude_unset=True, exclude={"id", "receta"})
+            if clave in destinos:
+                destinos[clave]["campos"].update(campos)
+                if producto.receta is not None:
+                    destinos[clave]["receta"] = producto.receta
+            else:
+                destinos[clave] = {"producto": producto, "campos": campos, "receta": producto.receta}
+
+        nuevos_con_id, nuevos_sin_id, actualizaciones = [], [], []
+        for (tipo, valor), destino in destinos.items():
+            producto_id = valor if tipo == "id" else id_por_nombre.get(valor)
+            if producto_id is not None and (tipo == "nombre" or producto_id in ids_existentes):
+                destino["id"] = producto_id
+                if destino["campos"]:
+                    actualizaciones.append({"id": producto_id, **destino["campos"]})
+                continue
+            fila = schemas.ProductoCreate(**destino["campos"]).model_dump()
+            if tipo == "id":
+                destino["id"] = valor
+                nuevos_con_id.append({"id": valor, **fila})
+            else:
+                nuevos_sin_id.append((destino, fila))
+
+        # Stock anterior de los productos cuyas unidades o peso cambian, para el libro de movimientos
+        anteriores = {
+            producto_id: (unidades, peso_kg)
+            for producto_id, unidades, peso_kg in db.execute(
+                select(models.Producto.id, models.Producto.unidades, models.Producto.peso_kg).where(models.Producto.id.in_([
+                    fila["id"] for fila in actualizaciones if fila.keys() & {"unidades", "peso_kg"}
+                ]))
+            )
+        }
+
+        if nuevos_con_id:
+            db.execute(insert(models.Producto), nuevos_con_id)
+        if nuevos_sin_id:
+            ids_nuevos = db.execute(
+                insert(models.Producto).returning(models.Producto.id, sort_by_parameter_order=True),
+                [fila for _, fila in nuevos_sin_id]
+            ).scalars().all()
+            for (destino, _), producto_id in zip(nuevos_sin_id, ids_nuevos):
+                destino["id"] = producto_id
+        if actualizaciones:
+            # UPDATE por clave primaria en lote (agrupado por conjunto de columnas)
+            db.execute(update(models.Producto), actualizaciones)
+        cambios = {
+            fila["id"]: (fila.get("unidades", anteriores[fila["id"]][0]) - anteriores[fila["id"]][0],
+                         fila.get("peso_kg", anteriores[fila["id"]][1]) - anteriores[fila["id"]][1])
+            for fila in actualizaciones if fila["id"] in anteriores
+        }
+        for destino, fila in nuevos_sin_id:
+            cambios[destino["id"]] = (fila["unidades"], fila["peso_kg"])
+        for fila in nuevos_con_id:
+            cambios[fila["id"]] = (fila["unidades"], fila["peso_kg"])
+        movimientos.registrar(db, models.TipoMovimientoEnum.AJUSTE, productos=cambios)
+
+        con_receta = [destino for destino in destinos.values() if destino["receta"] is not None]
+        if con_receta:
+            db.execute(delete(models.IngredienteReceta).where(
+                models.IngredienteReceta.producto_id.in_([destino["id"] for destino in con_receta])
+            ))
+            ingredientes = [
+                {"producto_id": destino["id"], **ingrediente.model_dump()}
+                for destino in con_receta for ingrediente in destino["receta"]
+            ]
+            if ingredientes:
+                db.execute(insert(models.IngredienteReceta), ingredientes)
+            if any(ingrediente["subproducto_id"] is not None for ingrediente in ingredientes) and recetas.tiene_ciclo(recetas.subrecetas(db)):
+                raise ValueError("Las subrecetas del lote forman un ciclo")
+
+        resultado.producto_ids.update(destino["id"] for destino in destinos.values())
+        creadas = len(nuevos_con_id) + len(nuevos_sin_id)
+        return creadas, len(destinos) - creadas
+
+    _confirmar(db, lote, resultado, escribir)
+
+IMPORTADORES = {
+    "stock": importar_stock,
+    "productos": importar_productos,
+}
+
+# ==================== EXPORTACIÓN ====================
+
+def _escritor_csv(columnas: List[str]):
+    """Devuelve una función que convierte filas en bytes CSV (la primera llamada incluye el encabezado)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    escritor.writerow(columnas)
+
+    def convertir(filas: Iterable[list]) -> bytes:
+        escritor.writerows(filas)
+        contenido = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return contenido
+
+    return convertir
+
+def _ndjson(objetos: Iterable[dict]) -> bytes:
+    return "".join(json.dumps(objeto, ensure_ascii=False) + "\n" for objeto in objetos).encode()
+
+def _lotes(db: Session, sentencia) -> Iterator[list]:
+    """Filas de una consulta en lotes, leídas con un cursor del lado del servidor"""
+    return db.execute(sentencia.execution_options(yield_per=EXPORTACION_LOTE)).partitions()
+
+def exportar_stock(db: Session, formato: schemas.FormatoArchivo) -> Iterator[bytes]:
+    sentencia = select(*(models.Stock.__table__.c[columna] for columna in COLUMNAS_STOCK)).order_by(models.Stock.id)
+    convertir_csv = _escritor_csv(COLUMNAS_STOCK)
+    for lote in _lotes(db, sentencia):
+        if formato == schemas.FormatoArchivo.CSV:
+            yield convertir_csv(lote)
+        else:
+            yield _ndjson(dict(fila._mapping) for fila in lote)
+    if formato == schemas.FormatoArchivo.CSV:
+        yield convertir_csv([])  # Solo el encabezado si no hay filas (vacío si ya se envió)
+
+def exportar_productos(db: Session, formato: schemas.FormatoArchivo) -> Iterator[bytes]:
+    columnas = COLUMNAS_PRODUCTOS[:-1]
+    sentencia = select(*(models.Producto.__table__.c[columna] for columna in columnas)).order_by(models.Producto.id)
+    convertir_csv = _escritor_csv(COLUMNAS_PRODUCTOS)
+    for lote in _lotes(db, sentencia):
+        por_producto = {fila.id: [] for fila in lote}
+        for producto_id, ingrediente, cantidad, unidad, subproducto_id in db.execute(
+            select(
+                models.IngredienteReceta.producto_id, models.IngredienteReceta.ingrediente,
+                models.IngredienteReceta.cantidad, models.IngredienteReceta.unidad,
+                models.IngredienteReceta.subproducto_id
+            )
+            .where(models.IngredienteReceta.producto_id.in_(por_producto))
+            .order_by(models.IngredienteReceta.id)
+        ):
+            ingrediente = {"ingrediente": ingrediente, "cantidad": cantidad, "unidad": unidad}
+            if subproducto_id is not None:
+                ingrediente["subproducto_id"] = subproducto_id
+            por_producto[producto_id].append(ingrediente)
+        if formato == schemas.FormatoArchivo.CSV:
+            yield convertir_csv([*fila, json.dumps(por_producto[fila.id], ensure_ascii=False)] for fila in lote)
+        else:
+            yield _ndjson({**fila._mapping, "receta": por_producto[fila.id]} for fila in lote)
+    if formato == schemas.FormatoArchivo.CSV:
+        yield convertir_csv([])
+
+def exportar_ventas(db: Session, formato: schemas.FormatoArchivo, desde=None, hasta=None) -> Iterator[bytes]:
+    """Ventas con sus items (incluidos los meses archivados): en CSV una fila por item, en NDJSON una venta por línea"""
+    sentencia = select(models.Venta.id, models.Venta.fecha, models.Venta.total).order_by(models.Venta.id)
+    if desde is not None:
+        sentencia = sentencia.where(models.Venta.creada_en >= desde)
+    if hasta is not None:
+        sentencia = sentencia.where(models.Venta.creada_en < hasta)
+    item = models.ItemVenta
+    convertir_csv = _escritor_csv(COLUMNAS_VENTAS)
+    for opciones in archivo.opciones_historial(db, desde, hasta):
+        for lote in db.execute(sentencia.execution_options(yield_per=EXPORTACION_LOTE), execution_options=opciones).partitions():
+            items = {fila.id: [] for fila in lote}
+            for fila_item in db.execute(
+                select(
+                    item.id, item.venta_id, item.producto_id, item.producto_nombre, item.producto_precio,
+                    item.cantidad, item.tipo_venta, item.cantidad_peso_kg
+                )
+                .where(item.venta_id.in_(items))
+                .order_by(item.venta_id, item.id),
+                execution_options=opciones
+            ):
+                datos = dict(fila_item._mapping)
+                datos["tipo_venta"] = datos["tipo_venta"].value
+                items[datos["venta_id"]].append(datos)
+            if formato == schemas.FormatoArchivo.CSV:
+                yield convertir_csv(
+                    [
+                        venta.id, venta.fecha, venta.total, i["id"], i["producto_id"], i["producto_nombre"],
+                        i["producto_precio"], i["cantidad"], i["tipo_venta"], i["cantidad_peso_kg"]
+                    ]
+                    for venta in lote for i in items[venta.id]
+                )
+            else:
+                yield _ndjson({**venta._mapping, "items": items[venta.id]} for venta in lote)
+    if formato == schemas.FormatoArchivo.CSV:
+        yield convertir_csv([])
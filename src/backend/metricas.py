@@ -0,0 +1,219 @@
+"""
+Métricas de requests y de base de datos en formato Prometheus
+
+- Un middleware ASGI mide la latencia de cada request y la agrupa por método, ruta
+  (el template, por ejemplo /api/productos/{producto_id}) y status.
+- Los eventos de SQLAlchemy sobre el engine cuentan las sentencias SQL y el tiempo en la base
+  de cada request, además de los commits y los rollbacks de transacciones que escribieron.
+- Los requests que superan PANADERIA_REQUEST_LENTO_MS se registran como una línea JSON
+  en el logger "panaderia.metricas".
+
+Todo se expone en GET /metrics.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+REQUEST_LENTO_MS = float(os.getenv("PANADERIA_REQUEST_LENTO_MS", "500"))
+
+# Streams de larga duración: su "latencia" es el tiempo que el cliente estuvo conectado
+RUTAS_SIN_MEDIR = {"/api/eventos"}
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_SQL = (1, 2, 5, 10, 20, 50, 100, 250)
+
+logger = logging.getLogger("panaderia.metricas")
+
+# Estadísticas del request en curso. Es un dict mutable para que las sentencias ejecutadas
+# desde el threadpool (endpoints sync) se sumen al mismo request
+_request_actual: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("request_actual", default=None)
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * len(buckets)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.conteos[i] += 1
+        self.suma += valor
+        self.total += 1
+
+class RegistroMetricas:
+    """Contadores e histogramas del proceso, seguros para usar desde varios hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias: Dict[Tuple[str, str, str], Histograma] = {}
+        self.sentencias: Dict[Tuple[str, str], Histograma] = {}
+        self.segundos_db: Dict[Tuple[str, str], float] = {}
+        self.requests_lentos: Dict[Tuple[str, str], int] = {}
+        self.commits = 0
+        self.rollbacks = 0
+        self._colectores: List[Callable[[], List[str]]] = []
+
+    def registrar_request(self, metodo: str, ruta: str, status: int, duracion: float, sentencias: int, segundos_db: float):
+        with self._lock:
+            clave = (metodo, ruta)
+            self.latencias.setdefault((metodo, ruta, str(status)), Histograma(BUCKETS_LATENCIA)).observar(duracion)
+            self.sentencias.setdefault(clave, Histograma(BUCKETS_SQL)).observar(sentencias)
+            self.segundos_db[clave] = self.segundos_db.get(clave, 0.0) + segundos_db
+            if duracion * 1000 >= REQUEST_LENTO_MS:
+                self.requests_lentos[clave] = self.requests_lentos.get(clave, 0) + 1
+
+    def registrar_commit(self):
+        with self._lock:
+            self.commits += 1
+
+    def registrar_rollback(self):
+        with self._lock:
+            self.rollbacks += 1
+
+    def registrar_colector(self, colector: Callable[[], List[str]]):
+        """Agregar una función que devuelve líneas extra para /metrics"""
+        self._colectores.append(colector)
+
+    def exportar(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus"""
+        lineas = []
+        with self._lock:
+            lineas += [
+                "# HELP panaderia_http_request_duration_seconds Latencia de los requests HTTP",
+                "# TYPE panaderia_http_request_duration_seconds histogram",
+            ]
+            for (metodo, ruta, status), histograma in sorted(self.latencias.items()):
+                etiquetas = f'method="{metodo}",route="{ruta}",status="{status}"'
+                lineas += _lineas_histograma("panaderia_http_request_duration_seconds", etiquetas, histograma)
+
+            lineas += [
+                "# HELP panaderia_http_request_sql_statements Sentencias SQL ejecutadas por request",
+                "# TYPE panaderia_http_request_sql_statements histogram",
+            ]
+            for (metodo, ruta), histograma in sorted(self.sentencias.items()):
+                etiquetas = f'method="{metodo}",route="{ruta}"'
+                lineas += _lineas_histograma("panaderia_http_request_sql_statements", etiquetas, histograma)
+
+            lineas += [
+                "# HELP panaderia_http_request_db_seconds_total Tiempo total en la base de datos por ruta",
+                "# TYPE panaderia_http_request_db_seconds_total counter",
+            ]
+            for (metodo, ruta), segundos in sorted(self.segundos_db.items()):
+                lineas.append(f'panaderia_http_request_db_seconds_total{{method="{metodo}",route="{ruta}"}} {segundos}')
+
+            lineas += [
+                "# HELP panaderia_http_slow_requests_total Requests que superaron el umbral de request lento",
+                "# TYPE panaderia_http_slow_requests_total counter",
+            ]
+            for (metodo, ruta), cantidad in sorted(self.requests_lentos.items()):
+                lineas.append(f'panaderia_http_slow_requests_total{{method="{metodo}",route="{ruta}"}} {cantidad}')
+
+            lineas += [
+                "# HELP panaderia_db_commits_total Commits de transacciones",
+                "# TYPE panaderia_db_commits_total counter",
+                f"panaderia_db_commits_total {self.commits}",
+                "# HELP panaderia_db_rollbacks_total Rollbacks de transacciones",
+                "# TYPE panaderia_db_rollbacks_total counter",
+                f"panaderia_db_rollbacks_total {self.rollbacks}",
+            ]
+        for colector in self._colectores:
+            lineas += colector()
+        return "\n".join(lineas) + "\n"
+
+def _lineas_histograma(nombre: str, etiquetas: str, histograma: Histograma) -> List[str]:
+    lineas = [
+        f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {conteo}'
+        for limite, conteo in zip(histograma.buckets, histograma.conteos)
+    ]
+    lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {histograma.total}')
+    lineas.append(f"{nombre}_sum{{{etiquetas}}} {histograma.suma}")
+    lineas.append(f"{nombre}_count{{{etiquetas}}} {histograma.total}")
+    return lineas
+
+registro = RegistroMetricas()
+
+def instrumentar_engine(engine):
+    """Registrar los eventos que cuentan sentencias, tiempo en la base, commits y rollbacks"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+        if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+            conn.info["metricas_escritura"] = True
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info["metricas_inicio"].pop()
+        actual = _request_actual.get()
+        if actual is not None:
+            actual["sentencias"] += 1
+            actual["segundos_db"] += time.perf_counter() - inicio
+
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto):
+        # La sentencia falló: descartar su marca de inicio
+        if contexto.connection is not None and contexto.connection.info.get("metricas_inicio"):
+            contexto.connection.info["metricas_inicio"].pop()
+
+    @event.listens_for(engine, "commit")
+    def _commit(conn):
+        conn.info.pop("metricas_escritura", None)
+        registro.registrar_commit()
+
+    @event.listens_for(engine, "rollback")
+    def _rollback(conn):
+        # Al cerrar cada sesión se hace rollback de su transacción aunque solo haya leído;
+        # solo se cuentan los rollbacks que descartan escrituras
+        if conn.info.pop("metricas_escritura", False):
+            registro.registrar_rollback()
+
+class MetricasMiddleware:
+    """Middleware ASGI que mide cada request HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in RUTAS_SIN_MEDIR:
+            await self.app(scope, receive, send)
+            return
+
+        estadisticas = {"sentencias": 0, "segundos_db": 0.0}
+        token = _request_actual.set(estadisticas)
+        respuesta = {"status": 500}
+
+        async def send_con_status(mensaje):
+            if mensaje["type"] == "http.response.start":
+                respuesta["status"] = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_con_status)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _request_actual.reset(token)
+            ruta = scope.get("route").path if scope.get("route") is not None else "sin_ruta"
+            registro.registrar_request(
+                scope["method"], ruta, respuesta["status"], duracion,
+                estadisticas["sentencias"], estadisticas["segundos_db"]
+            )
+            if duracion * 1000 >= REQUEST_LENTO_MS:
+                logger.warning(json.dumps({
+                    "evento": "request_lento",
+                    "metodo": scope["method"],
+                    "ruta": ruta,
+                    "path": scope["path"],
+                    "status": respuesta["status"],
+                    "duracion_ms": round(duracion * 1000, 2),
+                    "sentencias_sql": estadisticas["sentencias"],
+                    "db_ms": round(estadisticas["segundos_db"] * 1000, 2)
+                }, ensure_ascii=False))
@@ -0,0 +1,43 @@
+"""
+Script de migración de base de datos
+Crea las tablas del libro de movimientos de stock (movimientos_stock, snapshots_stock y
+snapshots_stock_items) y guarda un primer snapshot con el stock actual, que es el punto de
+partida del libro: el stock histórico se puede consultar desde ese momento. La aplicación
+hace lo mismo al iniciar si encuentra el libro vacío.
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.migrate_movimientos
+"""
+from src.backend import models
+from src.backend import movimientos
+from src.backend.database import SQLALCHEMY_DATABASE_URL, SessionLocal, engine
+
+def migrate_database():
+    """Agregar el libro de movimientos a una base existente"""
+    print(f"Iniciando migración de {SQLALCHEMY_DATABASE_URL}...")
+    
+    db = SessionLocal()
+    try:
+        print("Creando tablas del libro de movimientos...")
+        models.Base.metadata.create_all(
+            bind=engine,
+            tables=[models.MovimientoStock.__table__, models.SnapshotStock.__table__, models.SnapshotStockItem.__table__]
+        )
+        
+        snapshot = movimientos.iniciar_libro(db)
+        if snapshot is not None:
+            print(f"Snapshot inicial {snapshot.id} guardado.")
+        else:
+            print("El libro ya tenía historial o la base está vacía.")
+        
+        print("✓ Migración completada exitosamente!")
+        
+    except Exception as e:
+        db.rollback()
+        print(f"✗ Error durante la migración: {e}")
+        print("Revertiendo cambios...")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate_database()
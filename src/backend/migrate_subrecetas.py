@@ -0,0 +1,44 @@
+"""
+Script de migración de base de datos
+Agrega la columna subproducto_id a ingredientes_receta para que una receta pueda usar la
+receta de otro producto como ingrediente (subrecetas, ver recetas.py). Las recetas existentes
+quedan como estaban: todos sus ingredientes siguen siendo del stock.
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.migrate_subrecetas
+"""
+from sqlalchemy import inspect
+
+from src.backend.database import SQLALCHEMY_DATABASE_URL, engine
+
+def migrate_database():
+    """Agregar las subrecetas a una base existente"""
+    print(f"Iniciando migración de {SQLALCHEMY_DATABASE_URL}...")
+    inspector = inspect(engine)
+    
+    if "ingredientes_receta" not in inspector.get_table_names():
+        print("La tabla ingredientes_receta no existe todavía. Se creará con la nueva estructura.")
+        return
+    
+    try:
+        with engine.begin() as conexion:
+            columnas = [columna["name"] for columna in inspector.get_columns("ingredientes_receta")]
+            if "subproducto_id" in columnas:
+                print("La columna subproducto_id ya existe.")
+            else:
+                print("Agregando columna subproducto_id a ingredientes_receta...")
+                conexion.exec_driver_sql(
+                    "ALTER TABLE ingredientes_receta ADD COLUMN subproducto_id INTEGER REFERENCES productos (id)"
+                )
+            conexion.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_ingredientes_receta_subproducto_id ON ingredientes_receta (subproducto_id)"
+            )
+        
+        print("✓ Migración completada exitosamente!")
+        
+    except Exception as e:
+        print(f"✗ Error durante la migración: {e}")
+        print("Revertiendo cambios...")
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,52 @@
+"""
+Script de migración de base de datos
+Agrega la columna version a stock, productos e ingredientes_receta, crea las tablas de
+sincronización (sync_secuencia y sync_eliminados) y los triggers que asignan las versiones.
+Las filas existentes quedan con la versión 1, así la primera sincronización (since=0) las trae.
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.migrate_sync_versiones
+"""
+from sqlalchemy import inspect
+
+from src.backend import models
+from src.backend import sync
+from src.backend.database import SQLALCHEMY_DATABASE_URL, engine
+
+def migrate_database():
+    """Agregar el versionado de sincronización a una base existente"""
+    print(f"Iniciando migración de {SQLALCHEMY_DATABASE_URL}...")
+    inspector = inspect(engine)
+    tablas_existentes = inspector.get_table_names()
+    
+    try:
+        with engine.begin() as conexion:
+            for tabla in sync.TABLAS:
+                if tabla not in tablas_existentes:
+                    print(f"La tabla {tabla} no existe todavía. Se creará con la nueva estructura.")
+                    continue
+                columnas = [columna["name"] for columna in inspector.get_columns(tabla)]
+                if "version" not in columnas:
+                    print(f"Agregando columna version a {tabla}...")
+                    conexion.exec_driver_sql(f"ALTER TABLE {tabla} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+                conexion.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{tabla}_version ON {tabla} (version)")
+            
+            print("Creando tablas de sincronización...")
+            models.Base.metadata.create_all(
+                bind=conexion,
+                tables=[models.SyncSecuencia.__table__, models.SyncEliminado.__table__]
+            )
+            
+            # La secuencia arranca después de la versión de las filas existentes
+            print("Creando triggers de versionado...")
+            sync.instalar_triggers(conexion)
+            conexion.exec_driver_sql("UPDATE sync_secuencia SET valor = MAX(valor, 1) WHERE id = 1")
+        
+        print("✓ Migración completada exitosamente!")
+        
+    except Exception as e:
+        print(f"✗ Error durante la migración: {e}")
+        print("Revertiendo cambios...")
+
+if __name__ == "__main__":
+    migrate_database()
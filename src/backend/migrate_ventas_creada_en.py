@@ -0,0 +1,68 @@
+"""
+Script de migración de base de datos
+Agrega a la tabla ventas la columna indexada creada_en (timestamp de la venta) y la
+completa a partir de la columna fecha (ISO string) de las ventas existentes
+"""
+import sqlite3
+import os
+from datetime import datetime
+
+DB_PATH = "./panaderia.db"
+
+# Formato con el que SQLAlchemy guarda los DateTime en SQLite
+FORMATO_DATETIME = "%Y-%m-%d %H:%M:%S.%f"
+
+def migrate_database():
+    """Agregar y completar la columna creada_en de ventas"""
+    
+    if not os.path.exists(DB_PATH):
+        print(f"No se encontró la base de datos en {DB_PATH}")
+        print("No es necesaria la migración. La base de datos se creará con la nueva estructura.")
+        return
+    
+    print(f"Iniciando migración de {DB_PATH}...")
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("PRAGMA table_info(ventas)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if not columns:
+            print("La tabla ventas no existe todavía. Se creará con la nueva estructura.")
+            conn.close()
+            return
+        
+        if 'creada_en' not in columns:
+            print("Agregando columna creada_en a ventas...")
+            cursor.execute("ALTER TABLE ventas ADD COLUMN creada_en DATETIME")
+        
+        print("Completando creada_en desde fecha...")
+        cursor.execute("SELECT id, fecha FROM ventas WHERE creada_en IS NULL")
+        filas = cursor.fetchall()
+        valores = []
+        for venta_id, fecha in filas:
+            try:
+                creada_en = datetime.fromisoformat(fecha).strftime(FORMATO_DATETIME)
+            except (TypeError, ValueError):
+                print(f"  - Venta {venta_id}: fecha inválida '{fecha}', se deja sin creada_en")
+                continue
+            valores.append((creada_en, venta_id))
+        cursor.executemany("UPDATE ventas SET creada_en = ? WHERE id = ?", valores)
+        
+        print("Creando índice sobre creada_en...")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_ventas_creada_en ON ventas (creada_en)")
+        
+        conn.commit()
+        print("✓ Migración completada exitosamente!")
+        print(f"  - {len(valores)} ventas actualizadas")
+        
+    except Exception as e:
+        print(f"✗ Error durante la migración: {e}")
+        conn.rollback()
+        print("Revertiendo cambios...")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_database()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Enum, DateTime, LargeBinary
 from sqlalchemy.orm import relationship
 from src.backend.database import Base
 import enum
@@ -7,6 +7,11 @@ class TipoVentaEnum(str, enum.Enum):
     UNIDAD = "unidad"
     PESO = "peso"
 
+class TipoMovimientoEnum(str, enum.Enum):
+    VENTA = "venta"
+    PRODUCCION = "produccion"
+    AJUSTE = "ajuste"
+
 class Stock(Base):
     __tablename__ = "stock"
     
@@ -14,6 +19,7 @@ class Stock(Base):
     nombre = Column(String, unique=True, index=True, nullable=False)
     cantidad = Column(Float, nullable=False)
     unidad = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=0, index=True)  # Versión de sincronización (ver sync.py)
 
 class Producto(Base):
     __tablename__ = "productos"
@@ -29,9 +35,10 @@ class Producto(Base):
     # Configuración de receta (relación peso-unidad)
     unidades_por_receta = Column(Float, nullable=False, default=1.0)  # Unidades que produce la receta
     peso_por_receta = Column(Float, nullable=False, default=1.0)  # Peso total en kg que produce la receta
+    version = Column(Integer, nullable=False, default=0, index=True)  # Versión de sincronización (ver sync.py)
     
     # Relaciones
-    receta = relationship("IngredienteReceta", back_populates="producto", cascade="all, delete-orphan")
+    receta = relationship("IngredienteReceta", back_populates="producto", cascade="all, delete-orphan", foreign_keys="IngredienteReceta.producto_id")
     items_venta = relationship("ItemVenta", back_populates="producto")
 
 class IngredienteReceta(Base):
@@ -39,18 +46,21 @@ class IngredienteReceta(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
-    ingrediente = Column(String, nullable=False)  # Nombre del ingrediente del stock
+    ingrediente = Column(String, nullable=False)  # Nombre del ingrediente del stock (o del subproducto)
+    subproducto_id = Column(Integer, ForeignKey("productos.id"), nullable=True, index=True)  # Subreceta (ver recetas.py)
     cantidad = Column(Float, nullable=False)
     unidad = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=0, index=True)  # Versión de sincronización (ver sync.py)
     
     # Relaciones
-    producto = relationship("Producto", back_populates="receta")
+    producto = relationship("Producto", back_populates="receta", foreign_keys=[producto_id])
 
 class Venta(Base):
     __tablename__ = "ventas"
     
     id = Column(Integer, primary_key=True, index=True)
     fecha = Column(String, nullable=False)  # Formato: ISO string
+    creada_en = Column(DateTime, index=True)  # Mismo instante que fecha, indexado para filtrar por rango
     total = Column(Float, nullable=False)
     
     # Relaciones
@@ -71,3 +81,98 @@ class ItemVenta(Base):
     # Relaciones
     venta = relationship("Venta", back_populates="items")
     producto = relationship("Producto", back_populates="items_venta")
+
+# Resúmenes de ventas precalculados (se actualizan en la misma transacción que cada venta)
+# - unidades: cantidad vendida en ventas por unidad
+# - peso_kg: kilos vendidos en ventas por peso
+# - ingresos: suma de los subtotales
+# - items: cantidad de items de venta
+class ResumenVentaHora(Base):
+    __tablename__ = "resumen_ventas_hora"
+    
+    periodo = Column(String, primary_key=True)  # Formato: YYYY-MM-DDTHH
+    producto_id = Column(Integer, primary_key=True)
+    unidades = Column(Float, nullable=False, default=0.0)
+    peso_kg = Column(Float, nullable=False, default=0.0)
+    ingresos = Column(Float, nullable=False, default=0.0)
+    items = Column(Integer, nullable=False, default=0)
+
+class ResumenVentaDia(Base):
+    __tablename__ = "resumen_ventas_dia"
+    
+    periodo = Column(String, primary_key=True)  # Formato: YYYY-MM-DD
+    producto_id = Column(Integer, primary_key=True)
+    unidades = Column(Float, nullable=False, default=0.0)
+    peso_kg = Column(Float, nullable=False, default=0.0)
+    ingresos = Column(Float, nullable=False, default=0.0)
+    items = Column(Integer, nullable=False, default=0)
+
+# Sincronización incremental del catálogo (ver sync.py)
+class SyncSecuencia(Base):
+    __tablename__ = "sync_secuencia"
+    
+    id = Column(Integer, primary_key=True)  # Una sola fila (id = 1)
+    valor = Column(Integer, nullable=False, default=0)  # Última versión asignada
+
+class SyncEliminado(Base):
+    __tablename__ = "sync_eliminados"
+    
+    version = Column(Integer, primary_key=True)  # Versión asignada al borrado
+    tabla = Column(String, nullable=False)  # stock, productos o ingredientes_receta
+    fila_id = Column(Integer, nullable=False)
+
+# Meses de ventas movidos a archivos SQLite de solo lectura (ver archivo.py)
+class ArchivoVentas(Base):
+    __tablename__ = "archivos_ventas"
+    
+    mes = Column(String, primary_key=True)  # Formato: YYYY-MM
+    archivo = Column(String, nullable=False)  # Nombre del archivo dentro de PANADERIA_ARCHIVO_DIR
+    primera_venta_id = Column(Integer, nullable=False)
+    ultima_venta_id = Column(Integer, nullable=False, index=True)
+    ventas = Column(Integer, nullable=False)
+    items = Column(Integer, nullable=False)
+    archivado_en = Column(DateTime, nullable=False)
+
+# Respuestas guardadas por Idempotency-Key (solo con PANADERIA_IDEMPOTENCIA=sqlite, ver idempotencia.py)
+class ClaveIdempotencia(Base):
+    __tablename__ = "claves_idempotencia"
+    
+    clave = Column(String, primary_key=True)  # Método, path e Idempotency-Key
+    huella = Column(String, nullable=False)  # Hash del cuerpo del request
+    status_code = Column(Integer, nullable=True)  # None mientras el request está en curso
+    content_type = Column(String, nullable=True)
+    cuerpo = Column(LargeBinary, nullable=True)
+    expira_en = Column(DateTime, nullable=False, index=True)
+
+# Libro de movimientos de stock y snapshots periódicos (ver movimientos.py)
+# Cada movimiento es el cambio de un item de stock (cantidad) o de un producto (unidades y peso_kg)
+class MovimientoStock(Base):
+    __tablename__ = "movimientos_stock"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    creado_en = Column(DateTime, nullable=False, index=True)
+    tipo = Column(Enum(TipoMovimientoEnum), nullable=False)
+    referencia = Column(Integer, nullable=True)  # ID de la venta (solo en movimientos de venta)
+    stock_id = Column(Integer, nullable=True, index=True)
+    producto_id = Column(Integer, nullable=True, index=True)
+    cantidad = Column(Float, nullable=False, default=0.0)
+    unidades = Column(Float, nullable=False, default=0.0)
+    peso_kg = Column(Float, nullable=False, default=0.0)
+
+class SnapshotStock(Base):
+    __tablename__ = "snapshots_stock"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    creado_en = Column(DateTime, nullable=False, index=True)
+    ultimo_movimiento_id = Column(Integer, nullable=False)  # Último movimiento incluido (0: punto de partida del libro)
+
+class SnapshotStockItem(Base):
+    __tablename__ = "snapshots_stock_items"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_id = Column(Integer, ForeignKey("snapshots_stock.id"), nullable=False, index=True)
+    stock_id = Column(Integer, nullable=True)
+    producto_id = Column(Integer, nullable=True)
+    cantidad = Column(Float, nullable=False, default=0.0)
+    unidades = Column(Float, nullable=False, default=0.0)
+    peso_kg = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,286 @@
+"""
+Libro de movimientos de stock
+
+Cada cambio de Stock.cantidad y de Producto.unidades/peso_kg agrega, en la misma transacción,
+una fila a movimientos_stock con el cambio (no el valor resultante) y su tipo: venta,
+produccion (ingredientes consumidos y productos preparados) o ajuste (altas, ediciones,
+bajas e importaciones). Las filas nunca se modifican ni se borran.
+
+Las columnas de stock siguen siendo la vista materializada del stock actual: los descuentos
+se hacen con un UPDATE condicional sobre ellas, que es lo que impide vender o preparar sin
+stock aunque escriban varios workers (SQLite serializa las escrituras de todos modos).
+
+Cada PANADERIA_SNAPSHOT_INTERVALO_S segundos (por defecto una hora, 0 para desactivar) se
+guarda un snapshot con el valor de todos los items y el último movimiento que incluye. El
+stock en un instante pasado es el del último snapshot anterior más los movimientos
+posteriores hasta ese instante, así que la consulta solo lee esos movimientos; el contenido
+de los snapshots (que no cambian) se guarda en memoria.
+
+Para comparar el stock actual contra el libro o tomar un snapshot a mano:
+    python -m src.backend.movimientos --verificar
+    python -m src.backend.movimientos --snapshot
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from src.backend import models
+
+logger = logging.getLogger("panaderia.movimientos")
+
+SNAPSHOT_INTERVALO_S = float(os.getenv("PANADERIA_SNAPSHOT_INTERVALO_S", "3600"))
+
+# Diferencia aceptada entre el stock actual y el que resulta del libro (errores de redondeo)
+TOLERANCIA = 1e-6
+
+# Contenido de un snapshot o del stock en un instante: ({stock_id: cantidad}, {producto_id: [unidades, peso_kg]})
+Estado = Tuple[Dict[int, float], Dict[int, List[float]]]
+
+# ==================== REGISTRO ====================
+
+def filas_movimientos(
+    tipo: models.TipoMovimientoEnum,
+    stock: Optional[Dict[int, float]] = None,
+    productos: Optional[Dict[int, Tuple[float, float]]] = None,
+    referencia: Optional[int] = None,
+    instante: Optional[datetime] = None
+) -> List[dict]:
+    """Filas del libro para los cambios de stock de una operación
+
+    `stock` es {stock_id: cambio de cantidad} y `productos` {producto_id: (cambio de
+    unidades, cambio de peso_kg)}; los descuentos van con signo negativo.
+    """
+    instante = instante or datetime.now()
+    return [
+        {"creado_en": instante, "tipo": tipo, "referencia": referencia, "stock_id": stock_id, "producto_id": None,
+         "cantidad": cantidad, "unidades": 0.0, "peso_kg": 0.0}
+        for stock_id, cantidad in (stock or {}).items() if cantidad
+    ] + [
+        {"creado_en": instante, "tipo": tipo, "referencia": referencia, "stock_id": None, "producto_id": producto_id,
+         "cantidad": 0.0, "unidades": unidades, "peso_kg": peso_kg}
+        for producto_id, (unidades, peso_kg) in (productos or {}).items() if unidades or peso_kg
+    ]
+
+def insertar(db: Session, filas: List[dict]):
+    """Agregar filas al libro con un único INSERT en lote, sin commit"""
+    if filas:
+        db.execute(insert(models.MovimientoStock), filas)
+
+def registrar(db: Session, tipo: models.TipoMovimientoEnum, **cambios):
+    """Agregar al libro los cambios de stock de una operación, sin commit (ver filas_movimientos)"""
+    insertar(db, filas_movimientos(tipo, **cambios))
+
+# ==================== SNAPSHOTS ====================
+
+class CacheSnapshots:
+    """Contenido de los últimos snapshots leídos (un snapshot no cambia después de creado)"""
+
+    def __init__(self, maximo: int = 4):
+        self._snapshots: Dict[int, Estado] = {}
+        self._lock = threading.Lock()
+        self.maximo = maximo
+
+    def obtener(self, db: Session, snapshot_id: int) -> Estado:
+        """Copia del contenido del snapshot, para sumarle movimientos"""
+        with self._lock:
+            estado = self._snapshots.get(snapshot_id)
+        if estado is None:
+            estado = ({}, {})
+            for stock_id, producto_id, cantidad, unidades, peso_kg in db.execute(
+                select(
+                    models.SnapshotStockItem.stock_id, models.SnapshotStockItem.producto_id,
+                    models.SnapshotStockItem.cantidad, models.SnapshotStockItem.unidades, models.SnapshotStockItem.peso_kg
+                ).where(models.SnapshotStockItem.snapshot_id == snapshot_id)
+            ):
+                if stock_id is not None:
+                    estado[0][stock_id] = cantidad
+                else:
+                    estado[1][producto_id] = [unidades, peso_kg]
+            with self._lock:
+                self._snapshots[snapshot_id] = estado
+                while len(self._snapshots) > self.maximo:
+                    del self._snapshots[min(self._snapshots)]
+        return dict(estado[0]), {producto_id: list(valores) for producto_id, valores in estado[1].items()}
+
+cache_snapshots = CacheSnapshots()
+
+def tomar_snapshot(db: Session) -> models.SnapshotStock:
+    """Guardar el stock actual de todos los items junto con el último movimiento que incluye"""
+    snapshot = models.SnapshotStock(creado_en=datetime.now(), ultimo_movimiento_id=0)
+    db.add(snapshot)
+    # Con la fila insertada la transacción tiene el lock de escritura: ningún otro writer
+    # agrega movimientos ni cambia el stock hasta el commit
+    db.flush()
+    snapshot.creado_en = datetime.now()
+    snapshot.ultimo_movimiento_id = db.scalar(select(func.coalesce(func.max(models.MovimientoStock.id), 0)))
+    items = [
+        {"snapshot_id": snapshot.id, "stock_id": stock_id, "producto_id": None, "cantidad": cantidad, "unidades": 0.0, "peso_kg": 0.0}
+        for stock_id, cantidad in db.execute(select(models.Stock.id, models.Stock.cantidad))
+    ] + [
+        {"snapshot_id": snapshot.id, "stock_id": None, "producto_id": producto_id, "cantidad": 0.0, "unidades": unidades, "peso_kg": peso_kg}
+        for producto_id, unidades, peso_kg in db.execute(select(models.Producto.id, models.Producto.unidades, models.Producto.peso_kg))
+    ]
+    if items:
+        db.execute(insert(models.SnapshotStockItem), items)
+    db.commit()
+    return snapshot
+
+def iniciar_libro(db: Session) -> Optional[models.SnapshotStock]:
+    """Si el libro está vacío y la base ya tiene stock, guardar un snapshot como punto de partida"""
+    if db.query(models.SnapshotStock.id).first() is not None or db.query(models.MovimientoStock.id).first() is not None:
+        return None
+    if db.query(models.Stock.id).first() is None and db.query(models.Producto.id).first() is None:
+        return None
+    db.rollback()
+    return tomar_snapshot(db)
+
+def tomar_snapshot_si_corresponde(db: Session, intervalo_s: float = SNAPSHOT_INTERVALO_S) -> Optional[models.SnapshotStock]:
+    """Tomar un snapshot si el último tiene más de `intervalo_s` segundos y hubo movimientos desde entonces"""
+    ultimo = db.query(models.SnapshotStock).order_by(models.SnapshotStock.id.desc()).first()
+    if ultimo is not None and ultimo.creado_en > datetime.now() - timedelta(seconds=intervalo_s):
+        return None
+    desde_id = ultimo.ultimo_movimiento_id if ultimo is not None else 0
+    hubo_movimientos = db.query(models.MovimientoStock.id).filter(models.MovimientoStock.id > desde_id).first() is not None
+    db.rollback()  # Terminar la transacción de lectura antes de escribir
+    return tomar_snapshot(db) if hubo_movimientos else None
+
+class SnapshotsPeriodicos:
+    """Hilo que toma un snapshot cada `intervalo_s` segundos (si hubo movimientos)"""
+
+    def __init__(self, intervalo_s: float = SNAPSHOT_INTERVALO_S):
+        self.intervalo_s = intervalo_s
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        if self.intervalo_s <= 0 or self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="snapshots-stock", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._hilo is not None:
+            self._detener.set()
+            self._hilo.join()
+            self._hilo = None
+
+    def _bucle(self):
+        from src.backend.database import SessionLocal
+
+        while not self._detener.wait(self.intervalo_s):
+            db = SessionLocal()
+            try:
+                # Con varios workers, el primero que llega lo toma y los demás ven uno reciente
+                tomar_snapshot_si_corresponde(db, self.intervalo_s)
+            except Exception:
+                db.rollback()
+                logger.exception("No se pudo tomar el snapshot de stock")
+            finally:
+                db.close()
+
+snapshots_periodicos = SnapshotsPeriodicos()
+
+# ==================== CONSULTAS ====================
+
+def _aplicar_movimientos(db: Session, estado: Estado, desde_id: int, hasta: Optional[datetime] = None) -> int:
+    """Sumar al estado los movimientos posteriores a `desde_id` (hasta el instante indicado). Devuelve cuántos aplicó"""
+    m = models.MovimientoStock
+    condiciones = [m.id > desde_id]
+    if hasta is not None:
+        condiciones.append(m.creado_en <= hasta)
+    aplicados = 0
+    stock, productos = estado
+    for stock_id, producto_id, cantidad, unidades, peso_kg, movimientos in db.execute(
+        select(m.stock_id, m.producto_id, func.sum(m.cantidad), func.sum(m.unidades), func.sum(m.peso_kg), func.count())
+        .where(*condiciones)
+        .group_by(m.stock_id, m.producto_id)
+    ):
+        if stock_id is not None:
+            stock[stock_id] = stock.get(stock_id, 0.0) + cantidad
+        else:
+            valores = productos.setdefault(producto_id, [0.0, 0.0])
+            valores[0] += unidades
+            valores[1] += peso_kg
+        aplicados += movimientos
+    return aplicados
+
+def stock_en(db: Session, instante: datetime) -> Tuple[Optional[models.SnapshotStock], Estado, int]:
+    """Stock de todos los items en un instante: último snapshot anterior más los movimientos hasta el instante
+
+    Devuelve el snapshot usado (None si se partió de cero), el estado y cuántos movimientos se aplicaron.
+    """
+    snapshot = (
+        db.query(models.SnapshotStock)
+        .filter(models.SnapshotStock.creado_en <= instante)
+        .order_by(models.SnapshotStock.id.desc())
+        .first()
+    )
+    if snapshot is None:
+        # El libro puede haber empezado con una base que ya tenía stock (ver migrate_movimientos.py)
+        inicio = db.query(models.SnapshotStock).filter(models.SnapshotStock.ultimo_movimiento_id == 0).first()
+        if inicio is not None:
+            raise HTTPException(status_code=400, detail=f"No hay historial de stock anterior a {inicio.creado_en.isoformat()}")
+        estado, desde_id = ({}, {}), 0
+    else:
+        estado, desde_id = cache_snapshots.obtener(db, snapshot.id), snapshot.ultimo_movimiento_id
+    aplicados = _aplicar_movimientos(db, estado, desde_id, instante)
+    return snapshot, estado, aplicados
+
+def verificar_stock(db: Session) -> List[str]:
+    """Comparar el stock actual contra el último snapshot más todos los movimientos posteriores"""
+    snapshot = db.query(models.SnapshotStock).order_by(models.SnapshotStock.id.desc()).first()
+    estado = cache_snapshots.obtener(db, snapshot.id) if snapshot is not None else ({}, {})
+    _aplicar_movimientos(db, estado, snapshot.ultimo_movimiento_id if snapshot is not None else 0)
+    stock, productos = estado
+
+    diferencias = []
+    actual_stock = dict(db.execute(select(models.Stock.id, models.Stock.cantidad)).all())
+    for stock_id in sorted(set(stock) | set(actual_stock)):
+        esperado, actual = stock.get(stock_id, 0.0), actual_stock.get(stock_id, 0.0)
+        if abs(esperado - actual) > TOLERANCIA:
+            diferencias.append(f"stock {stock_id}: cantidad según el libro {esperado}, actual {actual}")
+    actual_productos = {
+        producto_id: (unidades, peso_kg)
+        for producto_id, unidades, peso_kg in db.execute(select(models.Producto.id, models.Producto.unidades, models.Producto.peso_kg))
+    }
+    for producto_id in sorted(set(productos) | set(actual_productos)):
+        esperado, actual = productos.get(producto_id, (0.0, 0.0)), actual_productos.get(producto_id, (0.0, 0.0))
+        for medida, valor_esperado, valor_actual in zip(("unidades", "peso_kg"), esperado, actual):
+            if abs(valor_esperado - valor_actual) > TOLERANCIA:
+                diferencias.append(f"producto {producto_id}: {medida} según el libro {valor_esperado}, actual {valor_actual}")
+    return diferencias
+
+if __name__ == "__main__":
+    from src.backend.database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Verificar el libro de movimientos de stock o tomar un snapshot")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--verificar", action="store_true", help="Comparar el stock actual contra el libro")
+    grupo.add_argument("--snapshot", action="store_true", help="Guardar un snapshot del stock actual")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.snapshot:
+            snapshot = tomar_snapshot(db)
+            print(f"✓ Snapshot {snapshot.id} hasta el movimiento {snapshot.ultimo_movimiento_id}")
+        else:
+            diferencias = verificar_stock(db)
+            if diferencias:
+                print(f"✗ {len(diferencias)} diferencias encontradas:")
+                for diferencia in diferencias:
+                    print(f"  - {diferencia}")
+                sys.exit(1)
+            print("✓ El stock coincide con el libro de movimientos")
+    finally:
+        db.close()
@@ -0,0 +1,228 @@
+"""
+Planificación de producción sin modificar el stock
+
+Arma una sola vez la matriz recetas × ingredientes (una fila dispersa por producto con
+(índice del ingrediente, cantidad por receta), con las subrecetas ya expandidas) y el vector
+de stock disponible, y con eso responde:
+- cuántas recetas de cada producto se pueden preparar con el stock actual (el mínimo de
+  disponible / cantidad sobre los ingredientes de la receta)
+- qué stock queda si se ejecuta un plan de producción (disponible - demanda del plan)
+
+La matriz se guarda en memoria junto con la versión de las recetas compiladas (ver sync.py,
+cambia con los ingredientes de las recetas, las altas, bajas y renombres de stock y los
+cambios de rendimiento, de cualquier worker). El vector de stock se guarda con la versión de
+sincronización, que cambia con cada venta y cada preparación: cuando solo cambia esa, se
+vuelve a leer el vector (un SELECT id, cantidad FROM stock) y los nombres de los productos,
+sin recompilar las recetas. Mientras ninguna cambie, cada consulta es solo aritmética
+sobre listas, proporcional a la cantidad de ingredientes de las recetas.
+"""
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.backend import models
+from src.backend import schemas
+from src.backend import sync
+from src.backend.cache import cache_catalogo
+from src.backend.recetas import cache_recetas, compilar_recetas
+
+# Tolerancia para redondear hacia abajo la cantidad de recetas completas
+EPSILON = 1e-9
+
+class Ingrediente(NamedTuple):
+    stock_id: int
+    nombre: str
+    unidad: str
+
+class MatrizProduccion:
+    """Recetas como filas dispersas sobre el vector de stock"""
+
+    def __init__(self, ingredientes: List[Ingrediente], disponible: List[float], productos: Dict[int, str],
+                 filas: Dict[int, List[Tuple[int, float]]], faltantes: Dict[int, List[str]]):
+        self.ingredientes = ingredientes
+        self.disponible = disponible
+        self.productos = productos  # {producto_id: nombre}
+        self.filas = filas  # {producto_id: [(índice del ingrediente, cantidad por receta)]}
+        self.faltantes = faltantes  # {producto_id: ingredientes de la receta que no están en el stock}
+        self.indice_stock = {ingrediente.stock_id: indice for indice, ingrediente in enumerate(ingredientes)}
+
+    def con_stock(self, disponible: List[float], productos: Dict[int, str]) -> "MatrizProduccion":
+        """La misma matriz sobre otro vector de stock (las filas se comparten, no se copian)"""
+        return MatrizProduccion(self.ingredientes, disponible, productos, self.filas, self.faltantes)
+
+    def maximo(self, producto_id: int, disponible: Optional[List[float]] = None) -> Tuple[Optional[float], Optional[int]]:
+        """Máximo de recetas del producto y el índice del ingrediente que lo limita
+
+        Devuelve (None, None) si el producto no tiene receta y (0, None) si le falta un ingrediente.
+        """
+        disponible = disponible if disponible is not None else self.disponible
+        fila = self.filas.get(producto_id)
+        if not fila and not self.faltantes.get(producto_id):
+            return None, None
+        if self.faltantes.get(producto_id):
+            return 0.0, None
+        maximo, limitante = math.inf, None
+        for indice, cantidad in fila:
+            if cantidad <= 0:
+                continue
+            posible = max(disponible[indice], 0.0) / cantidad
+            if posible < maximo:
+                maximo, limitante = posible, indice
+        return (maximo if limitante is not None else None), limitante
+
+    def demanda(self, cantidades: Dict[int, float]) -> Dict[int, float]:
+        """Cantidad necesaria de cada ingrediente (por índice) para un plan {producto_id: recetas}"""
+        demanda: Dict[int, float] = {}
+        for producto_id, veces in cantidades.items():
+            for indice, cantidad in self.filas.get(producto_id, []):
+                demanda[indice] = demanda.get(indice, 0.0) + cantidad * veces
+        return demanda
+
+def construir_matriz(db: Session) -> MatrizProduccion:
+    """Leer stock, productos y recetas, expandiendo las subrecetas (ver recetas.py)
+
+    Compila todas las recetas de nuevo en lugar de usar la caché de recetas: la matriz solo
+    se arma cuando cambia la versión de las recetas, y la caché de recetas se vacía con el
+    mismo cambio.
+    """
+    ingredientes, disponible, indice_stock = [], [], {}
+    for stock_id, nombre, cantidad, unidad in db.execute(
+        select(models.Stock.id, models.Stock.nombre, models.Stock.cantidad, models.Stock.unidad).order_by(models.Stock.id)
+    ):
+        indice_stock[stock_id] = len(ingredientes)
+        ingredientes.append(Ingrediente(stock_id, nombre, unidad))
+        disponible.append(cantidad)
+
+    productos = dict(db.execute(select(models.Producto.id, models.Producto.nombre).order_by(models.Producto.id)).all())
+
+    filas: Dict[int, List[Tuple[int, float]]] = {}
+    faltantes: Dict[int, List[str]] = {}
+    compiladas, _ = compilar_recetas(db, list(productos))
+    for producto_id in productos:
+        for ingrediente in compiladas[producto_id]:
+            indice = indice_stock.get(ingrediente.stock_id)
+            if indice is None:
+                faltantes.setdefault(producto_id, []).append(ingrediente.nombre)
+            else:
+                filas.setdefault(producto_id, []).append((indice, ingrediente.cantidad))
+    return MatrizProduccion(ingredientes, disponible, productos, filas, faltantes)
+
+def actualizar_stock(db: Session, matriz: MatrizProduccion) -> MatrizProduccion:
+    """Releer el vector de stock y los nombres de los productos de una matriz, sin recompilar las recetas
+
+    Las altas y bajas de stock cambian la versión de las recetas, así que alcanza con las
+    cantidades de las filas que ya están en la matriz. Un producto nuevo todavía no tiene
+    receta (agregarle una también cambia esa versión).
+    """
+    disponible = list(matriz.disponible)
+    for stock_id, cantidad in db.execute(select(models.Stock.id, models.Stock.cantidad)):
+        indice = matriz.indice_stock.get(stock_id)
+        if indice is not None:
+            disponible[indice] = cantidad
+    productos = dict(db.execute(select(models.Producto.id, models.Producto.nombre).order_by(models.Producto.id)).all())
+    return matriz.con_stock(disponible, productos)
+
+class CacheMatriz:
+    """La última matriz armada, válida mientras no cambien las recetas; el stock se relee con cada escritura"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recetas = None
+        self._version = None
+        self._matriz: Optional[MatrizProduccion] = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.compilaciones = 0
+
+    def obtener(self, db: Session) -> MatrizProduccion:
+        # Las versiones se leen antes que los datos: si cambian en el medio, la próxima consulta
+        # ve otra versión y vuelve a leer el stock (o a armar la matriz). Las generaciones
+        # locales cubren las bases sin triggers de sincronización.
+        version = (sync.version_actual(db), cache_catalogo.generacion)
+        version_recetas = (sync.version_recetas(db), cache_recetas.invalidaciones)
+        with self._lock:
+            matriz = self._matriz if self._recetas == version_recetas else None
+            if matriz is not None and self._version == version:
+                self.aciertos += 1
+                return matriz
+            self.fallos += 1
+        if matriz is None:
+            matriz = construir_matriz(db)
+            with self._lock:
+                self.compilaciones += 1
+        else:
+            matriz = actualizar_stock(db, matriz)
+        with self._lock:
+            self._recetas, self._version, self._matriz = version_recetas, version, matriz
+        return matriz
+
+cache_matriz = CacheMatriz()
+
+def maximos_producibles(db: Session) -> List[schemas.MaximoProducible]:
+    matriz = cache_matriz.obtener(db)
+    resultado = []
+    for producto_id, nombre in matriz.productos.items():
+        maximo, limitante = matriz.maximo(producto_id)
+        resultado.append(schemas.MaximoProducible(
+            producto_id=producto_id,
+            nombre=nombre,
+            max_recetas=maximo,
+            max_recetas_completas=math.floor(maximo + EPSILON) if maximo is not None else None,
+            limitante=matriz.ingredientes[limitante].nombre if limitante is not None else None,
+            ingredientes_faltantes=matriz.faltantes.get(producto_id, [])
+        ))
+    return resultado
+
+def simular_plan(db: Session, plan: schemas.ProduccionRequest) -> schemas.SimulacionResponse:
+    """Stock que queda después del plan, con las mismas validaciones que POST /api/produccion"""
+    if not plan.items:
+        raise HTTPException(status_code=400, detail="El plan de producción debe tener al menos un producto")
+    matriz = cache_matriz.obtener(db)
+
+    cantidades: Dict[int, float] = {}
+    for item in plan.items:
+        cantidades[item.producto_id] = cantidades.get(item.producto_id, 0) + item.cantidad
+    for producto_id in cantidades:
+        if producto_id not in matriz.productos:
+            raise HTTPException(status_code=404, detail=f"Producto con id {producto_id} no encontrado")
+        if matriz.faltantes.get(producto_id):
+            raise HTTPException(status_code=404, detail=f"El ingrediente '{matriz.faltantes[producto_id][0]}' no existe en el stock")
+        if not matriz.filas.get(producto_id):
+            raise HTTPException(status_code=400, detail=f"El producto {matriz.productos[producto_id]} no tiene receta definida")
+
+    demanda = matriz.demanda(cantidades)
+    restante = list(matriz.disponible)
+    for indice, cantidad in demanda.items():
+        restante[indice] -= cantidad
+
+    ingredientes = []
+    faltantes = []
+    for indice in sorted(demanda):
+        ingrediente = matriz.ingredientes[indice]
+        ingredientes.append(schemas.SimulacionIngrediente(
+            stock_id=ingrediente.stock_id,
+            nombre=ingrediente.nombre,
+            unidad=ingrediente.unidad,
+            disponible=matriz.disponible[indice],
+            necesario=demanda[indice],
+            restante=restante[indice]
+        ))
+        if restante[indice] < 0:
+            faltantes.append(ingrediente.nombre)
+
+    # Cuánto más se podría preparar de cada producto del plan con el stock que queda
+    maximos_despues = {}
+    for producto_id in cantidades:
+        maximo, _ = matriz.maximo(producto_id, restante)
+        maximos_despues[producto_id] = maximo
+
+    return schemas.SimulacionResponse(
+        factible=not faltantes,
+        faltantes=faltantes,
+        ingredientes=ingredientes,
+        max_recetas_despues=maximos_despues
+    )
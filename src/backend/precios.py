@@ -0,0 +1,146 @@
+"""
+Tabla de precios por producto
+
+Los productos guardan el precio de una receta completa; las ventas necesitan el precio por
+unidad, el precio por kg y los kg por unidad, que salen de unidades_por_receta y
+peso_por_receta. La tabla los calcula una vez por producto y la comparten la cotización de
+carritos (POST /api/ventas/cotizar, que solo hace búsquedas en diccionarios) y el registro de
+ventas.
+
+Se actualiza con cada alta, modificación o baja de productos hecha en este proceso. Como
+otro worker puede haber cambiado un producto, la tabla se vuelve a leer completa cada
+PANADERIA_PRECIOS_TTL_S segundos y, al vender, cada precio se compara con la fila del
+producto recién leída: si no coincide se recalcula, así una venta nunca usa un precio viejo.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.backend import models
+from src.backend import schemas
+
+PRECIOS_TTL_S = float(os.getenv("PANADERIA_PRECIOS_TTL_S", "30"))
+
+class PrecioProducto(NamedTuple):
+    # Datos del producto con los que se calculó
+    nombre: str
+    precio: float
+    unidades_por_receta: float
+    peso_por_receta: float
+    # Precios derivados
+    precio_por_unidad: float
+    precio_por_kg: float
+    kg_por_unidad: float
+
+def calcular_precio(nombre: str, precio: float, unidades_por_receta: float, peso_por_receta: float) -> PrecioProducto:
+    """Precio por unidad, por kg y kg por unidad a partir del precio y el rendimiento de la receta"""
+    # Relación unidades/peso configurada en la receta
+    unidades = unidades_por_receta if unidades_por_receta and unidades_por_receta > 0 else 1
+    peso = peso_por_receta if peso_por_receta and peso_por_receta > 0 else 1
+    return PrecioProducto(
+        nombre, precio, unidades_por_receta, peso_por_receta,
+        precio_por_unidad=precio / unidades,
+        precio_por_kg=precio / peso,
+        kg_por_unidad=peso / unidades
+    )
+
+class TablaPrecios:
+    """Precios derivados de todos los productos, seguros para usar desde varios hilos"""
+
+    def __init__(self, ttl_s: float = PRECIOS_TTL_S):
+        self.ttl_s = ttl_s
+        self._precios: Dict[int, PrecioProducto] = {}
+        self._cargada_en: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def precios(self, db: Session) -> Dict[int, PrecioProducto]:
+        """La tabla completa, leyéndola de la base si no está cargada o venció"""
+        with self._lock:
+            if self._cargada_en is not None and time.monotonic() - self._cargada_en < self.ttl_s:
+                return self._precios
+        leida = time.monotonic()
+        precios = {
+            producto_id: calcular_precio(nombre, precio, unidades_por_receta, peso_por_receta)
+            for producto_id, nombre, precio, unidades_por_receta, peso_por_receta in db.execute(
+                select(
+                    models.Producto.id, models.Producto.nombre, models.Producto.precio,
+                    models.Producto.unidades_por_receta, models.Producto.peso_por_receta
+                )
+            )
+        }
+        with self._lock:
+            self._precios, self._cargada_en = precios, leida
+        return precios
+
+    def precio(self, producto: models.Producto) -> PrecioProducto:
+        """Precio de un producto ya leído de la base, recalculado si la tabla tenía otros datos"""
+        datos = (producto.nombre, producto.precio, producto.unidades_por_receta, producto.peso_por_receta)
+        precio = self._precios.get(producto.id)
+        if precio is None or precio[:4] != datos:
+            precio = calcular_precio(*datos)
+            with self._lock:
+                self._precios[producto.id] = precio
+        return precio
+
+    def actualizar(self, producto: models.Producto):
+        """Recalcular el precio de un producto creado o modificado"""
+        with self._lock:
+            self._precios[producto.id] = calcular_precio(
+                producto.nombre, producto.precio, producto.unidades_por_receta, producto.peso_por_receta
+            )
+
+    def quitar(self, producto_id: int):
+        with self._lock:
+            self._precios.pop(producto_id, None)
+
+    def invalidar(self):
+        """Volver a leer la tabla completa en la próxima consulta (por ejemplo, después de una importación)"""
+        with self._lock:
+            self._precios, self._cargada_en = {}, None
+
+tabla_precios = TablaPrecios()
+
+def cotizar_item(producto_id: int, precio: PrecioProducto, item: schemas.ItemVentaCreate) -> dict:
+    """Precio aplicado, subtotal y cantidades a descontar de un item, sin validar el stock"""
+    if item.tipo_venta == schemas.TipoVenta.UNIDAD:
+        unidades_a_descontar = item.cantidad
+        peso_a_descontar = item.cantidad * precio.kg_por_unidad
+        precio_aplicado = precio.precio_por_unidad
+        subtotal = precio_aplicado * item.cantidad
+    else:  # PESO
+        peso_a_descontar = item.cantidad_peso_kg if item.cantidad_peso_kg else item.cantidad
+        if peso_a_descontar <= 0:
+            raise HTTPException(status_code=400, detail="La cantidad de peso a vender debe ser mayor a 0")
+        unidades_a_descontar = peso_a_descontar / precio.kg_por_unidad
+        precio_aplicado = precio.precio_por_kg
+        subtotal = precio_aplicado * peso_a_descontar
+
+    return {
+        "producto_id": producto_id,
+        "producto_nombre": precio.nombre,
+        "precio_aplicado": precio_aplicado,
+        "cantidad": item.cantidad,
+        "tipo_venta": item.tipo_venta,
+        "cantidad_peso_kg": item.cantidad_peso_kg,
+        "unidades_a_descontar": unidades_a_descontar,
+        "peso_a_descontar": peso_a_descontar,
+        "subtotal": subtotal
+    }
+
+def cotizar(db: Session, items: List[schemas.ItemVentaCreate]) -> schemas.CotizacionResponse:
+    """Precio de un carrito sin registrar la venta ni validar el stock"""
+    if not items:
+        raise HTTPException(status_code=400, detail="La venta debe tener al menos un item")
+    precios = tabla_precios.precios(db)
+    cotizados = []
+    for item in items:
+        precio = precios.get(item.producto_id)
+        if precio is None:
+            raise HTTPException(status_code=404, detail=f"Producto con id {item.producto_id} no encontrado")
+        cotizados.append(schemas.CotizacionItem(**cotizar_item(item.producto_id, precio, item)))
+    return schemas.CotizacionResponse(items=cotizados, total=sum(item.subtotal for item in cotizados))
@@ -0,0 +1,282 @@
+"""
+Caché de recetas compiladas
+
+Las recetas referencian ingredientes del stock por nombre (IngredienteReceta.ingrediente no
+tiene clave foránea a Stock). Compilar una receta resuelve esos nombres una sola vez y la deja
+como un vector de (stock_id, cantidad por receta), listo para descontar con un único UPDATE
+ejecutado en lote.
+
+La caché es por proceso, pero se valida contra la base: cada consulta lee la versión de las
+recetas (sync.version_recetas, que incrementan triggers de SQLite con cualquier cambio de
+recetas, nombres de stock o rendimiento de productos, venga del worker que venga) y, si cambió
+desde que se compilaron las recetas guardadas, las descarta. Así un worker nunca descuenta
+ingredientes con una receta que otro worker modificó. Las invalidaciones de abajo solo
+adelantan el descarte dentro del mismo proceso. Sin los triggers (otra base que no sea SQLite)
+la versión no cambia y la caché solo ve las escrituras de su proceso.
+
+Un ingrediente también puede ser otro producto (una subreceta, como la masa madre o la crema
+pastelera: IngredienteReceta.subproducto_id). La compilación expande esas referencias en orden
+topológico hasta llegar al stock, así la receta compilada de un producto ya tiene sumados los
+ingredientes de todas sus subrecetas y preparar nunca recorre el árbol. Las recetas
+intermedias quedan en la caché y se reutilizan al compilar los demás productos que las usan.
+
+La caché guarda qué productos usan cada subreceta: al cambiar la receta (o el rendimiento) de
+un producto en este proceso se descartan solo él y los productos que lo usan, directa o
+indirectamente. Al crear, renombrar o eliminar un item de stock se descarta todo. Un cambio
+hecho desde otro worker (por ejemplo, en la receta de la masa madre) se detecta por la versión
+de recetas y descarta todas las recetas compiladas, incluidas las que la usan.
+"""
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session, aliased
+
+from src.backend import models
+from src.backend import sync
+
+# Unidades en que se puede indicar la cantidad de una subreceta: por piezas (según
+# unidades_por_receta del subproducto) o por peso (según peso_por_receta)
+UNIDADES_POR_PIEZA = ("unidad", "unidades", "u")
+UNIDADES_POR_PESO = ("kg",)
+
+class IngredienteCompilado(NamedTuple):
+    stock_id: Optional[int]  # None si el ingrediente no existe en el stock
+    nombre: str
+    cantidad: float  # Cantidad por receta (sumada si el ingrediente aparece más de una vez)
+    unidad: str
+
+class CacheRecetas:
+    """Recetas compiladas por producto, seguras para usar desde varios hilos"""
+
+    def __init__(self):
+        self._recetas: Dict[int, List[IngredienteCompilado]] = {}
+        # {subproducto_id: productos compilados cuya receta lo usa directamente}
+        self._usos: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        # Se incrementa en cada invalidación para descartar compilaciones que quedaron viejas
+        self._generacion = 0
+        # Versión de las recetas en la base con la que se compilaron las guardadas
+        self._version: Optional[int] = None
+        # Invalidaciones hechas por este proceso (para las bases sin la versión de recetas)
+        self.invalidaciones = 0
+
+    def obtener(self, db: Session, producto_id: int) -> List[IngredienteCompilado]:
+        """Obtener la receta compilada de un producto, compilándola si no está en caché"""
+        return self.obtener_varios(db, [producto_id])[producto_id]
+
+    def obtener_varios(self, db: Session, producto_ids: Iterable[int]) -> Dict[int, List[IngredienteCompilado]]:
+        """Obtener las recetas compiladas de varios productos, compilando las faltantes por niveles de subrecetas"""
+        # La versión se lee antes que las recetas (como en planificacion.CacheMatriz): si otro
+        # worker cambia una receta en el medio, la próxima consulta ve otra versión y recompila
+        version = sync.version_recetas(db)
+        with self._lock:
+            if version != self._version:
+                # Otro worker pudo haber cambiado cualquier subreceta: se descarta también el
+                # grafo de usos, que solo conoce las compilaciones de este proceso
+                self._recetas.clear()
+                self._usos.clear()
+                self._generacion += 1
+                self._version = version
+            recetas = {producto_id: self._recetas.get(producto_id) for producto_id in producto_ids}
+            generacion = self._generacion
+            conocidas = dict(self._recetas) if None in recetas.values() else None
+        faltantes = [producto_id for producto_id, receta in recetas.items() if receta is None]
+        if not faltantes:
+            return recetas
+
+        compiladas, usos = compilar_recetas(db, faltantes, conocidas)
+        with self._lock:
+            if self._generacion == generacion:
+                self._recetas.update(compiladas)
+                for subproducto_id, productos in usos.items():
+                    self._usos.setdefault(subproducto_id, set()).update(productos)
+        recetas.update((producto_id, compiladas[producto_id]) for producto_id in faltantes)
+        return recetas
+
+    def invalidar_producto(self, producto_id: int):
+        """Descartar la receta compilada de un producto y la de los productos que lo usan como subreceta"""
+        with self._lock:
+            pendientes = [producto_id]
+            while pendientes:
+                actual = pendientes.pop()
+                self._recetas.pop(actual, None)
+                pendientes.extend(self._usos.pop(actual, ()))
+            self._generacion += 1
+            self.invalidaciones += 1
+
+    def invalidar_todo(self):
+        """Descartar todas las recetas compiladas (por ejemplo, al renombrar un item de stock)"""
+        with self._lock:
+            self._recetas.clear()
+            self._usos.clear()
+            self._generacion += 1
+            self.invalidaciones += 1
+
+def factor_subreceta(cantidad: float, unidad: str, unidades_por_receta: float, peso_por_receta: float) -> Optional[float]:
+    """Fracción de la receta del subproducto que representa la cantidad indicada (None si la unidad no aplica)"""
+    if unidad in UNIDADES_POR_PIEZA and unidades_por_receta > 0:
+        return cantidad / unidades_por_receta
+    if unidad in UNIDADES_POR_PESO and peso_por_receta > 0:
+        return cantidad / peso_por_receta
+    return None
+
+def _leer_recetas(db: Session, producto_ids: Iterable[int]):
+    """Filas de las recetas de varios productos, con el stock y el rendimiento de cada subproducto resueltos"""
+    subproducto = aliased(models.Producto)
+    return db.execute(
+        select(
+            models.IngredienteReceta.producto_id,
+            models.Stock.id.label("stock_id"),
+            models.IngredienteReceta.ingrediente,
+            models.IngredienteReceta.cantidad,
+            models.IngredienteReceta.unidad,
+            models.IngredienteReceta.subproducto_id,
+            subproducto.unidades_por_receta,
+            subproducto.peso_por_receta
+        )
+        .select_from(models.IngredienteReceta)
+        .outerjoin(models.Stock, (models.Stock.nombre == models.IngredienteReceta.ingrediente) & models.IngredienteReceta.subproducto_id.is_(None))
+        .outerjoin(subproducto, subproducto.id == models.IngredienteReceta.subproducto_id)
+        .where(models.IngredienteReceta.producto_id.in_(list(producto_ids)))
+        .order_by(models.IngredienteReceta.id)
+    ).all()
+
+def compilar_receta(db: Session, producto_id: int) -> List[IngredienteCompilado]:
+    """Resolver los ingredientes de una receta (y de sus subrecetas) contra el stock"""
+    compiladas, _ = compilar_recetas(db, [producto_id])
+    return compiladas[producto_id]
+
+def compilar_recetas(
+    db: Session, producto_ids: List[int], conocidas: Optional[Dict[int, List[IngredienteCompilado]]] = None
+) -> Tuple[Dict[int, List[IngredienteCompilado]], Dict[int, Set[int]]]:
+    """Compilar las recetas de varios productos expandiendo sus subrecetas
+
+    Lee las recetas con una consulta por nivel de subrecetas (las que ya están en `conocidas`
+    no se vuelven a leer) y las combina en orden topológico. Devuelve las recetas compiladas
+    (las pedidas y las intermedias) y, por cada subreceta, los productos que la usan.
+    """
+    conocidas = conocidas or {}
+    directas: Dict[int, list] = {}
+    pendientes = set(producto_ids)
+    while pendientes:
+        for producto_id in pendientes:
+            directas[producto_id] = []
+        filas = _leer_recetas(db, pendientes)
+        for fila in filas:
+            directas[fila.producto_id].append(fila)
+        pendientes = {
+            fila.subproducto_id for fila in filas
+            if fila.subproducto_id is not None and fila.subproducto_id not in directas and fila.subproducto_id not in conocidas
+        }
+
+    compiladas: Dict[int, List[IngredienteCompilado]] = {}
+    usos: Dict[int, Set[int]] = {}
+    en_curso: Set[int] = set()
+
+    def compilar(producto_id: int) -> List[IngredienteCompilado]:
+        if producto_id in compiladas:
+            return compiladas[producto_id]
+        if producto_id in conocidas:
+            return conocidas[producto_id]
+        if producto_id in en_curso:
+            raise HTTPException(status_code=400, detail=f"La receta del producto {producto_id} se incluye a sí misma")
+        en_curso.add(producto_id)
+        compilada: Dict[str, IngredienteCompilado] = {}
+
+        def sumar(ingrediente: IngredienteCompilado):
+            previo = compilada.get(ingrediente.nombre)
+            compilada[ingrediente.nombre] = previo._replace(cantidad=previo.cantidad + ingrediente.cantidad) if previo else ingrediente
+
+        for fila in directas.get(producto_id, []):
+            if fila.subproducto_id is None:
+                sumar(IngredienteCompilado(fila.stock_id, fila.ingrediente, fila.cantidad, fila.unidad))
+                continue
+            usos.setdefault(fila.subproducto_id, set()).add(producto_id)
+            factor = factor_subreceta(fila.cantidad, fila.unidad, fila.unidades_por_receta or 0, fila.peso_por_receta or 0)
+            subreceta = compilar(fila.subproducto_id) if factor is not None else []
+            if not subreceta:
+                # Subproducto eliminado, sin receta o con una unidad que no se puede convertir
+                sumar(IngredienteCompilado(None, fila.ingrediente, fila.cantidad, fila.unidad))
+                continue
+            for ingrediente in subreceta:
+                sumar(ingrediente._replace(cantidad=ingrediente.cantidad * factor))
+
+        en_curso.discard(producto_id)
+        compiladas[producto_id] = list(compilada.values())
+        return compiladas[producto_id]
+
+    for producto_id in directas:
+        compilar(producto_id)
+    return compiladas, usos
+
+def subrecetas(db: Session) -> Dict[int, Set[int]]:
+    """Grafo de subrecetas: {producto_id: subproductos que usa directamente}"""
+    grafo: Dict[int, Set[int]] = {}
+    for producto_id, subproducto_id in db.execute(
+        select(models.IngredienteReceta.producto_id, models.IngredienteReceta.subproducto_id)
+        .where(models.IngredienteReceta.subproducto_id.is_not(None))
+    ):
+        grafo.setdefault(producto_id, set()).add(subproducto_id)
+    return grafo
+
+def tiene_ciclo(grafo: Dict[int, Set[int]]) -> bool:
+    """Indica si alguna receta del grafo de subrecetas se incluye a sí misma"""
+    terminados: Set[int] = set()
+    for inicio in grafo:
+        if inicio in terminados:
+            continue
+        camino, pila = {inicio}, [(inicio, iter(grafo.get(inicio, ())))]
+        while pila:
+            actual, siguientes = pila[-1]
+            siguiente = next(siguientes, None)
+            if siguiente is None:
+                pila.pop()
+                camino.discard(actual)
+                terminados.add(actual)
+            elif siguiente in camino:
+                return True
+            elif siguiente not in terminados:
+                camino.add(siguiente)
+                pila.append((siguiente, iter(grafo.get(siguiente, ()))))
+    return False
+
+def crea_ciclo(db: Session, producto_id: int, subproducto_id: int) -> bool:
+    """Indica si usar subproducto_id en la receta de producto_id haría que una receta se incluya a sí misma"""
+    grafo = subrecetas(db)
+    pendientes, visitados = [subproducto_id], set()
+    while pendientes:
+        actual = pendientes.pop()
+        if actual == producto_id:
+            return True
+        if actual not in visitados:
+            visitados.add(actual)
+            pendientes.extend(grafo.get(actual, ()))
+    return False
+
+# UPDATE condicional en lote: descuenta cada ingrediente solo si alcanza
+_descontar_ingredientes = (
+    update(models.Stock.__table__)
+    .where(
+        models.Stock.__table__.c.id == bindparam("b_stock_id"),
+        models.Stock.__table__.c.cantidad >= bindparam("b_cantidad")
+    )
+    .values(cantidad=models.Stock.__table__.c.cantidad - bindparam("b_cantidad"))
+)
+
+def descontar_ingredientes(db: Session, descuentos: Dict[int, float]) -> bool:
+    """Descontar varios ingredientes con un único executemany
+
+    Devuelve False si alguno no alcanzaba; en ese caso el llamador debe hacer rollback,
+    porque los ingredientes que sí alcanzaban ya fueron descontados.
+    """
+    if not descuentos:
+        return True
+    resultado = db.execute(
+        _descontar_ingredientes,
+        [{"b_stock_id": stock_id, "b_cantidad": cantidad} for stock_id, cantidad in descuentos.items()]
+    )
+    return resultado.rowcount == len(descuentos)
+
+cache_recetas = CacheRecetas()
@@ -0,0 +1,174 @@
+"""
+Resúmenes de ventas por hora y por día
+
+Cada venta acumula sus items en las tablas resumen_ventas_hora y resumen_ventas_dia dentro
+de la misma transacción, así los reportes leen solo los resúmenes y nunca las filas de
+items_venta. La reconstrucción recalcula los resúmenes desde el historial (para cargar
+datos existentes o verificar que los acumulados sean correctos).
+
+Uso (desde la raíz del proyecto):
+    python -m src.backend.reportes --reconstruir
+    python -m src.backend.reportes --verificar
+"""
+import argparse
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.backend import archivo
+from src.backend import models
+from src.backend import schemas
+
+TOLERANCIA = 1e-6
+
+# (modelo, largo del prefijo de la fecha ISO que forma el periodo)
+RESUMENES = (
+    (models.ResumenVentaHora, 13),  # YYYY-MM-DDTHH
+    (models.ResumenVentaDia, 10),  # YYYY-MM-DD
+)
+
+MEDIDAS = ("unidades", "peso_kg", "ingresos", "items")
+
+def acumular_items(db: Session, fecha: datetime, items_data: Iterable[dict]):
+    """Sumar los items de una venta a los resúmenes (sin commit, usa la transacción del llamador)
+
+    `items_data` son los diccionarios que arma el cálculo de la venta (producto_id, tipo_venta,
+    cantidad, peso_a_descontar, subtotal).
+    """
+    acumular_ventas(db, [(fecha, items_data)])
+
+def acumular_ventas(db: Session, ventas: Iterable[Tuple[datetime, Iterable[dict]]]):
+    """Sumar varias ventas a los resúmenes con un único executemany por tabla"""
+    acumulado: Dict[Tuple[str, int], List[float]] = {}
+    claves = []
+    for fecha, items_data in ventas:
+        fecha_iso = fecha.isoformat()
+        for item_data in items_data:
+            clave = (fecha_iso, item_data["producto_id"])
+            medidas = acumulado.get(clave)
+            if medidas is None:
+                medidas = acumulado[clave] = [0.0, 0.0, 0.0, 0]
+                claves.append(clave)
+            if item_data["tipo_venta"] == schemas.TipoVenta.UNIDAD:
+                medidas[0] += item_data["cantidad"]
+            else:
+                medidas[1] += item_data["peso_a_descontar"]
+            medidas[2] += item_data["subtotal"]
+            medidas[3] += 1
+
+    for modelo, largo in RESUMENES:
+        por_periodo: Dict[Tuple[str, int], List[float]] = {}
+        for fecha_iso, producto_id in claves:
+            medidas = acumulado[(fecha_iso, producto_id)]
+            total = por_periodo.setdefault((fecha_iso[:largo], producto_id), [0.0, 0.0, 0.0, 0])
+            for i, valor in enumerate(medidas):
+                total[i] += valor
+        filas = [
+            {"periodo": periodo, "producto_id": producto_id, **dict(zip(MEDIDAS, medidas))}
+            for (periodo, producto_id), medidas in por_periodo.items()
+        ]
+        _upsert(db, modelo, filas)
+
+def _upsert(db: Session, modelo, filas: List[dict]):
+    """Insertar o sumar las medidas de cada (periodo, producto)"""
+    if not filas:
+        return
+    sentencia = sqlite_insert(modelo.__table__)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=["periodo", "producto_id"],
+        set_={medida: modelo.__table__.c[medida] + sentencia.excluded[medida] for medida in MEDIDAS}
+    )
+    db.execute(sentencia, filas)
+
+def _consulta_historial(largo: int):
+    """SELECT que agrega items_venta por (periodo, producto) igual que acumular_items"""
+    es_unidad = models.ItemVenta.tipo_venta == models.TipoVentaEnum.UNIDAD
+    peso = func.coalesce(models.ItemVenta.cantidad_peso_kg, models.ItemVenta.cantidad)
+    return (
+        select(
+            func.substr(models.Venta.fecha, 1, largo).label("periodo"),
+            models.ItemVenta.producto_id,
+            func.sum(case((es_unidad, models.ItemVenta.cantidad), else_=0.0)).label("unidades"),
+            func.sum(case((es_unidad, 0.0), else_=peso)).label("peso_kg"),
+            func.sum(models.ItemVenta.producto_precio * case((es_unidad, models.ItemVenta.cantidad), else_=peso)).label("ingresos"),
+            func.count(models.ItemVenta.id).label("items")
+        )
+        .join(models.Venta, models.Venta.id == models.ItemVenta.venta_id)
+        .group_by("periodo", models.ItemVenta.producto_id)
+    )
+
+def reconstruir_resumenes(db: Session) -> Dict[str, int]:
+    """Recalcular todos los resúmenes desde ventas e items_venta, incluidos los meses archivados (reemplaza los actuales)"""
+    # Los meses archivados se leen antes de escribir: un archivo leído dentro de una
+    # transacción con escrituras queda bloqueado y no se puede soltar (DETACH) hasta el commit
+    archivados = {modelo: [] for modelo, _ in RESUMENES}
+    for registro in archivo.archivos(db):
+        with archivo.adjuntar(db, registro) as opciones:
+            for modelo, largo in RESUMENES:
+                archivados[modelo] += [dict(fila._mapping) for fila in db.execute(_consulta_historial(largo), execution_options=opciones)]
+
+    filas = {}
+    for modelo, largo in RESUMENES:
+        db.execute(delete(modelo))
+        db.execute(
+            insert(modelo).from_select(["periodo", "producto_id", *MEDIDAS], _consulta_historial(largo))
+        )
+        _upsert(db, modelo, archivados[modelo])
+        filas[modelo.__tablename__] = db.query(modelo).count()
+    db.commit()
+    return filas
+
+def verificar_resumenes(db: Session) -> List[str]:
+    """Comparar los resúmenes acumulados contra el historial. Devuelve las diferencias encontradas"""
+    diferencias = []
+    for modelo, largo in RESUMENES:
+        esperado = {}
+        for opciones in archivo.opciones_historial(db):
+            for fila in db.execute(_consulta_historial(largo), execution_options=opciones):
+                acumulado = esperado.setdefault((fila.periodo, fila.producto_id), dict.fromkeys(MEDIDAS, 0))
+                for medida in MEDIDAS:
+                    acumulado[medida] += fila._mapping[medida]
+        actual = {
+            (fila.periodo, fila.producto_id): {medida: getattr(fila, medida) for medida in MEDIDAS}
+            for fila in db.query(modelo).all()
+        }
+        for clave in sorted(set(esperado) | set(actual)):
+            fila_esperada, fila_actual = esperado.get(clave), actual.get(clave)
+            for medida in MEDIDAS:
+                valor_esperado = fila_esperada[medida] if fila_esperada else 0
+                valor_actual = fila_actual[medida] if fila_actual else 0
+                if abs(valor_esperado - valor_actual) > TOLERANCIA:
+                    diferencias.append(
+                        f"{modelo.__tablename__} {clave[0]} producto {clave[1]}: {medida} esperado {valor_esperado}, actual {valor_actual}"
+                    )
+    return diferencias
+
+if __name__ == "__main__":
+    from src.backend.database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Reconstruir o verificar los resúmenes de ventas")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--reconstruir", action="store_true", help="Recalcular los resúmenes desde el historial")
+    grupo.add_argument("--verificar", action="store_true", help="Comparar los resúmenes contra el historial")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.reconstruir:
+            for tabla, cantidad in reconstruir_resumenes(db).items():
+                print(f"✓ {tabla}: {cantidad} filas")
+        else:
+            diferencias = verificar_resumenes(db)
+            if diferencias:
+                print(f"✗ {len(diferencias)} diferencias encontradas:")
+                for diferencia in diferencias:
+                    print(f"  - {diferencia}")
+                sys.exit(1)
+            print("✓ Los resúmenes coinciden con el historial")
+    finally:
+        db.close()
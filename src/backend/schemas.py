@@ -1,11 +1,17 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
+from datetime import datetime
 from enum import Enum
 
 class TipoVenta(str, Enum):
     UNIDAD = "unidad"
     PESO = "peso"
 
+class TipoMovimiento(str, Enum):
+    VENTA = "venta"
+    PRODUCCION = "produccion"
+    AJUSTE = "ajuste"
+
 # Schemas para Stock
 class StockBase(BaseModel):
     nombre: str
@@ -31,6 +37,7 @@ class IngredienteRecetaBase(BaseModel):
     ingrediente: str
     cantidad: float
     unidad: str
+    subproducto_id: Optional[int] = None  # Si se indica, el ingrediente es la receta de otro producto
 
 class IngredienteRecetaCreate(IngredienteRecetaBase):
     pass
@@ -73,6 +80,14 @@ class ProductoResponse(ProductoBase):
 class PrepararRecetaRequest(BaseModel):
     cantidad: float = Field(..., gt=0)
 
+# Schemas para plan de producción (varios productos en una sola transacción)
+class ProduccionItem(BaseModel):
+    producto_id: int
+    cantidad: float = Field(..., gt=0)  # Veces que se prepara la receta
+
+class ProduccionRequest(BaseModel):
+    items: List[ProduccionItem]
+
 # Schemas para Items de Venta
 class ItemVentaBase(BaseModel):
     producto_id: int
@@ -83,6 +98,18 @@ class ItemVentaBase(BaseModel):
 class ItemVentaCreate(ItemVentaBase):
     pass
 
+# Schemas para cotizar un carrito (ver precios.py)
+class CotizacionItem(ItemVentaBase):
+    producto_nombre: str
+    precio_aplicado: float  # Precio por unidad o por kg según tipo_venta
+    unidades_a_descontar: float
+    peso_a_descontar: float
+    subtotal: float
+
+class CotizacionResponse(BaseModel):
+    items: List[CotizacionItem]
+    total: float
+
 class ItemVentaResponse(BaseModel):
     id: int
     venta_id: int
@@ -111,3 +138,164 @@ class VentaResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+# Schemas para ventas en lote
+class VentaBatchCreate(BaseModel):
+    ventas: List[VentaCreate]
+
+class VentaBatchResultado(BaseModel):
+    indice: int  # Posición de la venta dentro del lote
+    ok: bool
+    venta_id: Optional[int] = None
+    total: Optional[float] = None
+    error: Optional[str] = None
+
+class VentaBatchResponse(BaseModel):
+    aceptadas: int
+    rechazadas: int
+    resultados: List[VentaBatchResultado]
+
+# Schemas para reportes de ventas
+class Granularidad(str, Enum):
+    HORA = "hora"
+    DIA = "dia"
+
+class ResumenVentaFila(BaseModel):
+    periodo: str
+    producto_id: int
+    producto_nombre: Optional[str] = None
+    unidades: float  # Vendidas por unidad
+    peso_kg: float  # Vendido por peso
+    ingresos: float
+    items: int
+
+class ReporteVentasResponse(BaseModel):
+    granularidad: Granularidad
+    filas: List[ResumenVentaFila]
+    datos_al: Optional[datetime] = None  # Momento de la copia de reportes leída (None si se leyó la base principal)
+    antiguedad_s: Optional[float] = None
+
+class ReporteProductoFila(BaseModel):
+    producto_id: int
+    producto_nombre: Optional[str] = None
+    unidades: float
+    peso_kg: float
+    ingresos: float
+    items: int
+
+class ReporteProductosResponse(BaseModel):
+    filas: List[ReporteProductoFila]
+    datos_al: Optional[datetime] = None  # Ver ReporteVentasResponse
+    antiguedad_s: Optional[float] = None
+
+class CopiaReportesResponse(BaseModel):
+    datos_al: datetime
+    duracion_ms: float
+
+# Schemas para sincronización incremental del catálogo
+class StockSync(StockResponse):
+    version: int
+
+class ProductoSync(ProductoBase):
+    id: int
+    version: int
+    
+    class Config:
+        from_attributes = True
+
+class IngredienteRecetaSync(IngredienteRecetaResponse):
+    version: int
+
+class SyncEliminados(BaseModel):
+    stock: List[int] = []
+    productos: List[int] = []
+    ingredientes_receta: List[int] = []
+
+class SyncResponse(BaseModel):
+    version: int  # Enviar como `since` en la próxima sincronización
+    stock: List[StockSync]
+    productos: List[ProductoSync]  # Sin la receta: sus ingredientes vienen en ingredientes_receta
+    ingredientes_receta: List[IngredienteRecetaSync]
+    eliminados: SyncEliminados
+
+# Schemas para importación y exportación masiva
+class FormatoArchivo(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+class ProductoImportacion(ProductoCreate):
+    id: Optional[int] = None  # Si no se indica, el producto se busca por nombre
+    receta: Optional[List[IngredienteRecetaCreate]] = None  # Si se indica, reemplaza la receta
+
+class ErrorImportacion(BaseModel):
+    linea: int
+    error: str
+
+class ImportacionResponse(BaseModel):
+    procesadas: int
+    creadas: int
+    actualizadas: int
+    rechazadas: int
+    errores: List[ErrorImportacion]  # Hasta 1000, el resto solo se cuenta en rechazadas
+
+# Schemas para planificación de producción (sin modificar el stock)
+class MaximoProducible(BaseModel):
+    producto_id: int
+    nombre: str
+    max_recetas: Optional[float] = None  # None si el producto no tiene receta
+    max_recetas_completas: Optional[int] = None
+    limitante: Optional[str] = None  # Ingrediente que se agota primero
+    ingredientes_faltantes: List[str] = []  # Ingredientes de la receta que no existen en el stock
+
+class SimulacionIngrediente(BaseModel):
+    stock_id: int
+    nombre: str
+    unidad: str
+    disponible: float
+    necesario: float
+    restante: float  # Negativo si no alcanza
+
+class SimulacionResponse(BaseModel):
+    factible: bool
+    faltantes: List[str]  # Ingredientes que no alcanzan
+    ingredientes: List[SimulacionIngrediente]  # Solo los que usa el plan
+    max_recetas_despues: Dict[int, Optional[float]]  # Recetas extra posibles por producto del plan
+
+# Schemas para el libro de movimientos de stock
+class MovimientoResponse(BaseModel):
+    id: int
+    creado_en: datetime
+    tipo: TipoMovimiento
+    referencia: Optional[int] = None  # ID de la venta
+    stock_id: Optional[int] = None
+    producto_id: Optional[int] = None
+    cantidad: float  # Cambio de cantidad del item de stock
+    unidades: float  # Cambio de unidades del producto
+    peso_kg: float  # Cambio de peso del producto
+    
+    class Config:
+        from_attributes = True
+
+class SnapshotResponse(BaseModel):
+    id: int
+    creado_en: datetime
+    ultimo_movimiento_id: int
+    
+    class Config:
+        from_attributes = True
+
+class StockHistorico(BaseModel):
+    id: int
+    cantidad: float
+
+class ProductoHistorico(BaseModel):
+    id: int
+    unidades: float
+    peso_kg: float
+
+class StockHistoricoResponse(BaseModel):
+    fecha: datetime
+    snapshot_id: Optional[int] = None  # Snapshot del que se partió (None si se partió de cero)
+    movimientos_aplicados: int
+    stock: List[StockHistorico]
+    productos: List[ProductoHistorico]
@@ -0,0 +1,101 @@
+"""
+Serialización rápida de los listados grandes (GET /api/productos y GET /api/ventas)
+
+Con PANADERIA_SERIALIZACION_RAPIDA=1 los listados no construyen objetos del ORM ni validan
+cada fila con ProductoResponse/VentaResponse: leen las columnas como tuplas (las recetas o
+los items con una segunda consulta por página), arman los dicts con las mismas claves y en
+el mismo orden que los schemas, y los codifican con orjson si está instalado
+(pip install orjson) o con json de la biblioteca estándar.
+
+La respuesta tiene los mismos bytes que la de los schemas (los números en notación
+exponencial, que no aparecen en cantidades o precios reales, pueden escribirse distinto).
+Para comparar ambos caminos:
+    python -m src.backend.benchmarks.serializacion
+"""
+import json
+import os
+from typing import List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.backend import models
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional
+    orjson = None
+
+SERIALIZACION_RAPIDA = os.getenv("PANADERIA_SERIALIZACION_RAPIDA", "0").lower() in ("1", "true", "si", "sí")
+
+def dumps(contenido) -> bytes:
+    """JSON compacto en UTF-8, igual al que generan los schemas y JSONResponse"""
+    if orjson is not None:
+        return orjson.dumps(contenido)
+    return json.dumps(contenido, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+# ==================== PRODUCTOS ====================
+
+def productos(db: Session) -> List[dict]:
+    """Todos los productos con su receta, con la estructura de List[ProductoResponse]"""
+    p, ir = models.Producto, models.IngredienteReceta
+    recetas = {}
+    for ingrediente, cantidad, unidad, subproducto_id, ingrediente_id, producto_id in db.execute(
+        select(ir.ingrediente, ir.cantidad, ir.unidad, ir.subproducto_id, ir.id, ir.producto_id).order_by(ir.id)
+    ):
+        recetas.setdefault(producto_id, []).append({
+            "ingrediente": ingrediente,
+            "cantidad": float(cantidad),
+            "unidad": unidad,
+            "subproducto_id": subproducto_id,
+            "id": ingrediente_id,
+            "producto_id": producto_id
+        })
+    return [
+        {
+            "nombre": nombre,
+            "precio": float(precio),
+            "unidades": float(unidades),
+            "peso_kg": float(peso_kg),
+            "unidades_por_receta": float(unidades_por_receta),
+            "peso_por_receta": float(peso_por_receta),
+            "id": producto_id,
+            "receta": recetas.get(producto_id, [])
+        }
+        for nombre, precio, unidades, peso_kg, unidades_por_receta, peso_por_receta, producto_id in db.execute(
+            select(p.nombre, p.precio, p.unidades, p.peso_kg, p.unidades_por_receta, p.peso_por_receta, p.id).order_by(p.id)
+        )
+    ]
+
+def productos_json(db: Session) -> bytes:
+    return dumps(productos(db))
+
+# ==================== VENTAS ====================
+
+def ventas(db: Session, condiciones: list, limite: int) -> List[dict]:
+    """Una página de ventas (de la más reciente a la más antigua) con la estructura de List[VentaResponse]"""
+    v, i = models.Venta, models.ItemVenta
+    pagina = [
+        {"id": venta_id, "fecha": fecha, "total": float(total), "items": []}
+        for venta_id, fecha, total in db.execute(
+            select(v.id, v.fecha, v.total).where(*condiciones).order_by(v.id.desc()).limit(limite)
+        )
+    ]
+    por_id = {venta["id"]: venta for venta in pagina}
+    if por_id:
+        for item_id, venta_id, producto_id, nombre, precio, cantidad, tipo_venta, peso in db.execute(
+            select(i.id, i.venta_id, i.producto_id, i.producto_nombre, i.producto_precio, i.cantidad, i.tipo_venta, i.cantidad_peso_kg)
+            .where(i.venta_id.in_(por_id))
+            .order_by(i.id)
+        ):
+            por_id[venta_id]["items"].append({
+                "id": item_id,
+                "venta_id": venta_id,
+                "producto_id": producto_id,
+                "producto_nombre": nombre,
+                "producto_precio": float(precio),
+                "cantidad": float(cantidad),
+                "tipo_venta": tipo_venta.value,
+                "cantidad_peso_kg": float(peso) if peso is not None else None
+            })
+    return pagina
@@ -0,0 +1,152 @@
+"""
+Sincronización incremental del catálogo (stock, productos y recetas)
+
+Cada fila de stock, productos e ingredientes_receta tiene una columna `version` que toma el
+siguiente valor de una secuencia global (tabla sync_secuencia) cada vez que la fila se inserta
+o se modifica, y cada borrado deja una lápida en sync_eliminados con su propia versión. Así
+GET /api/sync?since=N devuelve solo lo que cambió después de la versión N, y el costo de una
+sincronización depende de la cantidad de cambios y no del tamaño del catálogo.
+
+Las versiones las asignan triggers de SQLite, por lo que cubren todas las escrituras: las del
+ORM, los UPDATE condicionales en lote de ventas y preparaciones, y cualquier SQL directo. Los
+triggers se crean junto con las tablas; las bases existentes se migran con:
+    python -m src.backend.migrate_sync_versiones
+
+La misma tabla guarda en una segunda fila la versión de las recetas compiladas (ver
+recetas.py), que solo cambia con lo que altera una receta compilada: ingredientes de recetas,
+altas, bajas y renombres de stock, y altas, bajas y cambios de rendimiento de productos. La
+versión de sincronización no sirve para eso porque cambia con cada venta y cada preparación.
+"""
+import logging
+from typing import List, Optional, Set
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from src.backend import models
+
+logger = logging.getLogger("panaderia.sync")
+
+TABLAS = {
+    "stock": models.Stock,
+    "productos": models.Producto,
+    "ingredientes_receta": models.IngredienteReceta,
+}
+
+_SIGUIENTE_VERSION = "UPDATE sync_secuencia SET valor = valor + 1 WHERE id = 1;"
+_VERSION_ACTUAL = "(SELECT valor FROM sync_secuencia WHERE id = 1)"
+
+def sentencias_triggers(tabla: str) -> List[str]:
+    """CREATE TRIGGER que versionan las inserciones, modificaciones y borrados de una tabla"""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {tabla}_sync_insert AFTER INSERT ON {tabla}
+BEGIN
+    {_SIGUIENTE_VERSION}
+    UPDATE {tabla} SET version = {_VERSION_ACTUAL} WHERE id = NEW.id;
+END""",
+        # El WHEN evita que el UPDATE del propio trigger lo vuelva a disparar
+        f"""CREATE TRIGGER IF NOT EXISTS {tabla}_sync_update AFTER UPDATE ON {tabla}
+WHEN NEW.version IS OLD.version
+BEGIN
+    {_SIGUIENTE_VERSION}
+    UPDATE {tabla} SET version = {_VERSION_ACTUAL} WHERE id = NEW.id;
+END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {tabla}_sync_delete AFTER DELETE ON {tabla}
+BEGIN
+    {_SIGUIENTE_VERSION}
+    INSERT INTO sync_eliminados (version, tabla, fila_id) VALUES ({_VERSION_ACTUAL}, '{tabla}', OLD.id);
+END""",
+    ]
+
+SENTENCIA_SECUENCIA = "INSERT OR IGNORE INTO sync_secuencia (id, valor) VALUES (1, 0)"
+
+# Fila de sync_secuencia con la versión de las recetas compiladas
+ID_VERSION_RECETAS = 2
+SENTENCIA_SECUENCIA_RECETAS = f"INSERT OR IGNORE INTO sync_secuencia (id, valor) VALUES ({ID_VERSION_RECETAS}, 0)"
+_SIGUIENTE_VERSION_RECETAS = f"UPDATE sync_secuencia SET valor = valor + 1 WHERE id = {ID_VERSION_RECETAS};"
+
+# (tabla, evento) que cambian alguna receta compilada
+_EVENTOS_RECETAS = [
+    ("ingredientes_receta", "INSERT"),
+    ("ingredientes_receta", "UPDATE"),
+    ("ingredientes_receta", "DELETE"),
+    ("stock", "INSERT"),
+    ("stock", "UPDATE OF nombre"),
+    ("stock", "DELETE"),
+    ("productos", "INSERT"),
+    ("productos", "UPDATE OF unidades_por_receta, peso_por_receta"),
+    ("productos", "DELETE"),
+]
+
+def sentencias_triggers_recetas(tablas: Optional[Set[str]] = None) -> List[str]:
+    """CREATE TRIGGER que incrementan la versión de las recetas compiladas (solo de las tablas indicadas)"""
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {tabla}_recetas_{evento.split()[0].lower()} AFTER {evento} ON {tabla}
+BEGIN
+    {_SIGUIENTE_VERSION_RECETAS}
+END"""
+        for tabla, evento in _EVENTOS_RECETAS
+        if tablas is None or tabla in tablas
+    ]
+
+def instalar_triggers(conexion) -> bool:
+    """Crear las filas de la secuencia, los triggers de la versión de recetas y los de las tablas que ya tienen la columna version
+
+    Una base anterior sin la columna no recibe los triggers (fallarían en cada escritura) hasta
+    que se ejecute la migración. Devuelve si quedaron instalados en todas las tablas.
+    """
+    if conexion.dialect.name != "sqlite":
+        return False
+    conexion.exec_driver_sql(SENTENCIA_SECUENCIA)
+    conexion.exec_driver_sql(SENTENCIA_SECUENCIA_RECETAS)
+    existentes = {fila[0] for fila in conexion.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for sentencia in sentencias_triggers_recetas(existentes):
+        conexion.exec_driver_sql(sentencia)
+    completo = True
+    for tabla in TABLAS:
+        columnas = [fila[1] for fila in conexion.exec_driver_sql(f"PRAGMA table_info({tabla})")]
+        if "version" not in columnas:
+            logger.warning("La tabla %s no tiene la columna version: ejecutar python -m src.backend.migrate_sync_versiones", tabla)
+            completo = False
+            continue
+        for sentencia in sentencias_triggers(tabla):
+            conexion.exec_driver_sql(sentencia)
+    return completo
+
+def triggers_instalados(conexion) -> bool:
+    """Indicar si las tablas del catálogo tienen los triggers de sincronización (la versión es compartida entre workers)"""
+    if conexion.dialect.name != "sqlite":
+        return False
+    existentes = {fila[0] for fila in conexion.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    return all(f"{tabla}_sync_{evento}" in existentes for tabla in TABLAS for evento in ("insert", "update", "delete"))
+
+# Instalar los triggers cada vez que se ejecuta create_all (son idempotentes)
+@event.listens_for(models.Base.metadata, "after_create")
+def _instalar_despues_de_create_all(metadata, conexion, **kwargs):
+    instalar_triggers(conexion)
+
+def version_actual(db: Session) -> int:
+    return db.execute(select(models.SyncSecuencia.valor).where(models.SyncSecuencia.id == 1)).scalar() or 0
+
+def version_recetas(db: Session) -> int:
+    return db.execute(select(models.SyncSecuencia.valor).where(models.SyncSecuencia.id == ID_VERSION_RECETAS)).scalar() or 0
+
+def obtener_cambios(db: Session, since: int) -> dict:
+    """Filas insertadas o modificadas y borrados con versión mayor a `since`
+
+    La versión se lee antes que las filas: un cambio que se confirma en el medio puede venir
+    de más (y se vuelve a recibir en la próxima sincronización), pero nunca se pierde.
+    """
+    version = version_actual(db)
+    cambios = {
+        nombre: db.query(modelo).filter(modelo.version > since).order_by(modelo.version).all()
+        for nombre, modelo in TABLAS.items()
+    }
+    eliminados = {nombre: [] for nombre in TABLAS}
+    for tabla, fila_id in (
+        db.query(models.SyncEliminado.tabla, models.SyncEliminado.fila_id)
+        .filter(models.SyncEliminado.version > since)
+        .order_by(models.SyncEliminado.version)
+    ):
+        eliminados[tabla].append(fila_id)
+    return {"version": version, **cambios, "eliminados": eliminados}
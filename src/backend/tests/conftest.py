@@ -0,0 +1,18 @@
+"""
+Configuración de los tests del backend
+
+La base y los modos se configuran con variables de entorno que se leen al importar
+src.backend.database, así que se fijan acá, antes de que los tests importen la aplicación.
+Cada sesión de tests usa una base SQLite nueva en un directorio temporal.
+"""
+import os
+import tempfile
+
+_directorio = tempfile.mkdtemp(prefix="panaderia-tests-")
+os.environ["PANADERIA_DATABASE_URL"] = f"sqlite:///{os.path.join(_directorio, 'panaderia.db')}"
+# Los tests comparan los modos sync y async armando cada aplicación por separado
+os.environ["PANADERIA_ASYNC_DB"] = "0"
+os.environ["PANADERIA_INGESTA_AGRUPADA"] = "0"
+os.environ["PANADERIA_SNAPSHOT_INTERVALO_S"] = "0"
+# Los tests de eventos revisan los cambios a mano (ver eventos.VigiaCambios.revisar)
+os.environ["PANADERIA_EVENTOS_INTERVALO_S"] = "0"
@@ -0,0 +1,159 @@
+"""
+Equivalencia entre los endpoints sync y sus versiones async (ver async_api.py)
+
+Cada escenario se ejecuta sobre una base recién inicializada contra la aplicación sync y
+contra una aplicación con el router async registrado antes que las rutas sync (como hace
+main con PANADERIA_ASYNC_DB), y se comparan las respuestas y el stock que queda.
+
+Uso (desde la raíz del proyecto):
+    python -m pytest src/backend/tests
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.backend import async_api
+from src.backend import main
+from src.backend import models
+from src.backend import precios
+from src.backend.cache import cache_catalogo
+from src.backend.database import SQLALCHEMY_DATABASE_URL, engine, get_async_db, url_async
+from src.backend.recetas import cache_recetas
+
+# Sin pool: cada TestClient corre en su propio event loop y aiosqlite ata la conexión al suyo
+async_engine = create_async_engine(url_async(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+
+async def _get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def crear_app_async() -> FastAPI:
+    app = FastAPI()
+    app.include_router(async_api.router)
+    app.router.routes.extend(main.app.router.routes)
+    app.dependency_overrides[get_async_db] = _get_async_db
+    return app
+
+app_async = crear_app_async()
+
+@pytest.fixture(scope="module")
+def cliente_sync():
+    with TestClient(main.app) as cliente:
+        yield cliente
+
+@pytest.fixture(scope="module")
+def cliente_async():
+    with TestClient(app_async) as cliente:
+        yield cliente
+
+def reiniciar_base(cliente_sync: TestClient):
+    """Base vacía con los datos de ejemplo de /api/init-database"""
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    cache_catalogo.invalidar()
+    cache_recetas.invalidar_todo()
+    precios.tabla_precios.invalidar()
+    assert cliente_sync.post("/api/init-database").status_code == 200
+
+def estado_stock(cliente_sync: TestClient) -> dict:
+    return {
+        "stock": cliente_sync.get("/api/stock").json(),
+        "productos": cliente_sync.get("/api/productos").json(),
+    }
+
+def sin_fecha(cuerpo):
+    """La fecha de una venta es la hora en que se registró: no se compara"""
+    if isinstance(cuerpo, dict):
+        return {clave: valor for clave, valor in cuerpo.items() if clave != "fecha"}
+    return cuerpo
+
+def ejecutar_en_ambos(cliente_sync: TestClient, cliente_async: TestClient, escenario):
+    """Ejecutar el escenario en cada modo sobre una base nueva. Devuelve [(status, cuerpo, estado)] sync y async"""
+    resultados = []
+    for cliente in (cliente_sync, cliente_async):
+        reiniciar_base(cliente_sync)
+        respuesta = escenario(cliente)
+        resultados.append((respuesta.status_code, sin_fecha(respuesta.json()), estado_stock(cliente_sync)))
+    return resultados
+
+def test_la_app_async_usa_los_handlers_async():
+    # La primera ruta que coincide es la que atiende el request
+    rutas = {}
+    for ruta in app_async.router.routes:
+        if hasattr(ruta, "methods"):
+            rutas.setdefault((ruta.path, tuple(sorted(ruta.methods))), ruta.endpoint)
+    assert rutas[("/api/productos", ("GET",))] is async_api.get_productos_async
+    assert rutas[("/api/ventas", ("POST",))] is async_api.create_venta_async
+    assert rutas[("/api/productos/{producto_id}/preparar", ("POST",))] is async_api.preparar_receta_async
+
+def test_get_productos(cliente_sync, cliente_async):
+    (status_sync, cuerpo_sync, _), (status_async, cuerpo_async, _) = ejecutar_en_ambos(
+        cliente_sync, cliente_async, lambda cliente: cliente.get("/api/productos")
+    )
+    assert status_sync == status_async == 200
+    assert cuerpo_sync == cuerpo_async
+    assert len(cuerpo_sync) > 0
+
+@pytest.mark.parametrize("items", [
+    [{"producto_id": 1, "cantidad": 3, "tipo_venta": "unidad"}],
+    [{"producto_id": 1, "cantidad": 0, "cantidad_peso_kg": 0.5, "tipo_venta": "peso"},
+     {"producto_id": 2, "cantidad": 6, "tipo_venta": "unidad"}],
+])
+def test_create_venta(cliente_sync, cliente_async, items):
+    sync, asincrono = ejecutar_en_ambos(cliente_sync, cliente_async, lambda cliente: cliente.post("/api/ventas", json={"items": items}))
+    assert sync[0] == asincrono[0] == 201
+    assert sync[1] == asincrono[1]
+    assert sync[2] == asincrono[2]
+
+def test_preparar_receta(cliente_sync, cliente_async):
+    sync, asincrono = ejecutar_en_ambos(
+        cliente_sync, cliente_async, lambda cliente: cliente.post("/api/productos/1/preparar", json={"cantidad": 2})
+    )
+    assert sync[0] == asincrono[0] == 200
+    assert sync[1] == asincrono[1]
+    assert sync[2] == asincrono[2]
+
+@pytest.mark.parametrize("ruta, cuerpo", [
+    ("/api/ventas", {"items": [{"producto_id": 1, "cantidad": 100000, "tipo_venta": "unidad"}]}),
+    ("/api/productos/1/preparar", {"cantidad": 100000}),
+])
+def test_stock_insuficiente(cliente_sync, cliente_async, ruta, cuerpo):
+    sync, asincrono = ejecutar_en_ambos(cliente_sync, cliente_async, lambda cliente: cliente.post(ruta, json=cuerpo))
+    assert sync[0] == asincrono[0] == 400
+    assert sync[1] == asincrono[1]
+    # El stock no cambia
+    assert sync[2] == asincrono[2]
+
+def test_venta_stock_cambiado_409(cliente_sync, cliente_async, monkeypatch):
+    # Otra transacción se llevó el stock entre la validación y el UPDATE condicional
+    monkeypatch.setattr(main, "_descontar_producto", lambda *args, **kwargs: False)
+    sync, asincrono = ejecutar_en_ambos(
+        cliente_sync, cliente_async,
+        lambda cliente: cliente.post("/api/ventas", json={"items": [{"producto_id": 1, "cantidad": 1, "tipo_venta": "unidad"}]})
+    )
+    assert sync[0] == asincrono[0] == 409
+    assert sync[1] == asincrono[1]
+    assert sync[2] == asincrono[2]
+
+def test_preparar_stock_cambiado_409(cliente_sync, cliente_async, monkeypatch):
+    # El UPDATE condicional no descontó, pero al releer el stock alcanzaba
+    monkeypatch.setattr(main, "descontar_ingredientes", lambda db, descuentos: False)
+    sync, asincrono = ejecutar_en_ambos(
+        cliente_sync, cliente_async, lambda cliente: cliente.post("/api/productos/1/preparar", json={"cantidad": 1})
+    )
+    assert sync[0] == asincrono[0] == 409
+    assert sync[1] == asincrono[1]
+    assert sync[2] == asincrono[2]
+
+@pytest.mark.parametrize("ruta, cuerpo", [
+    ("/api/ventas", {"items": [{"producto_id": 999, "cantidad": 1, "tipo_venta": "unidad"}]}),
+    ("/api/productos/999/preparar", {"cantidad": 1}),
+])
+def test_producto_inexistente_404(cliente_sync, cliente_async, ruta, cuerpo):
+    sync, asincrono = ejecutar_en_ambos(cliente_sync, cliente_async, lambda cliente: cliente.post(ruta, json=cuerpo))
+    assert sync[0] == asincrono[0] == 404
+    assert sync[1] == asincrono[1]
+    assert sync[2] == asincrono[2]
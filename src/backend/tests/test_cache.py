@@ -0,0 +1,49 @@
+"""
+Caché del catálogo y ETag compartido entre workers (ver cache.py)
+
+Uso (desde la raíz del proyecto):
+    python -m pytest src/backend/tests
+"""
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import main
+from src.backend import models
+from src.backend.cache import CacheCatalogo, cache_catalogo
+from src.backend.database import engine
+
+@pytest.fixture
+def cliente():
+    with TestClient(main.app) as cliente:
+        models.Base.metadata.drop_all(bind=engine)
+        models.Base.metadata.create_all(bind=engine)
+        cache_catalogo.invalidar()
+        assert cliente.post("/api/init-database").status_code == 200
+        yield cliente
+
+def test_el_etag_no_depende_del_proceso(cliente, monkeypatch):
+    assert cache_catalogo.version_compartida
+    etag = cliente.get("/api/productos").headers["etag"]
+
+    # Otro worker: su propia caché, con otras invalidaciones locales
+    otro = CacheCatalogo()
+    otro.version_compartida = True
+    otro.invalidar()
+    monkeypatch.setattr(main, "cache_catalogo", otro)
+    respuesta = cliente.get("/api/productos", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 304
+    assert respuesta.headers["etag"] == etag
+
+def test_una_escritura_de_otro_worker_cambia_el_etag(cliente):
+    respuesta = cliente.get("/api/stock")
+    etag = respuesta.headers["etag"]
+    stock_id = respuesta.json()[0]["id"]
+    with sqlite3.connect(engine.url.database) as conexion:
+        conexion.execute("UPDATE stock SET cantidad = 12345 WHERE id = ?", (stock_id,))
+
+    respuesta = cliente.get("/api/stock", headers={"If-None-Match": etag})
+    assert respuesta.status_code == 200
+    assert respuesta.headers["etag"] != etag
+    assert next(fila for fila in respuesta.json() if fila["id"] == stock_id)["cantidad"] == 12345
@@ -0,0 +1,59 @@
+"""
+Eventos de escrituras hechas en otro worker (ver eventos.VigiaCambios)
+
+Uso (desde la raíz del proyecto):
+    python -m pytest src/backend/tests
+"""
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import main
+from src.backend import models
+from src.backend.database import engine
+from src.backend.eventos import VigiaCambios, bus_eventos
+
+@pytest.fixture
+def cliente():
+    with TestClient(main.app) as cliente:
+        models.Base.metadata.drop_all(bind=engine)
+        models.Base.metadata.create_all(bind=engine)
+        assert cliente.post("/api/init-database").status_code == 200
+        yield cliente
+
+def recibir(vigia: VigiaCambios, escritura) -> list:
+    """Eventos publicados por el vigía después de una escritura, vistos por un cliente conectado"""
+    async def escenario():
+        suscripcion, _, _ = bus_eventos.suscribir()
+        try:
+            vigia.revisar()
+            escritura()
+            publicados = vigia.revisar()
+            await asyncio.sleep(0)
+            return [suscripcion.cola.get_nowait() for _ in range(publicados)]
+        finally:
+            bus_eventos.desuscribir(suscripcion)
+    return asyncio.run(escenario())
+
+def test_una_escritura_de_otro_worker_llega_con_valores_absolutos(cliente):
+    stock = cliente.get("/api/stock").json()
+    vigia = VigiaCambios(intervalo_s=0)
+
+    def vender_en_otro_worker():
+        with sqlite3.connect(engine.url.database) as conexion:
+            conexion.execute("UPDATE stock SET cantidad = cantidad - 1.5 WHERE id = ?", (stock[0]["id"],))
+            conexion.execute("DELETE FROM stock WHERE id = ?", (stock[1]["id"],))
+
+    eventos = recibir(vigia, vender_en_otro_worker)
+    tipos = {(evento.tipo, evento.datos["id"]) for evento in eventos}
+    assert ("stock.actualizado", stock[0]["id"]) in tipos
+    assert ("stock.eliminado", stock[1]["id"]) in tipos
+    actualizado = next(evento.datos for evento in eventos if evento.tipo == "stock.actualizado")
+    assert actualizado["cantidad"] == stock[0]["cantidad"] - 1.5
+    assert actualizado["nombre"] == stock[0]["nombre"]
+
+def test_sin_cambios_no_publica(cliente):
+    vigia = VigiaCambios(intervalo_s=0)
+    assert recibir(vigia, lambda: None) == []
@@ -0,0 +1,93 @@
+"""
+Idempotency-Key sobre rutas con el cuerpo en stream (ver idempotencia.py)
+
+Uso (desde la raíz del proyecto):
+    python -m pytest src/backend/tests
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import main
+from src.backend import models
+from src.backend.database import engine
+from src.backend.idempotencia import AlmacenMemoria, IdempotenciaMiddleware
+
+BLOQUES = [b"nombre,cantidad,unidad\n", b"Harina,10,kg\n", b"Azucar,5,kg\n"]
+
+def ejecutar(middleware: IdempotenciaMiddleware, ruta: str, clave: str):
+    """Enviar BLOQUES como cuerpo de un POST. Devuelve los mensajes de la respuesta"""
+    async def escenario():
+        enviados = 0
+        mensajes = []
+
+        async def receive():
+            nonlocal enviados
+            enviados += 1
+            return {"type": "http.request", "body": BLOQUES[enviados - 1], "more_body": enviados < len(BLOQUES)}
+
+        async def send(mensaje):
+            mensajes.append(mensaje)
+
+        scope = {
+            "type": "http", "method": "POST", "path": ruta, "query_string": b"",
+            "headers": [(b"idempotency-key", clave.encode())],
+        }
+        await middleware(scope, receive, send)
+        return mensajes
+
+    return asyncio.run(escenario())
+
+def aplicacion_que_registra(lecturas: list):
+    """App ASGI que anota cada bloque del cuerpo que recibe"""
+    async def app(scope, receive, send):
+        total = 0
+        while True:
+            mensaje = await receive()
+            total += len(mensaje["body"])
+            lecturas.append(mensaje["body"])
+            if not mensaje.get("more_body"):
+                break
+        cuerpo = json.dumps({"bytes": total}).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": cuerpo})
+    return app
+
+def test_la_importacion_con_clave_sigue_en_stream():
+    lecturas = []
+    middleware = IdempotenciaMiddleware(aplicacion_que_registra(lecturas), AlmacenMemoria())
+    mensajes = ejecutar(middleware, "/api/importar/stock", "clave-1")
+    # La aplicación recibe los bloques uno por uno, no un único cuerpo armado por el middleware
+    assert lecturas == BLOQUES
+    assert mensajes[0]["status"] == 200
+
+    # El reintento con la misma clave recibe la respuesta guardada sin volver a ejecutarse
+    lecturas.clear()
+    mensajes = ejecutar(middleware, "/api/importar/stock", "clave-1")
+    assert lecturas == []
+    assert (b"idempotent-replayed", b"true") in mensajes[0]["headers"]
+    assert json.loads(mensajes[1]["body"]) == {"bytes": sum(len(bloque) for bloque in BLOQUES)}
+
+def test_las_demas_rutas_leen_el_cuerpo_entero():
+    lecturas = []
+    middleware = IdempotenciaMiddleware(aplicacion_que_registra(lecturas), AlmacenMemoria())
+    ejecutar(middleware, "/api/ventas", "clave-2")
+    assert lecturas == [b"".join(BLOQUES)]
+
+@pytest.fixture
+def cliente():
+    with TestClient(main.app) as cliente:
+        models.Base.metadata.drop_all(bind=engine)
+        models.Base.metadata.create_all(bind=engine)
+        yield cliente
+
+def test_importar_con_clave(cliente):
+    cuerpo = b"".join(BLOQUES)
+    headers = {"Idempotency-Key": "importacion-1", "Content-Type": "text/csv"}
+    primera = cliente.post("/api/importar/stock?formato=csv", content=iter(BLOQUES), headers=headers)
+    assert primera.status_code == 200, primera.text
+    reintento = cliente.post("/api/importar/stock?formato=csv", content=cuerpo, headers=headers)
+    assert reintento.json() == primera.json()
+    assert reintento.headers["idempotent-replayed"] == "true"
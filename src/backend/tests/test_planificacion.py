@@ -0,0 +1,60 @@
+"""
+Caché de la matriz de planificación (ver planificacion.py)
+
+Uso (desde la raíz del proyecto):
+    python -m pytest src/backend/tests
+"""
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import main
+from src.backend import models
+from src.backend import precios
+from src.backend.cache import cache_catalogo
+from src.backend.database import engine
+from src.backend.planificacion import cache_matriz
+from src.backend.recetas import cache_recetas
+
+@pytest.fixture
+def cliente():
+    with TestClient(main.app) as cliente:
+        models.Base.metadata.drop_all(bind=engine)
+        models.Base.metadata.create_all(bind=engine)
+        cache_catalogo.invalidar()
+        cache_recetas.invalidar_todo()
+        precios.tabla_precios.invalidar()
+        assert cliente.post("/api/init-database").status_code == 200
+        yield cliente
+
+def maximo(cliente: TestClient, producto_id: int) -> dict:
+    return next(fila for fila in cliente.get("/api/produccion/maximo").json() if fila["producto_id"] == producto_id)
+
+def test_una_venta_no_recompila_la_matriz(cliente):
+    antes = maximo(cliente, 1)
+    compilaciones = cache_matriz.compilaciones
+    aciertos = cache_matriz.aciertos
+    maximo(cliente, 1)
+    assert cache_matriz.aciertos == aciertos + 1
+
+    assert cliente.post("/api/productos/1/preparar", json={"cantidad": 1}).status_code == 200
+    assert cliente.post("/api/ventas", json={"items": [{"producto_id": 1, "cantidad": 1, "tipo_venta": "unidad"}]}).status_code == 201
+    despues = maximo(cliente, 1)
+    assert cache_matriz.compilaciones == compilaciones
+
+    # El vector de stock sí se volvió a leer
+    assert despues["max_recetas"] == pytest.approx(antes["max_recetas"] - 1)
+    stock = {fila["id"]: fila["cantidad"] for fila in cliente.get("/api/stock").json()}
+    simulacion = cliente.post("/api/produccion/simular", json={"items": [{"producto_id": 1, "cantidad": 1}]}).json()
+    for ingrediente in simulacion["ingredientes"]:
+        assert ingrediente["disponible"] == stock[ingrediente["stock_id"]]
+
+def test_un_cambio_de_receta_de_otro_worker_recompila(cliente):
+    maximo(cliente, 1)
+    compilaciones = cache_matriz.compilaciones
+    # Una escritura que no pasa por este proceso
+    with sqlite3.connect(engine.url.database) as conexion:
+        conexion.execute("UPDATE ingredientes_receta SET cantidad = cantidad * 2 WHERE producto_id = 1")
+    maximo(cliente, 1)
+    assert cache_matriz.compilaciones == compilaciones + 1
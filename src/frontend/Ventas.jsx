@@ -11,6 +11,9 @@ function Ventas() {
   const [cantidad, setCantidad] = useState(1);
   const [tipoVenta, setTipoVenta] = useState('unidad'); // 'unidad' o 'peso'
   const [ventas, setVentas] = useState([]);
+  // Cursor de la página siguiente del historial (null si ya se cargaron todas las ventas)
+  const [siguienteCursor, setSiguienteCursor] = useState(null);
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [modal, setModal] = useState({ isOpen: false, titulo: '', mensaje: '', tipo: 'info' });
 
   const getSafeNumber = (value, fallback = 0) => {
@@ -58,12 +61,13 @@ function Ventas() {
   const loadData = async () => {
     try {
       setLoading(true);
-      const [productosData, ventasData] = await Promise.all([
+      const [productosData, paginaVentas] = await Promise.all([
         productosAPI.getAll(),
-        ventasAPI.getAll()
+        ventasAPI.getPagina()
       ]);
       setProductosDisponibles(productosData);
-      setVentas(ventasData);
+      setVentas(paginaVentas.ventas);
+      setSiguienteCursor(paginaVentas.siguienteCursor);
     } catch (error) {
       mostrarModal('Error', `Error al cargar datos: ${error.message}`, 'error');
     } finally {
@@ -71,6 +75,21 @@ function Ventas() {
     }
   };
 
+  // El historial se pagina por cursor: cada página trae ventas más antiguas que la anterior
+  const cargarMasVentas = async () => {
+    if (!siguienteCursor) return;
+    try {
+      setCargandoMas(true);
+      const pagina = await ventasAPI.getPagina({ cursor: siguienteCursor });
+      setVentas(anteriores => [...anteriores, ...pagina.ventas]);
+      setSiguienteCursor(pagina.siguienteCursor);
+    } catch (error) {
+      mostrarModal('Error', `Error al cargar más ventas: ${error.message}`, 'error');
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   const agregarProductoVenta = () => {
     if (!productoSeleccionado) return;
 
@@ -337,6 +356,11 @@ function Ventas() {
               </div>
             );
           })}
+          {siguienteCursor && (
+            <button className="btn-cargar-mas" onClick={cargarMasVentas} disabled={cargandoMas}>
+              {cargandoMas ? 'Cargando...' : 'Cargar más ventas'}
+            </button>
+          )}
         </div>
       )}
       </>
@@ -25,6 +25,13 @@ export const stockAPI = {
     return handleResponse(response);
   },
 
+  // Buscar items del stock por nombre (prefijos, sin distinguir acentos), ordenados por relevancia
+  buscar: async (texto, limite = 20) => {
+    const params = new URLSearchParams({ q: texto, limite });
+    const response = await fetch(`${API_BASE_URL}/stock/buscar?${params}`);
+    return handleResponse(response);
+  },
+
   // Obtener un item específico
   getById: async (id) => {
     const response = await fetch(`${API_BASE_URL}/stock/${id}`);
@@ -69,6 +76,13 @@ export const productosAPI = {
     return handleResponse(response);
   },
 
+  // Buscar productos por nombre (prefijos, sin distinguir acentos), ordenados por relevancia
+  buscar: async (texto, limite = 20) => {
+    const params = new URLSearchParams({ q: texto, limite });
+    const response = await fetch(`${API_BASE_URL}/productos/buscar?${params}`);
+    return handleResponse(response);
+  },
+
   // Obtener un producto específico
   getById: async (id) => {
     const response = await fetch(`${API_BASE_URL}/productos/${id}`);
@@ -139,12 +153,27 @@ export const recetasAPI = {
 // ==================== API DE VENTAS ====================
 
 export const ventasAPI = {
-  // Obtener todas las ventas
-  getAll: async () => {
-    const response = await fetch(`${API_BASE_URL}/ventas`);
+  // Obtener ventas (paginadas: { limite, cursor, desde, hasta })
+  // El cursor de la página siguiente viene en el header X-Siguiente-Cursor
+  getAll: async (params = {}) => {
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, valor]) => valor !== undefined && valor !== null)
+    ).toString();
+    const response = await fetch(`${API_BASE_URL}/ventas${query ? `?${query}` : ''}`);
     return handleResponse(response);
   },
 
+  // Obtener una página de ventas junto con el cursor de la siguiente
+  // (null cuando no hay más ventas)
+  getPagina: async (params = {}) => {
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, valor]) => valor !== undefined && valor !== null)
+    ).toString();
+    const response = await fetch(`${API_BASE_URL}/ventas${query ? `?${query}` : ''}`);
+    const ventas = await handleResponse(response);
+    return { ventas, siguienteCursor: response.headers.get('X-Siguiente-Cursor') };
+  },
+
   // Obtener una venta específica
   getById: async (id) => {
     const response = await fetch(`${API_BASE_URL}/ventas/${id}`);
@@ -159,6 +188,16 @@ export const ventasAPI = {
       body: JSON.stringify(ventaData)
     });
     return handleResponse(response);
+  },
+
+  // Calcular el total de un carrito sin registrar la venta (mismos precios que create)
+  cotizar: async (ventaData) => {
+    const response = await fetch(`${API_BASE_URL}/ventas/cotizar`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(ventaData)
+    });
+    return handleResponse(response);
   }
 };
 
@@ -173,3 +212,19 @@ export const adminAPI = {
     return handleResponse(response);
   }
 };
+
+// ==================== EVENTOS (SSE) ====================
+
+export const eventosAPI = {
+  // Suscribirse a los cambios de stock, productos, recetas y ventas.
+  // `manejadores` es un objeto { 'stock.actualizado': (datos) => ..., 'reinicio': () => ..., ... }.
+  // El navegador se reconecta solo y reenvía Last-Event-ID para recibir lo que se perdió.
+  // Devuelve una función para cerrar la suscripción.
+  suscribir: (manejadores) => {
+    const fuente = new EventSource(`${API_BASE_URL}/eventos`);
+    Object.entries(manejadores).forEach(([tipo, manejador]) => {
+      fuente.addEventListener(tipo, (evento) => manejador(JSON.parse(evento.data)));
+    });
+    return () => fuente.close();
+  }
+};